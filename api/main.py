@@ -10,31 +10,83 @@ parent_dir = os.path.dirname(current_dir)
 # 3. Add the parent folder to the system path
 sys.path.append(parent_dir)
 
+import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI, BackgroundTasks
+from fastapi import FastAPI, Response
 from src_bot.bot import bot_instance
 from src_bot.service import bot_service_instance
+from src_bot.job_queue import job_queue_instance
+from src_bot.readiness import readiness_instance
+from src_bot.config.config import configs
+from src_bot import metrics
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
+REVIEW_ACTIONS = {"opened", "reopened", "synchronize", "ready_for_review"}
+NOT_READY_RETRY_AFTER = 10
+
+
+async def startup():
+    """
+    Khởi tạo các dependency ở background để server nhận request (/ready) ngay,
+    webhook chỉ được nhận khi mọi thứ đã warm-up xong.
+    """
     try:
-        bot_instance.initialize() 
-        bot_service_instance.initialize()
+        await asyncio.gather(
+            asyncio.to_thread(bot_instance.initialize, readiness_instance),
+            asyncio.to_thread(bot_service_instance.initialize, readiness_instance),
+        )
+        if configs.REVIEW_ASYNC_MODE:
+            # Mọi review chạy trên event loop của FastAPI
+            await bot_instance.ainitialize()
+            readiness_instance.run("job_queue", lambda: job_queue_instance.initialize(bot_service_instance.aprocess_pr_review))
+        else:
+            readiness_instance.run("job_queue", lambda: job_queue_instance.initialize(bot_service_instance.process_pr_review))
+        print("Bot is ready.")
     except Exception as e:
         print(f"Lỗi khởi tạo Bot: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    startup_task = asyncio.create_task(startup())
     yield
+    if not startup_task.done():
+        startup_task.cancel()
+    job_queue_instance.close()
+    if configs.REVIEW_ASYNC_MODE:
+        await bot_instance.aclose()
     bot_instance.close()
     bot_service_instance.close()
 
 app = FastAPI(lifespan=lifespan)
 
-@app.post("/webhook")
-async def receive_webhook(payload: dict, background_tasks: BackgroundTasks):
-    if payload.get('action') != 'opened':
+@app.get("/ready")
+def ready(response: Response):
+    report = readiness_instance.report()
+    if not report["ready"]:
+        response.status_code = 503
+    return report
+
+@app.get("/metrics")
+def prometheus_metrics():
+    content, content_type = metrics.render_latest()
+    return Response(content=content, media_type=content_type)
+
+@app.post("/webhook", status_code=202)
+def receive_webhook(payload: dict, response: Response):
+    if payload.get('action') not in REVIEW_ACTIONS:
         return {"status": "ignored"}
-    background_tasks.add_task(
-        bot_service_instance.process_pr_review, 
-        repo_name=payload['repository']['full_name'], 
-        pr_number=payload['pull_request']['number']
+    if not readiness_instance.is_ready():
+        response.status_code = 503
+        response.headers["Retry-After"] = str(NOT_READY_RETRY_AFTER)
+        return {"status": "not_ready", "dependencies": readiness_instance.report()["dependencies"]}
+    pull_request = payload['pull_request']
+    result = job_queue_instance.enqueue(
+        repo_name=payload['repository']['full_name'],
+        pr_number=pull_request['number'],
+        head_sha=pull_request['head']['sha'],
+        action=payload['action'],
     )
-    return {"status": "ok"}
\ No newline at end of file
+    if result["status"] == "rejected":
+        response.status_code = 429
+        response.headers["Retry-After"] = str(int(configs.JOB_QUEUE_RETRY_BACKOFF_SECONDS))
+    return result
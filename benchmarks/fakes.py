@@ -0,0 +1,251 @@
+import hashlib
+import re
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+import numpy as np
+from src_bot.neo4jdb import neo4j_service
+from benchmarks.synthetic import (
+    LABEL_CLASS,
+    LABEL_CONFIG,
+    LABEL_ENDPOINT,
+    LABEL_METHOD,
+    SyntheticGraph,
+    expand_paths,
+    subgraph,
+    visited_nodes,
+)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class FakeEmbeddingModel:
+    """Embedding giả lập, tất định theo nội dung text (không cần torch)."""
+
+    def __init__(self, dim: int = 768):
+        self.dim = dim
+
+    def encode(self, texts, normalize_embeddings: bool = True, **kwargs):
+        vectors = np.empty((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            seed = int(hashlib.sha1(text.encode("utf-8")).hexdigest()[:8], 16)
+            vector = np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+            vectors[i] = vector / np.linalg.norm(vector) if normalize_embeddings else vector
+        return vectors
+
+
+# --- Neo4j -------------------------------------------------------------------------------
+
+class FakeResult(list):
+    def single(self):
+        return self[0] if self else None
+
+    def consume(self):
+        return SimpleNamespace(plan=None)
+
+
+class FakeSession:
+    def __init__(self, cypher: "FakeCypher"):
+        self.cypher = cypher
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query: str, params: Dict = None):
+        return FakeResult(self.cypher.run(query, params or {}))
+
+    def execute_read(self, work):
+        return work(self)
+
+
+class FakeDriver:
+    def __init__(self, cypher: "FakeCypher"):
+        self.cypher = cypher
+
+    def session(self):
+        return FakeSession(self.cypher)
+
+    def verify_connectivity(self):
+        return None
+
+    def close(self):
+        return None
+
+
+class FakeNeo4jDB:
+    """Thay cho Neo4jDB: trả lời đúng các câu Cypher của Neo4jService trên SyntheticGraph."""
+
+    def __init__(self, graph: SyntheticGraph, latency_ms: float = 0.0):
+        self.driver = FakeDriver(FakeCypher(graph, latency_ms))
+
+    def close(self):
+        self.driver.close()
+
+
+class FakeCypher:
+    def __init__(self, graph: SyntheticGraph, latency_ms: float = 0.0):
+        self.graph = graph
+        self.latency = latency_ms / 1000
+        self.version = 1
+
+    def run(self, query: str, params: Dict) -> List[dict]:
+        if self.latency:
+            time.sleep(self.latency)
+        if query == neo4j_service.GRAPH_VERSION_QUERY:
+            return [{"version": self.version}]
+        if query == neo4j_service.NODE_BY_AST_HASH_QUERY:
+            nodes = self.graph.by_ast_hash.get(params["ast_hash"], [])
+            return [{"n": nodes[0]}] if nodes else []
+        if query == neo4j_service.NODES_BY_AST_HASHES_QUERY:
+            return [
+                {"ast_hash": ast_hash, "n": self.graph.by_ast_hash[ast_hash][0]}
+                for ast_hash in params["ast_hashes"] if ast_hash in self.graph.by_ast_hash
+            ]
+        if query == neo4j_service.RELATED_NODES_QUERY:
+            endpoints = {}
+            for target in params["targets"]:
+                for endpoint in self.graph.find_endpoints(target):
+                    endpoints[endpoint.element_id] = endpoint
+            return [
+                record
+                for endpoint in endpoints.values()
+                for record in self._path_records(endpoint, params)
+            ]
+        if query == neo4j_service.RELATED_NODES_BY_AST_HASHES_QUERY:
+            return [
+                {"ast_hash": ast_hash, **record}
+                for ast_hash, endpoint in self._endpoints_by_ast_hash(params["ast_hashes"])
+                for record in self._path_records(endpoint, params)
+            ]
+        if query == neo4j_service.RELATED_SUBGRAPH_BY_AST_HASHES_QUERY:
+            records = []
+            for ast_hash, endpoint in self._endpoints_by_ast_hash(params["ast_hashes"]):
+                nodes, relationships = subgraph(
+                    self.graph, endpoint, params["relationship_filter"],
+                    params["max_level"], params["node_limit"],
+                )
+                records.append({
+                    "ast_hash": ast_hash, "endpoint": endpoint,
+                    "nodes": nodes, "relationships": relationships,
+                })
+            return records
+        raise NotImplementedError(f"FakeCypher không hỗ trợ query:\n{query}")
+
+    def _endpoints_by_ast_hash(self, ast_hashes: List[str]):
+        for ast_hash in ast_hashes:
+            nodes = self.graph.by_ast_hash.get(ast_hash)
+            if not nodes:
+                continue
+            for endpoint in self.graph.find_endpoints(nodes[0]):
+                yield ast_hash, endpoint
+
+    def _path_records(self, endpoint, params: Dict) -> List[dict]:
+        paths = expand_paths(
+            self.graph, endpoint, params["relationship_filter"],
+            params["min_level"], params["max_level"],
+        )
+        return [
+            {"endpoint": endpoint, "path": path, "visited_nodes": visited_nodes(path)}
+            for path in paths
+        ]
+
+
+# --- Weaviate ----------------------------------------------------------------------------
+
+class FakeCollection:
+    """Hybrid search trong bộ nhớ: cosine (vector) + tỉ lệ token trùng (keyword)."""
+
+    _NODE_TYPES = {
+        LABEL_METHOD: "Method",
+        LABEL_ENDPOINT: "Endpoint",
+        LABEL_CONFIG: "Configuration",
+        LABEL_CLASS: "Class",
+    }
+
+    def __init__(self, graph: SyntheticGraph, model: FakeEmbeddingModel, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.objects = []
+        for node in graph.nodes:
+            label = next(iter(node.labels))
+            self.objects.append({
+                "ast_hash": node.get("ast_hash"),
+                "name": node.get("name"),
+                "content": node.get("content"),
+                "file_path": node.get("file_path"),
+                "node_type": self._NODE_TYPES.get(label, label),
+            })
+        self.vectors = model.encode([obj["content"] for obj in self.objects])
+        self.tokens = [set(_TOKEN_RE.findall(obj["content"] or "")) for obj in self.objects]
+        self.by_uuid = {}
+        self.query = self
+
+    def fetch_objects(self, filters=None, limit: int = None, return_properties=None, **kwargs):
+        """Chỉ hỗ trợ Filter.by_id().contains_any(...) (fetch theo UUID = generate_uuid5(ast_hash))."""
+        if self.latency:
+            time.sleep(self.latency)
+        if not self.by_uuid:
+            from weaviate.util import generate_uuid5
+            self.by_uuid = {generate_uuid5(obj["ast_hash"]): obj for obj in self.objects}
+        found = [self.by_uuid[uuid] for uuid in filters.value if uuid in self.by_uuid][:limit]
+        return SimpleNamespace(objects=[
+            SimpleNamespace(properties={key: obj[key] for key in (return_properties or obj)})
+            for obj in found
+        ])
+
+    def hybrid(self, query: str, vector, alpha: float = 0.5, limit: int = 3, return_properties=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        vector_scores = self.vectors @ np.asarray(vector, dtype=np.float32)
+        query_tokens = set(_TOKEN_RE.findall(query))
+        keyword_scores = np.array(
+            [len(query_tokens & tokens) / (len(query_tokens) or 1) for tokens in self.tokens],
+            dtype=np.float32,
+        )
+        scores = alpha * vector_scores + (1 - alpha) * keyword_scores
+        top = np.argsort(-scores)[:limit]
+        return SimpleNamespace(objects=[
+            SimpleNamespace(properties={key: self.objects[i][key] for key in (return_properties or self.objects[i])})
+            for i in top
+        ])
+
+
+class FakeWeaviateClient:
+    def __init__(self, collection: FakeCollection):
+        self.collections = SimpleNamespace(use=lambda name: collection, get=lambda name: collection)
+
+    def is_ready(self):
+        return True
+
+    def close(self):
+        return None
+
+
+# --- GitHub / Ollama ---------------------------------------------------------------------
+
+class FakeGitHubClient:
+    """Ghi lại các review được gửi thay vì gọi GitHub API."""
+
+    def __init__(self):
+        self.reviews = []
+
+    def create_review(self, repo_name, pr_number, commit_id, comments, body=None, event="COMMENT"):
+        self.reviews.append({"commit_id": commit_id, "comments": list(comments), "body": body})
+        return {"id": len(self.reviews)}
+
+    def get_rate_limit(self):
+        return {"resources": {"core": {"remaining": 5000}}}
+
+    def close(self):
+        return None
+
+
+def fake_llm(review_text: str, latency_ms: float = 0.0):
+    """
+    Chat model trả về review cố định (langchain FakeListChatModel), có thể giả lập độ trễ.
+    LLMGateway stream từng ký tự nên độ trễ được chia đều cho các ký tự của review.
+    """
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    return FakeListChatModel(responses=[review_text], sleep=(latency_ms / 1000 / max(len(review_text), 1)) or None)
@@ -0,0 +1,318 @@
+"""
+Benchmark offline cho retrieval / review pipeline.
+
+    python -m benchmarks.run                         # chạy và in kết quả
+    python -m benchmarks.run --save-baseline         # lưu làm baseline
+    python -m benchmarks.run --compare               # so với baseline, exit 1 nếu chậm hơn --tolerance
+
+Weaviate, Neo4j, GitHub và Ollama được thay bằng bản giả lập trong benchmarks/fakes.py,
+graph và diff được sinh ngẫu nhiên (có seed) theo kích thước truyền vào.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict
+import numpy as np
+from unidiff import PatchSet
+from benchmarks.fakes import (
+    FakeCollection,
+    FakeEmbeddingModel,
+    FakeGitHubClient,
+    FakeNeo4jDB,
+    FakeWeaviateClient,
+    fake_llm,
+)
+from benchmarks.synthetic import build_diff, build_graph, unified_diff, write_snapshot, write_symbol_index
+from src_bot.bot import GraphRAGBot
+from src_bot.embedding_store import EmbeddingStore
+from src_bot.graph_retriever import CustomGraphRAGRetriever
+from src_bot.llm_gateway import LLMGateway
+from src_bot.neo4jdb.neo4j_service import Neo4jService, _node_to_dto
+from src_bot.neo4jdb.graph_snapshot import GraphSnapshot
+from src_bot.neo4jdb.graph_types import NodeIdentityMap
+from src_bot.neo4jdb.snapshot_service import GraphSnapshotService
+from src_bot.neo4jdb.traversal_cache import TraversalCache
+from src_bot.service import BotService, ReviewDraft, index_patch_set
+from src_bot.symbol_index import SymbolIndex
+from src_bot.vector_index import MmapVectorIndex, VectorIndexWriter
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def measure(fn: Callable, iterations: int, warmup: int) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    # Đo allocation riêng một lần để tracemalloc không làm lệch latency
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    fn()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings = np.asarray(timings)
+    return {
+        "p50_ms": round(float(np.percentile(timings, 50)), 3),
+        "p90_ms": round(float(np.percentile(timings, 90)), 3),
+        "p99_ms": round(float(np.percentile(timings, 99)), 3),
+        "mean_ms": round(float(timings.mean()), 3),
+        "alloc_kib": round((current - before) / 1024, 1),
+        "peak_kib": round((peak - before) / 1024, 1),
+    }
+
+
+class Cycle:
+    """Xoay vòng qua danh sách input để mỗi lần gọi dùng một giá trị khác nhau."""
+
+    def __init__(self, items):
+        self.items = list(items)
+        self.index = 0
+
+    def next(self):
+        item = self.items[self.index % len(self.items)]
+        self.index += 1
+        return item
+
+
+def build_fixtures(args, workdir: str):
+    graph = build_graph(
+        num_classes=args.classes,
+        methods_per_class=args.methods_per_class,
+        calls_per_method=args.calls_per_method,
+        content_lines=args.content_lines,
+        seed=args.seed,
+    )
+    model = FakeEmbeddingModel()
+    neo4j = Neo4jService(db=FakeNeo4jDB(graph, latency_ms=args.neo4j_latency_ms))
+    if not args.traversal_cache:
+        neo4j.traversal_cache = TraversalCache(max_entries=0, version_check_interval=3600)
+    collection = FakeCollection(graph, model, latency_ms=args.weaviate_latency_ms)
+    # Index tên symbol -> ast_hash như migrate_weaviate dựng sau mỗi lần ingest
+    symbol_index_path = os.path.join(workdir, "symbols.sqlite3")
+    write_symbol_index(graph, symbol_index_path)
+    retriever = CustomGraphRAGRetriever(
+        neo4j_service=neo4j,
+        model=model,
+        weaviate_client=FakeWeaviateClient(collection),
+        embedding_store=EmbeddingStore(db_path=os.path.join(workdir, "embeddings.sqlite3"), lru_size=0),
+        symbol_index=SymbolIndex(symbol_index_path),
+    )
+    # Cùng dữ liệu với FakeCollection nhưng export ra index mmap (RETRIEVAL_BACKEND=mmap)
+    index_path = os.path.join(workdir, "vector_index")
+    writer = VectorIndexWriter(index_path, dtype=args.index_dtype)
+    writer.add_batch(collection.objects, collection.vectors)
+    writer.finish()
+    mmap_retriever = CustomGraphRAGRetriever(
+        neo4j_service=neo4j,
+        model=model,
+        vector_index=MmapVectorIndex(index_path),
+        embedding_store=EmbeddingStore(db_path=os.path.join(workdir, "embeddings.sqlite3"), lru_size=0),
+        symbol_index=SymbolIndex(symbol_index_path),
+    )
+    # Cùng graph nhưng traversal trong process trên snapshot CSR (GRAPH_BACKEND=snapshot)
+    snapshot_path = os.path.join(workdir, "graph_snapshot")
+    write_snapshot(graph, snapshot_path)
+    snapshot = GraphSnapshotService(GraphSnapshot(snapshot_path))
+    if not args.traversal_cache:
+        snapshot.traversal_cache = TraversalCache(max_entries=0, version_check_interval=3600)
+
+    diff_files = build_diff(
+        graph, num_files=args.files, hunks_per_file=args.hunks, lines_per_hunk=args.hunk_lines, seed=args.seed
+    )
+    # Review trích một dòng của hunk cuối để post_comment_on_line phải dò qua mọi hunk
+    last_patch = list(diff_files.values())[-1]
+    quoted = [line[1:].strip() for line in last_patch.split("\n") if line.startswith("+")][-1:]
+    review_text = "### Tóm tắt\nThay đổi logic xử lý request.\n\n```python\n" + "\n".join(quoted) + "\n```\n"
+
+    bot = GraphRAGBot()
+    bot.retriever = retriever
+    bot.llm_gateway = LLMGateway(fake_llm(review_text, latency_ms=args.llm_latency_ms))
+    bot.compile_graphs()
+
+    service = BotService()
+    service.github_client = FakeGitHubClient()
+    return graph, retriever, mmap_retriever, snapshot, bot, service, diff_files, review_text
+
+
+def close_fixtures(graph, retriever, mmap_retriever, snapshot, *_):
+    """Đóng SQLite / mmap trong workdir (cần trước khi xoá thư mục)."""
+    retriever.embedding_store.close()
+    retriever.symbol_index.close()
+    mmap_retriever.embedding_store.close()
+    mmap_retriever.vector_index.close()
+    mmap_retriever.symbol_index.close()
+    snapshot.close()
+
+
+def run_benchmarks(args) -> Dict[str, Dict[str, float]]:
+    with tempfile.TemporaryDirectory(prefix="codebot-bench-") as workdir:
+        fixtures = build_fixtures(args, workdir)
+        try:
+            return _run(args, *fixtures)
+        finally:
+            close_fixtures(*fixtures)
+
+
+def _run(args, graph, retriever, mmap_retriever, snapshot, bot, service, diff_files, review_text) -> Dict[str, Dict[str, float]]:
+    neo4j = retriever.neo4j_service
+    identity_map = NodeIdentityMap()
+
+    methods = graph.methods()
+    queries = Cycle(m["content"] for m in methods[: max(args.iterations, 1)])
+    hashes = Cycle(m["ast_hash"] for m in methods)
+    target_dtos = Cycle([_node_to_dto(identity_map.node(m))] for m in methods)
+    pr_diffs = Cycle(f"{name}\n{patch}" for name, patch in diff_files.items())
+    patch_index = index_patch_set(PatchSet(unified_diff(diff_files)))
+    last_file = list(diff_files)[-1]
+    parsed_diffs = Cycle(bot.parse_diff_node({"pr_diff": f"{name}\n{patch}"}) for name, patch in diff_files.items())
+
+    traversals = list(neo4j.get_related_nodes_by_ast_hashes([methods[0]["ast_hash"]], max_level=7).values())
+    subgraphs = list(neo4j.get_related_subgraphs_by_ast_hashes([methods[0]["ast_hash"]], max_level=7).values())
+    relationships = neo4j.extract_relationships(traversals[0] if traversals else [])
+    hits = retriever.vector_search_batch([methods[0]["content"]], top_k=3)
+
+    review_messages = bot._review_messages(list(diff_files.values())[0], review_text)
+
+    def post_comments():
+        draft = ReviewDraft(repo_name="bench/repo", pr_number=1, commit_sha="0" * 40, files=patch_index)
+        for name in diff_files:
+            service.post_comment_on_line(draft, name, review_text)
+        service.post_comment_on_line(draft, last_file, review_text)
+        service.submit_review(draft)
+
+    benchmarks = {
+        "retriever.search": lambda: retriever.search(queries.next(), top_k=3),
+        "retriever.vector_search_batch": lambda: retriever.vector_search_batch([queries.next()], top_k=3),
+        "retriever.vector_search_batch.mmap": lambda: mmap_retriever.vector_search_batch([queries.next()], top_k=3),
+        "retriever.symbol_search_batch": lambda: retriever.symbol_search_batch(
+            *_symbol_search_args(parsed_diffs.next()), top_k=3
+        ),
+        "retriever.symbol_search_batch.mmap": lambda: mmap_retriever.symbol_search_batch(
+            *_symbol_search_args(parsed_diffs.next()), top_k=3
+        ),
+        "retriever.expand_relationships_batch": lambda: retriever.expand_relationships_batch(hits),
+        "neo4j.get_related_nodes": lambda: neo4j.get_related_nodes(target_dtos.next(), max_level=7),
+        "neo4j.get_related_nodes_by_ast_hashes": lambda: neo4j.get_related_nodes_by_ast_hashes(
+            [hashes.next()], max_level=7
+        ),
+        "neo4j.get_related_subgraphs_by_ast_hashes": lambda: neo4j.get_related_subgraphs_by_ast_hashes(
+            [hashes.next()], max_level=7
+        ),
+        "snapshot.get_related_nodes_by_ast_hashes": lambda: snapshot.get_related_nodes_by_ast_hashes(
+            [hashes.next()], max_level=7
+        ),
+        "snapshot.get_related_subgraphs_by_ast_hashes": lambda: snapshot.get_related_subgraphs_by_ast_hashes(
+            [hashes.next()], max_level=7
+        ),
+        "neo4j.extract_relationships.paths": lambda: neo4j.extract_relationships(traversals[0] if traversals else []),
+        "neo4j.extract_relationships.subgraph": lambda: neo4j.extract_relationships(subgraphs[0] if subgraphs else []),
+        "retriever._format_context": lambda: retriever._format_context(relationships),
+        "service.post_comment_on_line": post_comments,
+        "llm_gateway.generate": lambda: bot.llm_gateway.generate(review_messages, pr_size=len(review_text)),
+        "bot.parse_diff_node": lambda: bot.parse_diff_node({"pr_diff": pr_diffs.next()}),
+        "bot.invoke": lambda: bot.invoke({"pr_diff": pr_diffs.next()}),
+    }
+
+    results = {}
+    for name, fn in benchmarks.items():
+        if args.only and not any(pattern in name for pattern in args.only):
+            continue
+        # Log của pipeline (print) được bỏ đi để không lẫn vào kết quả
+        with open(os.devnull, "w") as devnull:
+            with contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+                results[name] = measure(fn, args.iterations, args.warmup)
+        stats = results[name]
+        print(
+            f"{name:45s} p50 {stats['p50_ms']:9.3f} ms  p90 {stats['p90_ms']:9.3f} ms  "
+            f"p99 {stats['p99_ms']:9.3f} ms  alloc {stats['alloc_kib']:9.1f} KiB  peak {stats['peak_kib']:9.1f} KiB"
+        )
+    return results
+
+
+def _symbol_search_args(parsed: Dict):
+    return parsed["changed_files"], parsed["changed_symbols"]
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> int:
+    """In tỉ lệ so với baseline, trả về số benchmark chậm hơn (p50) quá `tolerance`."""
+    regressions = 0
+    print(f"\nSo sánh với baseline ({baseline.get('created_at', '?')}, tolerance {tolerance:.0%}):")
+    for name, stats in results.items():
+        base = baseline["results"].get(name)
+        if not base:
+            print(f"  {name:45s} (chưa có trong baseline)")
+            continue
+        ratio = stats["p50_ms"] / base["p50_ms"] if base["p50_ms"] else float("inf")
+        peak_ratio = stats["peak_kib"] / base["peak_kib"] if base["peak_kib"] else 1.0
+        status = "OK"
+        if ratio > 1 + tolerance:
+            status = "REGRESSION"
+            regressions += 1
+        elif ratio < 1 - tolerance:
+            status = "faster"
+        print(f"  {name:45s} p50 x{ratio:5.2f}  peak x{peak_ratio:5.2f}  {status}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline cho code review bot")
+    parser.add_argument("--classes", type=int, default=50, help="Số ClassNode của graph giả lập")
+    parser.add_argument("--methods-per-class", type=int, default=8)
+    parser.add_argument("--calls-per-method", type=int, default=3)
+    parser.add_argument("--content-lines", type=int, default=20, help="Số dòng code mỗi method")
+    parser.add_argument("--files", type=int, default=5, help="Số file trong diff")
+    parser.add_argument("--hunks", type=int, default=4, help="Số hunk mỗi file")
+    parser.add_argument("--hunk-lines", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--neo4j-latency-ms", type=float, default=0.0, help="Độ trễ giả lập mỗi query Neo4j")
+    parser.add_argument("--weaviate-latency-ms", type=float, default=0.0)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0)
+    parser.add_argument("--index-dtype", choices=["float32", "float16"], default="float32",
+                        help="Kiểu lưu vector của index mmap")
+    parser.add_argument("--traversal-cache", action="store_true", help="Bật traversal cache (mặc định tắt)")
+    parser.add_argument("--verbose", action="store_true", help="Giữ log của pipeline khi chạy")
+    parser.add_argument("--only", nargs="*", help="Chỉ chạy benchmark có tên chứa một trong các chuỗi này")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Ngưỡng chậm hơn cho phép so với baseline")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args)
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "args": {key: value for key, value in vars(args).items() if key not in ("baseline", "save_baseline", "compare", "verbose")},
+                "results": results,
+            }, f, indent=2)
+        print(f"\nĐã lưu baseline vào {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"Không tìm thấy baseline {args.baseline}, chạy với --save-baseline trước.")
+            sys.exit(2)
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+import hashlib
+import random
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+LABEL_METHOD = "MethodNode"
+LABEL_CLASS = "ClassNode"
+LABEL_ENDPOINT = "EndpointNode"
+LABEL_CONFIG = "ConfigurationNode"
+
+
+class FakeNode(dict):
+    """Giả lập neo4j.graph.Node: dict property + element_id / id / labels."""
+
+    def __init__(self, element_id: str, labels, **properties):
+        super().__init__(properties)
+        self.element_id = element_id
+        self.id = int(element_id)
+        self.labels = frozenset(labels)
+
+    def __hash__(self):
+        return hash(self.element_id)
+
+    def __eq__(self, other):
+        return isinstance(other, FakeNode) and other.element_id == self.element_id
+
+
+class FakeRelationship(dict):
+    def __init__(self, element_id: str, rel_type: str, start_node: FakeNode, end_node: FakeNode):
+        super().__init__()
+        self.element_id = element_id
+        self.type = rel_type
+        self.start_node = start_node
+        self.end_node = end_node
+
+
+@dataclass
+class FakePath:
+    nodes: List[FakeNode]
+    relationships: List[FakeRelationship]
+
+
+@dataclass
+class SyntheticGraph:
+    nodes: List[FakeNode] = field(default_factory=list)
+    relationships: List[FakeRelationship] = field(default_factory=list)
+    outgoing: Dict[str, List[FakeRelationship]] = field(default_factory=dict)
+    incoming: Dict[str, List[FakeRelationship]] = field(default_factory=dict)
+    by_ast_hash: Dict[str, List[FakeNode]] = field(default_factory=dict)
+    by_scope: Dict[Tuple, List[FakeNode]] = field(default_factory=dict)
+
+    def add_node(self, labels, **properties) -> FakeNode:
+        node = FakeNode(str(len(self.nodes) + 1), labels, **properties)
+        self.nodes.append(node)
+        self.by_ast_hash.setdefault(node.get("ast_hash"), []).append(node)
+        scope = (node.get("project_id"), node.get("class_name"), node.get("branch"))
+        self.by_scope.setdefault(scope, []).append(node)
+        return node
+
+    def add_relationship(self, rel_type: str, start_node: FakeNode, end_node: FakeNode):
+        rel = FakeRelationship(str(len(self.relationships) + 1), rel_type, start_node, end_node)
+        self.relationships.append(rel)
+        self.outgoing.setdefault(start_node.element_id, []).append(rel)
+        self.incoming.setdefault(end_node.element_id, []).append(rel)
+        return rel
+
+    def find_endpoints(self, target) -> List[FakeNode]:
+        """Tương đương _MATCH_ENDPOINT: cùng project/class/branch và method_name."""
+        scope = (target.get("project_id"), target.get("class_name"), target.get("branch"))
+        return [
+            node for node in self.by_scope.get(scope, [])
+            if node.get("method_name") == target.get("method_name")
+        ]
+
+    def methods(self) -> List[FakeNode]:
+        return [node for node in self.nodes if LABEL_METHOD in node.labels]
+
+
+def _ast_hash(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _method_body(class_name: str, method_name: str, lines: int, rng: random.Random) -> str:
+    body = [f"def {method_name}(self, request):"]
+    for i in range(lines - 1):
+        body.append(f"    value_{i} = self.{class_name.lower()}_{rng.randint(0, 999)}(request, {i})")
+    return "\n".join(body)
+
+
+def build_graph(
+    num_classes: int = 50,
+    methods_per_class: int = 8,
+    calls_per_method: int = 3,
+    content_lines: int = 20,
+    seed: int = 0,
+    project_id: str = "bench",
+    branch: str = "main",
+) -> SyntheticGraph:
+    """
+    Sinh code property graph ngẫu nhiên (có seed) với các label/quan hệ giống CPG thật:
+    Endpoint -CALL-> Method -CALL-> Method, Method -USE-> Class/Configuration,
+    Class -EXTEND/IMPLEMENT-> Class.
+    """
+    rng = random.Random(seed)
+    graph = SyntheticGraph()
+    common = {"project_id": project_id, "branch": branch}
+
+    classes = []
+    methods = []
+    for c in range(num_classes):
+        class_name = f"Service{c}"
+        class_node = graph.add_node(
+            [LABEL_CLASS],
+            class_name=class_name,
+            method_name=None,
+            name=class_name,
+            file_path=f"src/service{c}.py",
+            content=f"class {class_name}:\n    pass",
+            ast_hash=_ast_hash(f"class:{c}"),
+            **common,
+        )
+        classes.append(class_node)
+        for m in range(methods_per_class):
+            method_name = f"handle_{c}_{m}"
+            content = _method_body(class_name, method_name, content_lines, rng)
+            methods.append(graph.add_node(
+                [LABEL_METHOD],
+                class_name=class_name,
+                method_name=method_name,
+                name=method_name,
+                file_path=f"src/service{c}.py",
+                content=content,
+                ast_hash=_ast_hash(f"method:{c}:{m}"),
+                **common,
+            ))
+
+    configs = []
+    for k in range(max(1, num_classes // 10)):
+        configs.append(graph.add_node(
+            [LABEL_CONFIG],
+            class_name=f"Config{k}",
+            method_name=None,
+            name=f"app.setting_{k}",
+            file_path="config/app.yaml",
+            content=f"app.setting_{k}: {k}",
+            ast_hash=_ast_hash(f"config:{k}"),
+            **common,
+        ))
+
+    for method in methods:
+        for callee in rng.sample(methods, min(calls_per_method, len(methods))):
+            if callee is not method:
+                graph.add_relationship("CALL", method, callee)
+        graph.add_relationship("USE", method, rng.choice(classes))
+        if rng.random() < 0.2:
+            graph.add_relationship("USE", method, rng.choice(configs))
+
+    for i, class_node in enumerate(classes[1:], start=1):
+        parent = classes[rng.randrange(i)]
+        graph.add_relationship("EXTEND" if rng.random() < 0.5 else "IMPLEMENT", class_node, parent)
+
+    for e, method in enumerate(rng.sample(methods, max(1, len(methods) // 10))):
+        endpoint = graph.add_node(
+            [LABEL_ENDPOINT],
+            class_name=method["class_name"],
+            method_name=f"route_{e}",
+            name=f"route_{e}",
+            endpoint=f"/api/v1/resource/{e}",
+            file_path=method["file_path"],
+            content=f"@app.get('/api/v1/resource/{e}')",
+            ast_hash=_ast_hash(f"endpoint:{e}"),
+            **common,
+        )
+        graph.add_relationship("CALL", endpoint, method)
+
+    return graph
+
+
+def parse_relationship_filter(relationship_filter: str) -> List[Tuple[str, str]]:
+    """"CALL>|<IMPLEMENT" -> [("CALL", "out"), ("IMPLEMENT", "in")] (không hướng -> "both")."""
+    rules = []
+    for token in relationship_filter.split("|"):
+        if token.startswith("<"):
+            rules.append((token[1:], "in"))
+        elif token.endswith(">"):
+            rules.append((token[:-1], "out"))
+        else:
+            rules.append((token, "both"))
+    return rules
+
+
+def _neighbours(graph: SyntheticGraph, node: FakeNode, rules):
+    for rel_type, direction in rules:
+        if direction in ("out", "both"):
+            for rel in graph.outgoing.get(node.element_id, []):
+                if rel.type == rel_type:
+                    yield rel, rel.end_node
+        if direction in ("in", "both"):
+            for rel in graph.incoming.get(node.element_id, []):
+                if rel.type == rel_type:
+                    yield rel, rel.start_node
+
+
+def expand_paths(graph: SyntheticGraph, start: FakeNode, relationship_filter: str,
+                 min_level: int, max_level: int, limit: Optional[int] = None) -> List[FakePath]:
+    """BFS với uniqueness NODE_GLOBAL, giống apoc.path.expandConfig."""
+    rules = parse_relationship_filter(relationship_filter)
+    visited = {start.element_id}
+    frontier = [FakePath([start], [])]
+    paths = []
+    for _ in range(max_level):
+        next_frontier = []
+        for path in frontier:
+            for rel, neighbour in _neighbours(graph, path.nodes[-1], rules):
+                if neighbour.element_id in visited:
+                    continue
+                visited.add(neighbour.element_id)
+                extended = FakePath(path.nodes + [neighbour], path.relationships + [rel])
+                next_frontier.append(extended)
+                if len(extended.relationships) >= min_level:
+                    paths.append(extended)
+                    if limit is not None and len(paths) >= limit:
+                        return paths
+        frontier = next_frontier
+        if not frontier:
+            break
+    return paths
+
+
+def visited_nodes(path: FakePath) -> List[FakeNode]:
+    """Tương đương filtered_nodes / exclude_nodes trong _EXPAND_AND_FILTER."""
+    nodes, rels = path.nodes, path.relationships
+    excluded = {
+        nodes[i + 1].element_id for i, rel in enumerate(rels)
+        if rel.type == "BRANCH" and nodes[i + 1].get("branch") == "develop" and nodes[i].get("branch") == "main"
+    }
+    result = []
+    for i, rel in enumerate(rels):
+        nxt = nodes[i + 1]
+        keep = (
+            (rel.type == "CALL" and nxt.get("method_name") is not None)
+            or rel.type in ("IMPLEMENT", "EXTEND", "BRANCH")
+            or (rel.type == "USE" and nxt.get("method_name") is None)
+        )
+        if keep and nxt.element_id not in excluded:
+            result.append(nxt)
+    return result
+
+
+def subgraph(graph: SyntheticGraph, start: FakeNode, relationship_filter: str,
+             max_level: int, limit: int):
+    """Tương đương apoc.path.subgraphAll + bộ lọc cạnh của RELATED_SUBGRAPH_BY_AST_HASHES_QUERY."""
+    paths = expand_paths(graph, start, relationship_filter, 1, max_level, limit=limit)
+    nodes = {start.element_id: start}
+    for path in paths:
+        nodes[path.nodes[-1].element_id] = path.nodes[-1]
+    rule_types = {rel_type for rel_type, _ in parse_relationship_filter(relationship_filter)}
+    relationships = []
+    for element_id in nodes:
+        for rel in graph.outgoing.get(element_id, []):
+            if rel.type not in rule_types or rel.end_node.element_id not in nodes:
+                continue
+            if rel.type == "CALL" and rel.end_node.get("method_name") is None:
+                continue
+            if rel.type == "USE" and rel.end_node.get("method_name") is not None:
+                continue
+            if rel.type == "BRANCH" and rel.end_node.get("branch") == "main" and rel.start_node.get("branch") == "develop":
+                continue
+            relationships.append(rel)
+    return list(nodes.values()), relationships
+
+
+def write_snapshot(graph: SyntheticGraph, path: str) -> Dict:
+    """Ghi graph giả lập thành GraphSnapshot (node theo thứ tự label như export_snapshot)."""
+    from src_bot.neo4jdb.graph_snapshot import GraphSnapshotWriter
+    from src_bot.neo4jdb.neo4j_service import CPG_LABELS
+
+    writer = GraphSnapshotWriter(path)
+    for label in CPG_LABELS:
+        for node in graph.nodes:
+            if label in node.labels:
+                writer.add_node(node.element_id, node.id, sorted(node.labels), dict(node))
+    for rel in graph.relationships:
+        writer.add_relationship(rel.type, rel.start_node.element_id, rel.end_node.element_id)
+    return writer.finish(graph_version=1)
+
+
+def write_symbol_index(graph: SyntheticGraph, path: str) -> int:
+    """Dựng SymbolIndex từ graph giả lập (cùng các cột SYMBOL_QUERY trả về)."""
+    from src_bot.symbol_index import SymbolIndex
+
+    kinds = {LABEL_METHOD: "function", LABEL_CLASS: "class", LABEL_ENDPOINT: "endpoint", LABEL_CONFIG: "config"}
+    names = {"function": "method_name", "class": "class_name", "endpoint": "endpoint", "config": "name"}
+    rows = []
+    for node in graph.nodes:
+        kind = next((kinds[label] for label in node.labels if label in kinds), None)
+        name = node.get(names[kind]) if kind else None
+        if kind and name and node.get("ast_hash"):
+            rows.append({
+                "kind": kind,
+                "name": name,
+                "class_name": node.get("class_name"),
+                "file_path": node.get("file_path"),
+                "ast_hash": node.get("ast_hash"),
+            })
+    index = SymbolIndex(path)
+    try:
+        return index.rebuild(rows)
+    finally:
+        index.close()
+
+
+def build_diff(graph: SyntheticGraph, num_files: int = 5, hunks_per_file: int = 4,
+               lines_per_hunk: int = 6, seed: int = 0) -> Dict[str, str]:
+    """
+    Sinh unified diff cho `num_files` file, mỗi file gồm các hunk sửa method có thật trong file đó
+    của graph (để symbol index / vector search / traversal trả về kết quả).
+    Trả về {filename: patch (chỉ phần hunk)}.
+    """
+    rng = random.Random(seed)
+    methods_by_file: Dict[str, List[FakeNode]] = {}
+    for method in graph.methods():
+        methods_by_file.setdefault(method["file_path"], []).append(method)
+    files = {}
+    for file_path in rng.sample(sorted(methods_by_file), min(num_files, len(methods_by_file))):
+        hunks = []
+        start = 1
+        for _ in range(hunks_per_file):
+            method = rng.choice(methods_by_file[file_path])
+            source_lines = method["content"].split("\n")[:lines_per_hunk]
+            body = [f" {source_lines[0]}"]
+            for line in source_lines[1:]:
+                if rng.random() < 0.3:
+                    body.append(f"-{line}")
+                    body.append(f"+{line.replace('request', 'req')}")
+                else:
+                    body.append(f" {line}")
+            source_count = sum(1 for line in body if not line.startswith("+"))
+            target_count = sum(1 for line in body if not line.startswith("-"))
+            hunks.append(f"@@ -{start},{source_count} +{start},{target_count} @@ class {method['class_name']}:\n" + "\n".join(body))
+            start += source_count + 10
+        files[file_path] = "\n".join(hunks)
+    return files
+
+
+def unified_diff(files: Dict[str, str]) -> str:
+    return "".join(f"--- a/{name}\n+++ b/{name}\n{patch}\n" for name, patch in files.items())
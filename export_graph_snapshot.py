@@ -0,0 +1,27 @@
+import argparse
+from src_bot.config.config import configs
+from src_bot.neo4jdb.graph_snapshot import export_snapshot
+from src_bot.neo4jdb.neo4j_db import Neo4jDB
+from src_bot.neo4jdb.neo4j_service import Neo4jService
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Export code property graph từ Neo4j thành snapshot CSR cho GRAPH_BACKEND=snapshot"
+    )
+    parser.add_argument(
+        "--path",
+        default=configs.GRAPH_SNAPSHOT_PATH,
+        help="Thư mục snapshot (mặc định GRAPH_SNAPSHOT_PATH)",
+    )
+    args = parser.parse_args()
+
+    db = Neo4jDB()
+    try:
+        graph_version = Neo4jService(db).get_graph_version()
+        print(f"Exporting graph snapshot (version {graph_version}) to {args.path}...")
+        meta = export_snapshot(db.driver, args.path, graph_version=graph_version)
+        relationships = ", ".join(f"{rel_type}={count}" for rel_type, count in meta["relationships"].items())
+        print(f"Done: {meta['node_count']} nodes, {relationships}")
+    finally:
+        db.close()
@@ -1,17 +1,74 @@
+import argparse
+import queue
+import threading
 import weaviate
 import os
 from weaviate.classes.config import Configure, Property, DataType
+from weaviate.classes.query import Filter
 from weaviate.util import generate_uuid5
 from tqdm import tqdm
 from sentence_transformers import SentenceTransformer
 from src_bot.neo4jdb.neo4j_db import Neo4jDB
+from src_bot.neo4jdb.neo4j_service import Neo4jService
+from src_bot.config.config import configs
+from src_bot.embedding_store import EmbeddingStore
+from src_bot.symbol_index import SymbolIndex, rebuild_from_neo4j
+from src_bot.vector_index import export_collection
 
-def init_weaviate(client : weaviate.WeaviateClient = None, collection_name: str = None):
+# Các node được đưa vào Weaviate: label -> (biến, các cột id/type/name/content/source).
+_CHUNK_SOURCES = {
+    "MethodNode": (
+        "m", "m.ast_hash as id, 'Method' as type, m.name as name, m.content as content, m.file_path as source"
+    ),
+    "EndpointNode": (
+        "e", "e.ast_hash as id, 'Endpoint' as type, e.name as name, 'API Endpoint: ' + e.endpoint as content, 'N/A' as source"
+    ),
+    "ConfigurationNode": (
+        "c", "c.ast_hash as id, 'Configuration' as type, c.name as name, c.content as content, c.file_path as source"
+    ),
+    "ClassNode": (
+        "cl", "cl.ast_hash as id, 'Class' as type, cl.name as name, 'Class definition for ' + cl.name as content, cl.file_path as source"
+    ),
+}
+
+# content_hash phủ mọi property được upload để sync incremental phát hiện thay đổi.
+_CHUNK_RETURN = """
+RETURN id, type, name, content, source,
+       apoc.util.sha256([type, coalesce(name, ''), coalesce(content, ''), coalesce(source, '')]) as content_hash
+"""
+
+# Ingest toàn bộ: quét từng label
+CHUNK_QUERY = "CALL {\n" + "\n    UNION ALL\n".join(
+    f"    MATCH ({var}:{label})\n    RETURN {columns}"
+    for label, (var, columns) in _CHUNK_SOURCES.items()
+) + "\n}" + _CHUNK_RETURN
+
+# Lấy theo danh sách ast_hash: mỗi label một query để Neo4j seek index {label}_ast_hash
+# (`$ids IS NULL OR ... IN $ids` trong cùng một query buộc planner quét cả label)
+CHUNK_BY_IDS_QUERIES = [
+    f"UNWIND $ids AS key\nMATCH ({var}:{label} {{ast_hash: key}})\nWITH {columns}" + _CHUNK_RETURN
+    for label, (var, columns) in _CHUNK_SOURCES.items()
+]
+
+# Giống CHUNK_QUERY nhưng chỉ trả về id + content_hash (dùng để diff với Weaviate)
+CHUNK_HASH_QUERY = CHUNK_QUERY.replace(
+    "RETURN id, type, name, content, source,",
+    "RETURN id,",
+)
+
+DELETE_BATCH_SIZE = 1000
+
+
+def init_weaviate(client : weaviate.WeaviateClient = None, collection_name: str = None, recreate: bool = False):
     COLLECTION = collection_name
-    
+
     if not COLLECTION:
         raise ValueError("WEAVIATE_COLLECTION_NAME is not set in environment variables.")
 
+    if client.collections.exists(COLLECTION) and not recreate:
+        _ensure_content_hash_property(client.collections.use(COLLECTION))
+        return
+
     try:
         client.collections.delete(COLLECTION)
         print(f"Đã xóa {COLLECTION}")
@@ -50,93 +107,234 @@ def init_weaviate(client : weaviate.WeaviateClient = None, collection_name: str
                 index_filterable=True,
                 index_searchable=False,
             ),
+            Property(
+                name="content_hash",
+                data_type=DataType.TEXT,
+                index_filterable=True,
+                index_searchable=False,
+            ),
         ],
     )
 
         print("✅ Collection created")
     except Exception:
         pass
-    finally:
-        client.close()
 
-def ingest_to_weaviate(client : weaviate.WeaviateClient = None, collection_name: str = None):
 
-    if not collection_name:
-        raise ValueError("WEAVIATE_COLLECTION_NAME is not set in environment variables.")
+def _ensure_content_hash_property(collection):
+    """Collection tạo trước khi có sync incremental chưa có content_hash."""
+    properties = {prop.name for prop in collection.config.get().properties}
+    if "content_hash" not in properties:
+        collection.config.add_property(
+            Property(
+                name="content_hash",
+                data_type=DataType.TEXT,
+                index_filterable=True,
+                index_searchable=False,
+            )
+        )
+        print("Đã thêm property content_hash")
 
-    db = Neo4jDB()
 
-    def run_query(query, params=None):
-        with db.driver.session() as session:
-            result = session.run(query, params)
-            return [record.data() for record in result]
+def _stream_query(db: Neo4jDB, query, params=None):
+    """Đọc kết quả theo cursor, mỗi lần Neo4j chỉ gửi INGEST_FETCH_SIZE record."""
+    with db.driver.session(fetch_size=configs.INGEST_FETCH_SIZE) as session:
+        for record in session.run(query, params):
+            yield record.data()
 
-    q = """
-        MATCH (m:MethodNode) 
-    RETURN m.ast_hash as id, 'Method' as type, m.name as name, m.content as content, m.file_path as source
-    UNION ALL
 
-    MATCH (e:EndpointNode)
-    RETURN e.ast_hash as id, 'Endpoint' as type, e.name as name, 'API Endpoint: ' + e.endpoint as content, 'N/A' as source
-    UNION ALL
+def _stream_chunks_by_ids(db: Neo4jDB, ids):
+    for i in range(0, len(ids), configs.INGEST_FETCH_SIZE):
+        params = {"ids": ids[i:i + configs.INGEST_FETCH_SIZE]}
+        for query in CHUNK_BY_IDS_QUERIES:
+            yield from _stream_query(db, query, params)
 
-    MATCH (c:ConfigurationNode)
-    RETURN c.ast_hash as id, 'Configuration' as type, c.name as name, c.content as content, c.file_path as source
-    UNION ALL
 
-    MATCH (cl:ClassNode)
-    RETURN cl.ast_hash as id, 'Class' as type, cl.name as name, 'Class definition for ' + cl.name as content, cl.file_path as source
-    """
+def _micro_batches(chunks, size):
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
-    chunks = run_query(q)
 
-    model = SentenceTransformer(
-        "microsoft/codebert-base",
-        device="cpu"
+def _load_model():
+    return SentenceTransformer(
+        configs.EMBEDDING_MODEL_NAME,
+        device=configs.EMBEDDING_DEVICE
     )
 
-    texts = [chunk["content"] for chunk in chunks]
-
-    print("Generating embeddings...")
-    embeddings = model.encode(
-        texts,
-        batch_size=64,         
-        show_progress_bar=True,
-        normalize_embeddings=True
-    )
 
-    # Gắn embeddings
-    for i, chunk in enumerate(chunks):
-        chunk["embedding"] = embeddings[i].tolist()
+class _Encoder:
+    """
+    Encode trong process hiện tại, hoặc chia cho một pool `workers` process
+    (mỗi process giữ một bản model, dùng `threads_per_worker` thread CPU).
+    encode_multi_process giữ nguyên thứ tự đầu ra.
+    """
 
-    collection = client.collections.use(collection_name)
+    def __init__(self, model, workers: int = 1, threads_per_worker: int = 1):
+        self.model = model
+        self.workers = workers
+        self.pool = None
+        if workers > 1:
+            # Process con được spawn nên đọc số thread từ biến môi trường khi import torch
+            for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+                os.environ[var] = str(threads_per_worker)
+            self.pool = model.start_multi_process_pool(target_devices=["cpu"] * workers)
+            print(f"Started {workers} encode worker(s) with {threads_per_worker} thread(s) each")
 
-    # Batch ingest + progress bar
-    with collection.batch.fixed_size(batch_size=10) as batch:
-        for chunk in tqdm(
-            chunks,
-            desc="📥 Ingesting chunks",
-            unit="chunk",
-            ncols=100,
-        ):
-            properties = {
-                "name": chunk["name"],
-                "content": chunk["content"],
-                "file_path": chunk["source"],
-                "node_type": chunk["type"],
-                "ast_hash": chunk["id"],
-            }
-
-            uuid = generate_uuid5(chunk["id"])
-
-            batch.add_object(
-                properties=properties,
-                uuid=uuid,
-                vector=chunk["embedding"],
+    def __call__(self, texts):
+        if self.pool is None:
+            return self.model.encode(
+                texts,
+                batch_size=configs.INGEST_ENCODE_BATCH_SIZE,
+                normalize_embeddings=True
             )
+        return self.model.encode_multi_process(
+            texts,
+            self.pool,
+            batch_size=configs.INGEST_ENCODE_BATCH_SIZE,
+            chunk_size=configs.INGEST_ENCODE_BATCH_SIZE,
+            normalize_embeddings=True
+        )
+
+    def close(self):
+        if self.pool is not None:
+            self.model.stop_multi_process_pool(self.pool)
+            self.pool = None
+
+
+def _ingest_stream(collection, chunks, total: int = None, encode_workers: int = None) -> int:
+    """
+    Pipeline streaming: Neo4j cursor -> micro-batch embedding -> Weaviate batch upload.
+    Ba giai đoạn chạy song song, nối với nhau bằng queue giới hạn INGEST_MAX_IN_FLIGHT
+    micro-batch nên bộ nhớ không phụ thuộc vào kích thước graph.
+    Trả về số chunk đã upload.
+    """
+    encode_workers = encode_workers or configs.INGEST_ENCODE_WORKERS
+    encoder = _Encoder(_load_model(), encode_workers, configs.INGEST_THREADS_PER_WORKER)
+    # Mỗi micro-batch cần đủ lớn để chia việc cho tất cả worker
+    micro_batch_size = max(configs.INGEST_EMBED_BATCH_SIZE, encode_workers * configs.INGEST_ENCODE_BATCH_SIZE)
+    embedding_store = EmbeddingStore(configs.EMBEDDING_MODEL_NAME)
+    embed_queue = queue.Queue(maxsize=configs.INGEST_MAX_IN_FLIGHT)
+    upload_queue = queue.Queue(maxsize=configs.INGEST_MAX_IN_FLIGHT)
+    failed = threading.Event()
+    errors = []
+
+    def put(q, item):
+        # Không block mãi nếu stage phía sau đã lỗi
+        while not failed.is_set():
+            try:
+                q.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        # None = hết dữ liệu hoặc một stage khác đã lỗi
+        while not failed.is_set():
+            try:
+                return q.get(timeout=1)
+            except queue.Empty:
+                continue
+        return None
+
+    def embed_worker():
+        try:
+            while True:
+                batch = get(embed_queue)
+                if batch is None:
+                    break
+                # Chỉ encode những content chưa có trong embedding store
+                embeddings = embedding_store.encode([chunk["content"] for chunk in batch], encoder)
+                if not put(upload_queue, (batch, embeddings)):
+                    return
+        except Exception as e:
+            errors.append(e)
+            failed.set()
+        finally:
+            put(upload_queue, None)
+
+    uploaded = 0
+    progress = tqdm(total=total, desc="📥 Ingesting chunks", unit="chunk", ncols=100)
+
+    def upload_worker():
+        nonlocal uploaded
+        try:
+            # UUID cố định theo ast_hash nên object cũ bị ghi đè (upsert)
+            with collection.batch.fixed_size(batch_size=configs.INGEST_UPLOAD_BATCH_SIZE) as batch:
+                while True:
+                    item = get(upload_queue)
+                    if item is None:
+                        break
+                    chunks_batch, embeddings = item
+                    for chunk, embedding in zip(chunks_batch, embeddings):
+                        batch.add_object(
+                            properties={
+                                "name": chunk["name"],
+                                "content": chunk["content"],
+                                "file_path": chunk["source"],
+                                "node_type": chunk["type"],
+                                "ast_hash": chunk["id"],
+                                "content_hash": chunk["content_hash"],
+                            },
+                            uuid=generate_uuid5(chunk["id"]),
+                            vector=embedding,
+                        )
+                    uploaded += len(chunks_batch)
+                    progress.update(len(chunks_batch))
+        except Exception as e:
+            errors.append(e)
+            failed.set()
+
+    embedder = threading.Thread(target=embed_worker, name="ingest-embed", daemon=True)
+    uploader = threading.Thread(target=upload_worker, name="ingest-upload", daemon=True)
+    embedder.start()
+    uploader.start()
+    try:
+        for batch in _micro_batches(chunks, micro_batch_size):
+            if not put(embed_queue, batch):
+                break
+    finally:
+        put(embed_queue, None)
+        embedder.join()
+        uploader.join()
+        progress.close()
+        embedding_store.close()
+        encoder.close()
+
+    if errors:
+        raise errors[0]
+    return uploaded
+
+
+def export_vector_index(client: weaviate.WeaviateClient, collection_name: str, path: str = None, dtype: str = None):
+    """Export collection (vector + metadata) ra MmapVectorIndex cho RETRIEVAL_BACKEND=mmap."""
+    if not collection_name:
+        raise ValueError("WEAVIATE_COLLECTION_NAME is not set in environment variables.")
+    path = path or configs.VECTOR_INDEX_PATH
+    exported = export_collection(client.collections.use(collection_name), path, dtype=dtype)
+    print(f"✅ Exported {exported} objects to vector index {path}")
+    return exported
+
+
+def rebuild_symbol_index(db: Neo4jDB, path: str = None):
+    """Dựng lại index tên symbol -> ast_hash cho fast path của retrieval (SYMBOL_INDEX_PATH)."""
+    path = path or configs.SYMBOL_INDEX_PATH
+    index = SymbolIndex(path)
+    try:
+        indexed = rebuild_from_neo4j(db.driver, index)
+    finally:
+        index.close()
+    print(f"✅ Indexed {indexed} symbols into {path}")
+    return indexed
 
-    print(f"✅ Ingested {len(chunks)} documents into Weaviate")
 
+def _report(collection):
     # Kiểm tra total count (v4)
     agg = collection.aggregate.over_all(total_count=True)
     print(f"Total documents in DB: {agg.total_count}")
@@ -147,10 +345,129 @@ def ingest_to_weaviate(client : weaviate.WeaviateClient = None, collection_name:
         print(f"⚠️ Failed objects: {len(failed)}")
         print("First failed object:", failed[0])
 
+
+def ingest_to_weaviate(client : weaviate.WeaviateClient = None, collection_name: str = None, encode_workers: int = None):
+
+    if not collection_name:
+        raise ValueError("WEAVIATE_COLLECTION_NAME is not set in environment variables.")
+
+    db = Neo4jDB()
+
+    collection = client.collections.use(collection_name)
+    ingested = _ingest_stream(
+        collection, _stream_query(db, CHUNK_QUERY), encode_workers=encode_workers
+    )
+
+    print(f"✅ Ingested {ingested} documents into Weaviate")
+    _report(collection)
+
+    rebuild_symbol_index(db)
+
+    # Báo cho các bot đang chạy rằng graph đã thay đổi (xoá traversal cache)
+    Neo4jService(db).bump_graph_version()
+    db.close()
+
     client.close()
 
+
+def sync_to_weaviate(client : weaviate.WeaviateClient = None, collection_name: str = None, encode_workers: int = None):
+    """
+    Sync incremental: so sánh ast_hash/content_hash trong Neo4j với các object đã có trong
+    Weaviate (UUID = generate_uuid5(ast_hash)), chỉ embed + upsert node mới/thay đổi và xoá
+    node đã bị gỡ. Collection không bị xoá nên retrieval vẫn hoạt động trong lúc sync.
+    """
+    if not collection_name:
+        raise ValueError("WEAVIATE_COLLECTION_NAME is not set in environment variables.")
+
+    db = Neo4jDB()
+    collection = client.collections.use(collection_name)
+
+    desired = {}
+    for row in _stream_query(db, CHUNK_HASH_QUERY):
+        if row["id"]:
+            desired[str(generate_uuid5(row["id"]))] = (row["id"], row["content_hash"])
+
+    existing = {}
+    for obj in tqdm(
+        collection.iterator(return_properties=["content_hash"]),
+        desc="🔎 Scanning Weaviate",
+        unit="obj",
+        ncols=100,
+    ):
+        existing[str(obj.uuid)] = obj.properties.get("content_hash")
+
+    changed_ids = [
+        ast_hash
+        for uuid, (ast_hash, content_hash) in desired.items()
+        if existing.get(uuid) != content_hash
+    ]
+    removed_uuids = [uuid for uuid in existing if uuid not in desired]
+    print(
+        f"Neo4j: {len(desired)} nodes, Weaviate: {len(existing)} objects -> "
+        f"{len(changed_ids)} to upsert, {len(removed_uuids)} to delete"
+    )
+
+    if changed_ids:
+        _ingest_stream(
+            collection,
+            _stream_chunks_by_ids(db, changed_ids),
+            total=len(changed_ids),
+            encode_workers=encode_workers,
+        )
+
+    for i in range(0, len(removed_uuids), DELETE_BATCH_SIZE):
+        collection.data.delete_many(
+            where=Filter.by_id().contains_any(removed_uuids[i:i + DELETE_BATCH_SIZE])
+        )
+
+    print(f"✅ Synced {len(changed_ids)} upserts and {len(removed_uuids)} deletions into Weaviate")
+    _report(collection)
+
+    rebuild_symbol_index(db)
+
+    # Quan hệ trong graph có thể đổi dù node không đổi, nên luôn bump version
+    Neo4jService(db).bump_graph_version()
+    db.close()
+
+    client.close()
+
+
 if __name__ == "__main__":
-    client = weaviate.connect_to_local()
+    parser = argparse.ArgumentParser(description="Đồng bộ node từ Neo4j sang Weaviate")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Xoá và tạo lại collection rồi ingest toàn bộ (mặc định: sync incremental)",
+    )
+    parser.add_argument(
+        "--encode-workers",
+        type=int,
+        default=None,
+        help="Số process encode song song, mỗi process một bản model (mặc định: INGEST_ENCODE_WORKERS)",
+    )
+    parser.add_argument(
+        "--export-index",
+        action="store_true",
+        help="Sau khi sync, export collection ra vector index mmap (dùng với RETRIEVAL_BACKEND=mmap)",
+    )
+    parser.add_argument("--export-only", action="store_true", help="Chỉ export vector index, không sync")
+    parser.add_argument("--index-dtype", choices=["float32", "float16"], default=None,
+                        help="Kiểu lưu vector của index (mặc định: VECTOR_INDEX_DTYPE)")
+    args = parser.parse_args()
+
     collection_name = os.getenv("WEAVIATE_COLLECTION_NAME", None)
-    init_weaviate(client, collection_name)
-    ingest_to_weaviate(client, collection_name)
\ No newline at end of file
+    if not args.export_only:
+        client = weaviate.connect_to_local()
+        init_weaviate(client, collection_name, recreate=args.full)
+        if args.full:
+            ingest_to_weaviate(client, collection_name, encode_workers=args.encode_workers)
+        else:
+            sync_to_weaviate(client, collection_name, encode_workers=args.encode_workers)
+
+    if args.export_index or args.export_only:
+        # ingest/sync đã đóng client nên mở kết nối mới để export
+        client = weaviate.connect_to_local()
+        try:
+            export_vector_index(client, collection_name, dtype=args.index_dtype)
+        finally:
+            client.close()
@@ -0,0 +1,35 @@
+import argparse
+import sys
+from src_bot.neo4jdb.neo4j_db import Neo4jDB
+from src_bot.neo4jdb.neo4j_schema import check_query_plans, create_schema
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tạo index/constraint Neo4j cho code property graph")
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Chỉ EXPLAIN các query của Neo4jService, exit 1 nếu có AllNodesScan/NodeByLabelScan",
+    )
+    parser.add_argument(
+        "--no-check",
+        action="store_true",
+        help="Không kiểm tra query plan sau khi tạo schema",
+    )
+    args = parser.parse_args()
+
+    db = Neo4jDB()
+    try:
+        if not args.check:
+            print("Creating Neo4j schema...")
+            create_schema(db.driver)
+
+        if args.check or not args.no_check:
+            failures = check_query_plans(db.driver)
+            for name, operators in failures.items():
+                print(f"FAIL {name}: {', '.join(operators)}")
+            if failures:
+                sys.exit(1)
+            print("Query plans OK: mọi lookup đều dùng index.")
+    finally:
+        db.close()
@@ -1,26 +1,98 @@
-from typing import TypedDict, List
-from langgraph.graph import StateGraph, END
-from langchain_core.prompts import ChatPromptTemplate
-from src_bot.graph_retriever import CustomGraphRAGRetriever
-from langchain_ollama import ChatOllama
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple, TypedDict
+from src_bot.diff_symbols import DiffSymbol, symbol_queries
+from src_bot.graph_retriever import CustomGraphRAGRetriever, connect_weaviate, dedupe_hits, load_embedding_model
+from src_bot.llm_gateway import LLMGateway
+from src_bot.vector_index import open_vector_index
+from src_bot.neo4jdb.neo4j_service import Neo4jService
+from src_bot.neo4jdb.snapshot_service import GraphSnapshotService
+from src_bot.readiness import Readiness, readiness_instance
+from src_bot.review_cache import ReviewCache, review_key
+from src_bot.config.config import configs
+from src_bot import metrics
+
+# Tăng version mỗi khi sửa REVIEW_PROMPT để không dùng lại review cũ trong cache
+REVIEW_PROMPT_VERSION = "1"
+
+REVIEW_PROMPT = """Bạn là Senior Code Reviewer & Security Auditor.
+        
+        Nhiệm vụ: Review đoạn code diff dựa trên NGỮ CẢNH HỆ THỐNG được cung cấp.
+        
+        NGỮ CẢNH HỆ THỐNG (Từ Knowledge Graph):
+        {graph_context}
+        
+        PULL REQUEST DIFF:
+        {pr_diff}
+        
+        HƯỚNG DẪN REVIEW:
+        1. **Endpoint & Security**: Nếu thay đổi liên quan đến Endpoint, hãy kiểm tra xem nó có gọi hàm xác thực (Auth) nào trong ngữ cảnh không?
+        2. **Configuration Impact**: Nếu thay đổi liên quan đến Configuration, hãy cảnh báo tất cả các hàm (Methods) đang sử dụng config đó.
+        3. **Logic Flow**: Kiểm tra các hàm gọi (Callers) để đảm bảo thay đổi không phá vỡ logic cũ.
+        
+        Hãy trả về định dạng Markdown, chia rõ các mục: [Tóm tắt], [Phân tích tác động], [Cảnh báo bảo mật], [Đề xuất].
+        """
 
 class CodeReviewState(TypedDict):
     pr_diff: str                 # Input: Nội dung Git Diff
-    changed_files: List[str]     # Danh sách file/hàm thay đổi
+    pr_size: int                 # Tổng số ký tự diff của cả PR: PR nhỏ được LLMGateway ưu tiên
+    changed_files: List[str]     # Query cho vector search: mỗi symbol thay đổi một query
+    changed_symbols: List[DiffSymbol]  # Symbol tương ứng với changed_files (rỗng nếu dùng cả diff)
+    query_hits: List[List[dict]] # Kết quả vector search đã prefetch theo batch (tuỳ chọn)
     context_data: List[str]      # Dữ liệu lấy từ GraphRAG
+    context_report: dict         # Thống kê đóng gói context (token, relationship bị bỏ)
     final_review: str            # Output: Kết quả review
+
+
+@dataclass(slots=True)
+class _ReviewRequest:
+    """Prompt review của một file chưa có trong review cache."""
+    cache_key: str
+    messages: list
+    pr_size: int
+
+
 class GraphRAGBot:
     def __init__(self):
         self.app = None
+        self.async_app = None
         self.retriever = None
-        self.llm = None
+        self.llm_gateway = None
+        self.review_cache = None
 
-    def initialize(self):
-        self.retriever = CustomGraphRAGRetriever()
-        self.llm = ChatOllama(
-            model="deepseek-coder:1.3b-instruct",
-            temperature=0,     
-        )
+    def initialize(self, readiness: Readiness = readiness_instance):
+        """
+        Kết nối Neo4j/Weaviate, load + warm-up embedding model và warm-up LLM song song,
+        trạng thái từng bước được ghi vào `readiness`.
+        """
+        self.llm_gateway = LLMGateway()
+        self.review_cache = ReviewCache()
+        with ThreadPoolExecutor(max_workers=4, thread_name_prefix="startup") as executor:
+            if configs.GRAPH_BACKEND == "snapshot":
+                neo4j_future = executor.submit(readiness.run, "graph_snapshot", GraphSnapshotService)
+            else:
+                neo4j_future = executor.submit(readiness.run, "neo4j", self._connect_neo4j)
+            if configs.RETRIEVAL_BACKEND == "mmap":
+                index_future = executor.submit(readiness.run, "vector_index", open_vector_index)
+                weaviate_future = None
+            else:
+                weaviate_future = executor.submit(readiness.run, "weaviate", self._connect_weaviate)
+                index_future = None
+            model_future = executor.submit(readiness.run, "embedding_model", self._load_embedding_model)
+            llm_future = executor.submit(readiness.run, "llm", self.llm_gateway.initialize)
+            self.retriever = CustomGraphRAGRetriever(
+                neo4j_service=neo4j_future.result(),
+                model=model_future.result(),
+                weaviate_client=weaviate_future.result() if weaviate_future else None,
+                vector_index=index_future.result() if index_future else None,
+            )
+            llm_future.result()
+
+        self.compile_graphs()
+
+    def compile_graphs(self):
+        """Dựng LangGraph sync/async từ retriever và llm_gateway hiện tại (benchmark gán thẳng bản giả lập)."""
+        from langgraph.graph import StateGraph, END
 
         workflow = StateGraph(CodeReviewState)
         workflow.add_node("parse", self.parse_diff_node)
@@ -34,75 +106,240 @@ class GraphRAGBot:
 
         self.app = workflow.compile()
 
+        async_workflow = StateGraph(CodeReviewState)
+        async_workflow.add_node("parse", self.parse_diff_node)
+        async_workflow.add_node("retrieve", self.aretrieve_node)
+        async_workflow.add_node("review", self.areview_node)
+
+        async_workflow.set_entry_point("parse")
+        async_workflow.add_edge("parse", "retrieve")
+        async_workflow.add_edge("retrieve", "review")
+        async_workflow.add_edge("review", END)
+
+        self.async_app = async_workflow.compile()
+
+    def _connect_neo4j(self) -> Neo4jService:
+        neo4j_service = Neo4jService()
+        neo4j_service.db.driver.verify_connectivity()
+        return neo4j_service
+
+    def _connect_weaviate(self):
+        client = connect_weaviate()
+        if not client.is_ready():
+            client.close()
+            raise Exception("Weaviate chưa sẵn sàng")
+        return client
+
+    def _load_embedding_model(self):
+        model = load_embedding_model()
+        # Warm-up: lần encode đầu tiên chậm hơn hẳn (khởi tạo kernel, cấp phát bộ nhớ)
+        model.encode(["def warm_up(): pass"], normalize_embeddings=True)
+        return model
+
+    async def ainitialize(self):
+        """Khởi tạo client async cho retriever, gọi trên event loop sẽ chạy review."""
+        await self.retriever.ainitialize()
+
+    async def aclose(self):
+        if self.retriever:
+            await self.retriever.aclose()
+
     def invoke(self, inputs):
         if not self.app:
             raise Exception("Bot chưa được initialize!")
         return self.app.invoke(inputs)
 
+    def retrieve(self, inputs) -> CodeReviewState:
+        """Chạy riêng giai đoạn parse + retrieve (dùng cho pipeline song song)."""
+        if not self.app:
+            raise Exception("Bot chưa được initialize!")
+        state = dict(inputs)
+        if "changed_files" not in state:
+            state.update(self.parse_diff_node(state))
+        state.update(self.retrieve_node(state))
+        return state
+
+    def prefetch(self, inputs_list) -> List[CodeReviewState]:
+        """
+        Parse diff của mọi file trong PR rồi chạy retrieval cho tất cả query trong một batch
+        (symbol tra được trong symbol index lấy thẳng theo ast_hash, phần còn lại một lần encode,
+        các hybrid query gửi song song). Kết quả được gắn vào state để
+        retrieve() chỉ còn phải mở rộng graph.
+        """
+        if not self.app:
+            raise Exception("Bot chưa được initialize!")
+        states = [self._parsed(inputs) for inputs in inputs_list]
+        all_hits = self.retriever.symbol_search_batch(*self._search_args(states), top_k=3)
+        return self._attach_hits(states, all_hits)
+
+    def review(self, state: CodeReviewState) -> CodeReviewState:
+        """Chạy riêng giai đoạn sinh review từ state đã retrieve."""
+        if not self.app:
+            raise Exception("Bot chưa được initialize!")
+        state = dict(state)
+        state.update(self.review_node(state))
+        return state
+
+    async def ainvoke(self, inputs):
+        if not self.async_app:
+            raise Exception("Bot chưa được initialize!")
+        return await self.async_app.ainvoke(inputs)
+
+    async def aretrieve(self, inputs) -> CodeReviewState:
+        if not self.async_app:
+            raise Exception("Bot chưa được initialize!")
+        state = dict(inputs)
+        if "changed_files" not in state:
+            state.update(self.parse_diff_node(state))
+        state.update(await self.aretrieve_node(state))
+        return state
+
+    async def aprefetch(self, inputs_list) -> List[CodeReviewState]:
+        if not self.async_app:
+            raise Exception("Bot chưa được initialize!")
+        states = [self._parsed(inputs) for inputs in inputs_list]
+        all_hits = await self.retriever.asymbol_search_batch(*self._search_args(states), top_k=3)
+        return self._attach_hits(states, all_hits)
+
+    async def areview(self, state: CodeReviewState) -> CodeReviewState:
+        if not self.async_app:
+            raise Exception("Bot chưa được initialize!")
+        state = dict(state)
+        state.update(await self.areview_node(state))
+        return state
+
+    def _parsed(self, inputs) -> CodeReviewState:
+        state = dict(inputs)
+        state.update(self.parse_diff_node(state))
+        return state
+
+    @classmethod
+    def _search_args(cls, states: List[CodeReviewState]) -> Tuple[List[str], List[DiffSymbol]]:
+        """(query, symbol tương ứng) của mọi file, theo thứ tự file rồi thứ tự query."""
+        queries = [query for state in states for query in state["changed_files"]]
+        symbols = [symbol for state in states for symbol in cls._query_symbols(state)]
+        return queries, symbols
+
+    @staticmethod
+    def _query_symbols(state: CodeReviewState) -> List[DiffSymbol]:
+        """Symbol song song với changed_files (None khi query là cả diff và không có symbol)."""
+        symbols = state.get("changed_symbols") or []
+        if len(symbols) != len(state["changed_files"]):
+            return [None] * len(state["changed_files"])
+        return symbols
+
+    def _attach_hits(self, states: List[CodeReviewState], all_hits: List[List[dict]]) -> List[CodeReviewState]:
+        offset = 0
+        for state in states:
+            count = len(state["changed_files"])
+            state["query_hits"] = all_hits[offset:offset + count]
+            offset += count
+        return states
+
     def close(self):
         if self.retriever:
             self.retriever.close()
+        if self.review_cache:
+            print(f"Review cache: {self.review_cache.stats()}")
+            self.review_cache.close()
     
+    @metrics.track_stage("parse")
     def parse_diff_node(self, state: CodeReviewState):
         # print("--- STEP 1: PARSING DIFF ---")
-        diff = state["pr_diff"]
-        # queries = []
-        # lines = diff.split('\n')
-        # for line in lines:
-        #     if line.startswith('def ') or line.startswith('class '):
-        #         queries.append(line.strip())
-        #     if "config" in line or "yaml" in line:
-        #         queries.append("configuration settings")
-
-        # # Nếu không parse được gì cụ thể, dùng cả đoạn diff làm query tìm kiếm
-        # if not queries:
-        #     queries = [diff[:200]] 
-            
-        return {"changed_files": [diff]}
+        queries, symbols = symbol_queries(state["pr_diff"])
+        return {"changed_files": queries, "changed_symbols": symbols}
 
+    @metrics.track_stage("retrieve")
     def retrieve_node(self,state: CodeReviewState):
         print("--- STEP 2: RETRIEVING GRAPH CONTEXT ---")
-        queries = state["changed_files"]
-        collected_context = []
-        
-        for query in queries:
-            results = self.retriever.search(query_text=query, top_k=3)
-            collected_context.extend(results)
-            
-        return {"context_data": collected_context}
+        query_hits = state.get("query_hits")
+        if query_hits is None:
+            query_hits = self.retriever.symbol_search_batch(*self._search_args([state]), top_k=3)
+        # Nhiều symbol có thể trỏ về cùng một node: mỗi ast_hash chỉ mở rộng graph một lần
+        return self._pack_context(self.retriever.expand_relationships_batch(dedupe_hits(query_hits)))
 
+    @metrics.track_stage("retrieve")
+    async def aretrieve_node(self, state: CodeReviewState):
+        print("--- STEP 2: RETRIEVING GRAPH CONTEXT (async) ---")
+        query_hits = state.get("query_hits")
+        if query_hits is None:
+            query_hits = await self.retriever.asymbol_search_batch(*self._search_args([state]), top_k=3)
+        return self._pack_context(await self.retriever.aexpand_relationships_batch(dedupe_hits(query_hits)))
+
+    def _pack_context(self, relationships_per_query):
+        """Gộp relationship của mọi query trong file rồi đóng gói trong token budget."""
+        relationships = [rel for rels in relationships_per_query for rel in rels]
+        packed = self.retriever.context_packer.pack(relationships)
+        metrics.CONTEXT_TOKENS.observe(packed.tokens)
+        metrics.CONTEXT_RELATIONSHIPS.labels("included").observe(packed.included)
+        metrics.CONTEXT_RELATIONSHIPS.labels("dropped").observe(len(packed.dropped))
+        if packed.dropped:
+            print(f"  -> Context: {packed.summary()}")
+        return {
+            "context_data": [packed.text] if packed.text else [],
+            "context_report": {
+                "tokens": packed.tokens,
+                "included": packed.included,
+                "dropped": packed.dropped,
+            },
+        }
+
+    @metrics.track_stage("review")
     def review_node(self,state: CodeReviewState):
         print("--- STEP 3: GENERATING REVIEW ---")
-        system_prompt = """Bạn là Senior Code Reviewer & Security Auditor.
-        
-        Nhiệm vụ: Review đoạn code diff dựa trên NGỮ CẢNH HỆ THỐNG được cung cấp.
-        
-        NGỮ CẢNH HỆ THỐNG (Từ Knowledge Graph):
-        {graph_context}
-        
-        PULL REQUEST DIFF:
-        {pr_diff}
-        
-        HƯỚNG DẪN REVIEW:
-        1. **Endpoint & Security**: Nếu thay đổi liên quan đến Endpoint, hãy kiểm tra xem nó có gọi hàm xác thực (Auth) nào trong ngữ cảnh không?
-        2. **Configuration Impact**: Nếu thay đổi liên quan đến Configuration, hãy cảnh báo tất cả các hàm (Methods) đang sử dụng config đó.
-        3. **Logic Flow**: Kiểm tra các hàm gọi (Callers) để đảm bảo thay đổi không phá vỡ logic cũ.
-        
-        Hãy trả về định dạng Markdown, chia rõ các mục: [Tóm tắt], [Phân tích tác động], [Cảnh báo bảo mật], [Đề xuất].
+        result, request = self._review_request(state)
+        if request is None:
+            return result
+        return self._store_review(request, self.llm_gateway.generate(request.messages, pr_size=request.pr_size))
+
+    @metrics.track_stage("review")
+    async def areview_node(self, state: CodeReviewState):
+        print("--- STEP 3: GENERATING REVIEW (async) ---")
+        result, request = self._review_request(state)
+        if request is None:
+            return result
+        return self._store_review(request, await self.llm_gateway.agenerate(request.messages, pr_size=request.pr_size))
+
+    def _review_request(self, state: CodeReviewState) -> Tuple[Optional[dict], Optional[_ReviewRequest]]:
+        """
+        ({"final_review": ...}, None) khi không cần gọi LLM (không có context hoặc cache hit),
+        ngược lại (None, prompt cần generate).
         """
         context_str = "\n".join(state["context_data"]) if len(state["context_data"]) > 0 else None
-        content = None
-        if context_str:
-            prompt = ChatPromptTemplate.from_template(system_prompt)
-            chain = prompt | self.llm
-            response = chain.invoke({
-                "graph_context": context_str,
-                "pr_diff": state["pr_diff"]
-            })
-            content = response.content
+        if not context_str:
+            return {"final_review": None}, None
+
+        cache_key = self._review_cache_key(state["pr_diff"], context_str)
+        content = self.review_cache.get(cache_key) if self.review_cache else None
+        metrics.REVIEW_CACHE_LOOKUPS.labels("miss" if content is None else "hit").inc()
+        if content is not None:
+            print("  -> Review cache hit")
+            return {"final_review": content}, None
 
+        return None, _ReviewRequest(
+            cache_key=cache_key,
+            messages=self._review_messages(state["pr_diff"], context_str),
+            pr_size=self._pr_size(state),
+        )
+
+    def _store_review(self, request: _ReviewRequest, content: str) -> dict:
+        if self.review_cache:
+            self.review_cache.put(request.cache_key, content)
         return {"final_review": content}
 
+    @staticmethod
+    def _review_messages(pr_diff: str, context_str: str):
+        from langchain_core.prompts import ChatPromptTemplate
+        prompt = ChatPromptTemplate.from_template(REVIEW_PROMPT)
+        return prompt.format_messages(graph_context=context_str, pr_diff=pr_diff)
+
+    @staticmethod
+    def _pr_size(state: CodeReviewState) -> int:
+        return state.get("pr_size") or len(state["pr_diff"])
+
+    def _review_cache_key(self, pr_diff: str, context_str: str) -> str:
+        return review_key(pr_diff, context_str, configs.LLM_MODEL_NAME, REVIEW_PROMPT_VERSION)
+
 bot_instance = GraphRAGBot()
 
 
@@ -54,8 +54,86 @@ class Configs(BaseSettings):
     NEO4J_MAX_CONNECTION_LIFETIME: int = int(os.getenv("NEO4J_MAX_CONNECTION_LIFETIME", "30"))
     NEO4J_MAX_CONNECTION_POOL_SIZE: int = int(os.getenv("NEO4J_MAX_CONNECTION_POOL_SIZE", "50"))
     NEO4J_CONNECTION_TIMEOUT: float = float(os.getenv("NEO4J_CONNECTION_TIMEOUT", "30.0"))
+    TRAVERSAL_CACHE_SIZE: int = int(os.getenv("TRAVERSAL_CACHE_SIZE", "2048"))
+    GRAPH_VERSION_CHECK_SECONDS: float = float(os.getenv("GRAPH_VERSION_CHECK_SECONDS", "10"))
+    # "subgraph": mỗi endpoint trả về tập node/cạnh duy nhất, "paths": mỗi BFS path một record
+    GRAPH_TRAVERSAL_MODE: str = os.getenv("GRAPH_TRAVERSAL_MODE", "subgraph")
+    TRAVERSAL_NODE_LIMIT: int = int(os.getenv("TRAVERSAL_NODE_LIMIT", "200"))
+    # "neo4j": traversal bằng APOC, "snapshot": traversal trong process trên snapshot CSR export từ Neo4j
+    GRAPH_BACKEND: str = os.getenv("GRAPH_BACKEND", "neo4j")
+    GRAPH_SNAPSHOT_PATH: str = os.getenv("GRAPH_SNAPSHOT_PATH", os.path.join(DATA_DIR, "graph_snapshot"))
+    GRAPH_SNAPSHOT_RELOAD_SECONDS: float = float(os.getenv("GRAPH_SNAPSHOT_RELOAD_SECONDS", "30"))
     GITHUB_TOKEN: str = os.getenv("GITHUB_TOKEN", "")
+    GITHUB_API_URL: str = os.getenv("GITHUB_API_URL", "https://api.github.com")
+    GITHUB_TIMEOUT: float = float(os.getenv("GITHUB_TIMEOUT", "30"))
+    GITHUB_MAX_RETRIES: int = int(os.getenv("GITHUB_MAX_RETRIES", "3"))
+    GITHUB_POOL_SIZE: int = int(os.getenv("GITHUB_POOL_SIZE", "10"))
+    # Khi số request còn lại thấp hơn ngưỡng này, chờ tới lúc rate limit reset
+    GITHUB_RATE_LIMIT_THRESHOLD: int = int(os.getenv("GITHUB_RATE_LIMIT_THRESHOLD", "50"))
+    # Thời gian chờ tối đa (giây) khi bị chặn 403/429 và phải chờ tới X-RateLimit-Reset
+    GITHUB_RATE_LIMIT_MAX_WAIT: float = float(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT", "900"))
+    GITHUB_ETAG_CACHE_SIZE: int = int(os.getenv("GITHUB_ETAG_CACHE_SIZE", "1024"))
     WEAVIATE_COLLECTION_NAME: str = os.getenv("WEAVIATE_COLLECTION_NAME", "")
+    # "weaviate": hybrid query qua mạng, "mmap": index export từ collection, chạy trong process
+    RETRIEVAL_BACKEND: str = os.getenv("RETRIEVAL_BACKEND", "weaviate")
+    VECTOR_INDEX_PATH: str = os.getenv("VECTOR_INDEX_PATH", os.path.join(DATA_DIR, "vector_index"))
+    VECTOR_INDEX_DTYPE: str = os.getenv("VECTOR_INDEX_DTYPE", "float32")
+    VECTOR_INDEX_RELOAD_SECONDS: float = float(os.getenv("VECTOR_INDEX_RELOAD_SECONDS", "30"))
+    # Symbol của diff đã có trong graph được lấy thẳng theo ast_hash, không qua embedding + hybrid search
+    SYMBOL_FAST_PATH: bool = os.getenv("SYMBOL_FAST_PATH", "true").lower() == "true"
+    SYMBOL_INDEX_PATH: str = os.getenv("SYMBOL_INDEX_PATH", os.path.join(DATA_DIR, "symbols.sqlite3"))
+
+    # Embedding
+    EMBEDDING_MODEL_NAME: str = os.getenv("EMBEDDING_MODEL_NAME", "microsoft/codebert-base")
+    EMBEDDING_DEVICE: str = os.getenv("EMBEDDING_DEVICE", "cpu")
+    EMBEDDING_STORE_PATH: str = os.getenv("EMBEDDING_STORE_PATH", os.path.join(DATA_DIR, "embeddings.sqlite3"))
+    EMBEDDING_STORE_LRU_SIZE: int = int(os.getenv("EMBEDDING_STORE_LRU_SIZE", "10000"))
+
+    # Ingestion (migrate_weaviate)
+    INGEST_FETCH_SIZE: int = int(os.getenv("INGEST_FETCH_SIZE", "1000"))
+    INGEST_EMBED_BATCH_SIZE: int = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "256"))
+    INGEST_ENCODE_BATCH_SIZE: int = int(os.getenv("INGEST_ENCODE_BATCH_SIZE", "64"))
+    INGEST_UPLOAD_BATCH_SIZE: int = int(os.getenv("INGEST_UPLOAD_BATCH_SIZE", "100"))
+    INGEST_MAX_IN_FLIGHT: int = int(os.getenv("INGEST_MAX_IN_FLIGHT", "4"))
+    INGEST_ENCODE_WORKERS: int = int(os.getenv("INGEST_ENCODE_WORKERS", "1"))
+    INGEST_THREADS_PER_WORKER: int = int(os.getenv("INGEST_THREADS_PER_WORKER", "1"))
+
+    # Review pipeline
+    REVIEW_CONCURRENT_MODE: bool = os.getenv("REVIEW_CONCURRENT_MODE", "true").lower() == "true"
+    REVIEW_RETRIEVAL_CONCURRENCY: int = int(os.getenv("REVIEW_RETRIEVAL_CONCURRENCY", "4"))
+    # Số request đồng thời tới Ollama qua LLMGateway (nên bằng OLLAMA_NUM_PARALLEL của server)
+    REVIEW_LLM_CONCURRENCY: int = int(os.getenv("REVIEW_LLM_CONCURRENCY", "1"))
+    REVIEW_ASYNC_MODE: bool = os.getenv("REVIEW_ASYNC_MODE", "false").lower() == "true"
+    LLM_MODEL_NAME: str = os.getenv("LLM_MODEL_NAME", "deepseek-coder:1.3b-instruct")
+    # Giữ model trong bộ nhớ ("-1": mãi mãi, hoặc duration như "30m"); num_ctx cố định để Ollama không load lại model
+    LLM_KEEP_ALIVE: str = os.getenv("LLM_KEEP_ALIVE", "-1")
+    LLM_NUM_CTX: int = int(os.getenv("LLM_NUM_CTX", "8192"))
+    LLM_NUM_PREDICT: int = int(os.getenv("LLM_NUM_PREDICT", "1024"))
+    LLM_TIMEOUT_SECONDS: float = float(os.getenv("LLM_TIMEOUT_SECONDS", "300"))
+    # PR lớn hơn N ký tự diff xếp hàng như tới muộn hơn 1 giây (0: chỉ theo thứ tự tới)
+    LLM_PRIORITY_CHARS_PER_SECOND: float = float(os.getenv("LLM_PRIORITY_CHARS_PER_SECOND", "1000"))
+    # Cache kết quả review của LLM (REVIEW_CACHE_MAX_ENTRIES=0 để tắt)
+    REVIEW_CACHE_PATH: str = os.getenv("REVIEW_CACHE_PATH", os.path.join(DATA_DIR, "reviews.sqlite3"))
+    REVIEW_CACHE_MAX_ENTRIES: int = int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", "5000"))
+    REVIEW_CACHE_TTL_SECONDS: float = float(os.getenv("REVIEW_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+    # Token budget cho graph context trong prompt (ước lượng theo số ký tự / token)
+    CONTEXT_TOKEN_BUDGET: int = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+    CONTEXT_CHARS_PER_TOKEN: float = float(os.getenv("CONTEXT_CHARS_PER_TOKEN", "3.5"))
+    # Mỗi symbol thay đổi trong diff (function, class, endpoint, config key) là một query
+    DIFF_MAX_QUERIES: int = int(os.getenv("DIFF_MAX_QUERIES", "8"))
+    DIFF_QUERY_MAX_CHARS: int = int(os.getenv("DIFF_QUERY_MAX_CHARS", "1500"))
+
+    # Webhook job queue
+    JOB_QUEUE_PATH: str = os.getenv("JOB_QUEUE_PATH", os.path.join(DATA_DIR, "jobs.sqlite3"))
+    JOB_QUEUE_WORKERS: int = int(os.getenv("JOB_QUEUE_WORKERS", "2"))
+    JOB_QUEUE_MAX_PENDING: int = int(os.getenv("JOB_QUEUE_MAX_PENDING", "100"))
+    JOB_QUEUE_MAX_ATTEMPTS: int = int(os.getenv("JOB_QUEUE_MAX_ATTEMPTS", "3"))
+    JOB_QUEUE_RETRY_BACKOFF_SECONDS: float = float(os.getenv("JOB_QUEUE_RETRY_BACKOFF_SECONDS", "30"))
+    JOB_QUEUE_COALESCE_SECONDS: float = float(os.getenv("JOB_QUEUE_COALESCE_SECONDS", "20"))
+    JOB_QUEUE_POLL_INTERVAL: float = float(os.getenv("JOB_QUEUE_POLL_INTERVAL", "2"))
+
+    # Metrics: in timeline các span (stage, lời gọi ra ngoài) của mỗi PR sau khi review xong
+    METRICS_TRACE_PRS: bool = os.getenv("METRICS_TRACE_PRS", "false").lower() == "true"
 
     class Config:
         case_sensitive = True
@@ -0,0 +1,121 @@
+from dataclasses import dataclass, field
+from typing import Dict, List
+from src_bot.config.config import configs
+
+# Quan hệ càng ảnh hưởng trực tiếp tới logic càng được ưu tiên
+RELATION_PRIORITY = {
+    "CALL": 0,
+    "USE": 1,
+    "IMPLEMENT": 2,
+    "EXTEND": 3,
+    "BRANCH": 4,
+}
+
+HEADER = "Based on the code graph, here are some related code relationships:\n"
+CODE_HEADER = "\nCode of the referenced nodes:\n"
+
+
+@dataclass
+class PackedContext:
+    text: str
+    tokens: int
+    included: int
+    dropped: List[Dict] = field(default_factory=list)
+
+    def summary(self) -> str:
+        return f"{self.included} relationships, ~{self.tokens} tokens, {len(self.dropped)} dropped"
+
+
+class ContextPacker:
+    """
+    Đóng gói relationship (output của Neo4jService.extract_relationships) thành context cho LLM:
+
+    - mỗi node body chỉ xuất hiện một lần, các cạnh tham chiếu tới node qua id [N1], [N2], ...
+    - relationship được xếp hạng theo (khoảng cách trong graph, loại quan hệ, thứ hạng hit)
+    - dừng thêm khi vượt token budget và báo lại những relationship đã bị bỏ.
+    """
+
+    def __init__(self, token_budget: int = None, chars_per_token: float = None):
+        self.token_budget = token_budget or configs.CONTEXT_TOKEN_BUDGET
+        self.chars_per_token = chars_per_token or configs.CONTEXT_CHARS_PER_TOKEN
+
+    def count_tokens(self, text: str) -> int:
+        return int(len(text) / self.chars_per_token) + 1
+
+    def rank(self, relationships: List[Dict]) -> List[Dict]:
+        return sorted(
+            relationships,
+            key=lambda rel: (
+                rel.get("depth", 1),
+                RELATION_PRIORITY.get(rel["relationship_type"], len(RELATION_PRIORITY)),
+                rel.get("hit_rank", 0),
+            ),
+        )
+
+    def pack(self, relationships: List[Dict]) -> PackedContext:
+        if not relationships:
+            return PackedContext(text="", tokens=0, included=0)
+
+        node_ids: Dict = {}
+        edge_lines: List[str] = []
+        code_blocks: List[str] = []
+        seen_edges = set()
+        dropped = []
+        used = self.count_tokens(HEADER) + self.count_tokens(CODE_HEADER)
+
+        for rel in self.rank(relationships):
+            from_key = rel.get("from_key") or ("content", rel["from_content"])
+            to_key = rel.get("to_key") or ("content", rel["to_content"])
+            edge_key = (rel["relationship_type"], from_key, to_key)
+            if edge_key in seen_edges:
+                continue
+            seen_edges.add(edge_key)
+
+            new_blocks = {}
+            for key, side in ((from_key, "from"), (to_key, "to")):
+                if key not in node_ids and key not in new_blocks:
+                    new_blocks[key] = self._code_block(
+                        f"N{len(node_ids) + len(new_blocks) + 1}", rel, side
+                    )
+            ids = {**node_ids, **{key: block[0] for key, block in new_blocks.items()}}
+            edge_line = (
+                f"- [{ids[from_key]}] {rel.get('from_name') or ''} "
+                f"-{rel['relationship_type']}-> "
+                f"[{ids[to_key]}] {rel.get('to_name') or ''}\n"
+            )
+
+            cost = self.count_tokens(edge_line) + sum(
+                self.count_tokens(block[1]) for block in new_blocks.values()
+            )
+            if used + cost > self.token_budget:
+                dropped.append({
+                    "relationship_type": rel["relationship_type"],
+                    "from": rel.get("from_name"),
+                    "to": rel.get("to_name"),
+                    "depth": rel.get("depth"),
+                    "tokens": cost,
+                })
+                continue
+
+            used += cost
+            edge_lines.append(edge_line)
+            for key, (node_id, block) in new_blocks.items():
+                node_ids[key] = node_id
+                code_blocks.append(block)
+
+        if not edge_lines:
+            return PackedContext(text="", tokens=0, included=0, dropped=dropped)
+
+        parts = [HEADER, *edge_lines, CODE_HEADER, *code_blocks]
+        return PackedContext(
+            text="".join(parts),
+            tokens=used,
+            included=len(edge_lines),
+            dropped=dropped,
+        )
+
+    def _code_block(self, node_id: str, rel: Dict, side: str):
+        labels = ", ".join(rel.get(f"{side}_labels") or [])
+        name = rel.get(f"{side}_name") or ""
+        content = rel.get(f"{side}_content") or ""
+        return node_id, f"[{node_id}] ({labels}) {name}\n```\n{content}\n```\n"
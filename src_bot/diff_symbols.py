@@ -0,0 +1,256 @@
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Pattern, Tuple
+from src_bot.config.config import configs
+
+CODE_EXTENSIONS = ('.py', '.js', '.java', '.cpp', '.ts', '.go', '.rb')
+
+_HUNK_HEADER_RE = re.compile(r"^@@ -\d+(?:,\d+)? \+(\d+)(?:,\d+)? @@ ?(.*)$")
+# Từ khoá hay bị regex hàm của các ngôn ngữ họ C bắt nhầm (if (...) {, return foo(...))
+_NOT_FUNCTIONS = frozenset({
+    "if", "for", "while", "switch", "catch", "return", "new", "else", "sizeof", "throw", "delete", "elif", "with",
+})
+# Symbol được ưu tiên khi số query vượt DIFF_MAX_QUERIES
+_KIND_PRIORITY = {"endpoint": 0, "function": 1, "config": 2, "class": 3, "hunk": 4}
+_HTTP_METHODS = frozenset({"GET", "POST", "PUT", "PATCH", "DELETE"})
+
+
+@dataclass(slots=True)
+class _Language:
+    functions: Tuple[Pattern, ...] = ()
+    classes: Tuple[Pattern, ...] = ()
+    endpoints: Tuple[Pattern, ...] = ()   # group 1: HTTP method (tuỳ chọn), group 2: path
+    configs: Tuple[Pattern, ...] = ()
+
+
+def _compile(*patterns: str) -> Tuple[Pattern, ...]:
+    return tuple(re.compile(pattern) for pattern in patterns)
+
+
+_JS = _Language(
+    functions=_compile(
+        r"\bfunction\s*\*?\s*(\w+)\s*\(",
+        r"\b(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>|\w+\s*=>)",
+        r"^\s*(?:(?:public|private|protected|static|async|get|set|override|readonly)\s+)*(\w+)\s*\([^;]*\)\s*(?::\s*[\w<>\[\]|, ]+)?\s*\{\s*$",
+    ),
+    classes=_compile(r"\b(?:class|interface|enum)\s+(\w+)"),
+    endpoints=_compile(
+        r"\b(?:app|router|server|api)\.(get|post|put|patch|delete|all)\(\s*['\"`]([^'\"`]+)",
+        r"@(Get|Post|Put|Patch|Delete|All)\(\s*['\"]([^'\"]*)",
+    ),
+    configs=_compile(r"process\.env\.(\w+)", r"process\.env\[\s*['\"](\w+)"),
+)
+
+LANGUAGES: Dict[str, _Language] = {
+    ".py": _Language(
+        functions=_compile(r"^\s*(?:async\s+)?def\s+(\w+)"),
+        classes=_compile(r"^\s*class\s+(\w+)"),
+        endpoints=_compile(
+            r"@\w+(?:\.\w+)*\.(get|post|put|patch|delete|route|api_route|websocket)\(\s*['\"]([^'\"]+)",
+            r"\b(?:path|re_path|url)\(\s*r?['\"]([^'\"]*)()",
+        ),
+        configs=_compile(
+            r"\bos\.(?:getenv|environ\.get)\(\s*['\"](\w+)",
+            r"\bos\.environ\[\s*['\"](\w+)",
+            r"\b(?:configs?|settings)\.([A-Z][A-Z0-9_]+)",
+        ),
+    ),
+    ".js": _JS,
+    ".ts": _JS,
+    ".java": _Language(
+        functions=_compile(
+            r"^\s*(?:@\w+\s+)*(?:(?:public|protected|private|static|final|abstract|synchronized|native|default)\s+)*"
+            r"[\w<>\[\],.?]+(?:\s*<[^>]*>)?\s+(\w+)\s*\([^;]*$",
+        ),
+        classes=_compile(r"\b(?:class|interface|enum|record)\s+(\w+)"),
+        endpoints=_compile(
+            r"@(Get|Post|Put|Patch|Delete|Request)Mapping\s*\(\s*(?:(?:value|path)\s*=\s*)?\{?\s*\"([^\"]*)\"",
+        ),
+        configs=_compile(
+            r"@Value\(\s*\"\$\{([^}:]+)",
+            r"\bgetProperty\(\s*\"([^\"]+)\"",
+            r"@ConfigurationProperties\(\s*(?:prefix\s*=\s*)?\"([^\"]+)\"",
+        ),
+    ),
+    ".cpp": _Language(
+        functions=_compile(r"^\s*(?:[\w:<>,*&~]+\s+)+\**&?([\w:~]+)\s*\([^;]*$"),
+        classes=_compile(r"^\s*(?:class|struct)\s+(\w+)"),
+        configs=_compile(r"\bgetenv\(\s*\"(\w+)\""),
+    ),
+    ".go": _Language(
+        functions=_compile(r"^\s*func\s+(?:\([^)]*\)\s*)?(\w+)"),
+        classes=_compile(r"^\s*type\s+(\w+)\s+(?:struct|interface)\b"),
+        endpoints=_compile(
+            r"\.(HandleFunc|Handle|GET|POST|PUT|PATCH|DELETE|Get|Post|Put|Patch|Delete)\(\s*\"([^\"]+)\"",
+        ),
+        configs=_compile(r"\bos\.(?:Getenv|LookupEnv)\(\s*\"(\w+)\"", r"\bviper\.Get\w*\(\s*\"([^\"]+)\""),
+    ),
+    ".rb": _Language(
+        functions=_compile(r"^\s*def\s+(?:self\.)?(\w+[?!=]?)"),
+        classes=_compile(r"^\s*(?:class|module)\s+([\w:]+)"),
+        endpoints=_compile(r"^\s*(get|post|put|patch|delete)\s+['\"]([^'\"]+)"),
+        configs=_compile(r"\bENV\[\s*['\"](\w+)", r"\bENV\.fetch\(\s*['\"](\w+)"),
+    ),
+}
+
+
+@dataclass(slots=True)
+class DiffSymbol:
+    """Một symbol bị thay đổi trong diff, mỗi symbol là một query retrieval."""
+    kind: str                      # function | class | endpoint | config | hunk
+    name: str
+    file_path: str
+    container: Optional[str] = None  # class chứa function (nếu thấy trong hunk)
+    lines: List[str] = field(default_factory=list)
+
+    @property
+    def query(self) -> str:
+        # Tên symbol đứng đầu để phần BM25 của hybrid search khớp với property `name`
+        lines = dict.fromkeys(line.strip() for line in self.lines) if self.kind in ("endpoint", "config") else self.lines
+        return "\n".join([self.name, *lines])[:configs.DIFF_QUERY_MAX_CHARS]
+
+
+def _match(patterns: Tuple[Pattern, ...], text: str) -> Optional[str]:
+    for pattern in patterns:
+        match = pattern.search(text)
+        if match and match.group(1) not in _NOT_FUNCTIONS:
+            return match.group(1)
+    return None
+
+
+def _indent(text: str) -> int:
+    return len(text) - len(text.lstrip())
+
+
+def _definition(language: _Language, text: str) -> Optional[Tuple[str, str]]:
+    name = _match(language.classes, text)
+    if name:
+        return "class", name
+    name = _match(language.functions, text)
+    if name:
+        return "function", name
+    return None
+
+
+def split_diff(pr_diff: str) -> Tuple[str, str]:
+    """Input của bot là "<filename>\\n<patch>" (xem BotService); diff không có tên file thì trả về ("", diff)."""
+    first, _, rest = pr_diff.partition("\n")
+    if first.startswith(("@@", "diff ", "--- ", "+++ ")) or not rest:
+        return "", pr_diff
+    return first.strip(), rest
+
+
+def extract_symbols(pr_diff: str) -> List[DiffSymbol]:
+    """
+    Tách các symbol bị thay đổi trong diff của một file: function/class chứa dòng thay đổi
+    (kể cả symbol lấy từ context của hunk header), endpoint và config key xuất hiện trên
+    dòng thêm/xoá. Không nhận ra symbol nào thì mỗi hunk là một query.
+    Trả về tối đa DIFF_MAX_QUERIES symbol, ưu tiên endpoint và function.
+    """
+    file_path, patch = split_diff(pr_diff)
+    language = LANGUAGES.get(os.path.splitext(file_path)[1].lower(), _Language())
+    symbols: Dict[Tuple[str, Optional[str], str], DiffSymbol] = {}
+
+    def add(kind: str, name: str, container: Optional[str] = None) -> DiffSymbol:
+        key = (kind, container, name)
+        symbol = symbols.get(key)
+        if symbol is None:
+            symbol = symbols[key] = DiffSymbol(kind=kind, name=name, file_path=file_path, container=container)
+        return symbol
+
+    def scan(text: str, changed_line: bool):
+        for pattern in language.endpoints:
+            match = pattern.search(text)
+            if match:
+                method, path = match.group(1), match.group(2)
+                if not path:
+                    method, path = "", method
+                prefix = method.upper() if method.upper() in _HTTP_METHODS else ""
+                add("endpoint", f"{prefix} {path}".strip()).lines.append(text)
+        if changed_line:
+            for pattern in language.configs:
+                for key in pattern.findall(text):
+                    add("config", key).lines.append(text)
+
+    current: Optional[Tuple[str, Optional[str], str]] = None  # (kind, container, name) của vùng đang đọc
+    region: List[str] = []
+    changed = False
+    decorators: List[Tuple[str, bool]] = []  # decorator/annotation đứng trước definition tiếp theo
+    region_decorators: List[str] = []        # decorator không đổi của definition đang đọc
+    container: Optional[str] = None
+    container_indent = 0                     # indent của dòng khai báo class `container`
+
+    def flush():
+        if changed and region:
+            kind, region_container, name = current
+            add(kind, name, region_container).lines.extend(region)
+            # Endpoint khai báo bằng decorator/annotation của function bị thay đổi
+            for decorator in region_decorators:
+                scan(decorator, False)
+
+    def release_decorators():
+        nonlocal changed
+        for text, changed_line in decorators:
+            region.append(text)
+            changed = changed or changed_line
+        decorators.clear()
+
+    for line in patch.split("\n"):
+        header = _HUNK_HEADER_RE.match(line)
+        if header:
+            release_decorators()
+            flush()
+            context = header.group(2).strip()
+            definition = _definition(language, context) if context else None
+            container = definition[1] if definition and definition[0] == "class" else None
+            container_indent = _indent(header.group(2))
+            if definition:
+                current = (definition[0], None, definition[1])
+            else:
+                current = ("hunk", None, f"{file_path}:{header.group(1)} {context}".strip())
+            region, changed = [], False
+            region_decorators = []
+            continue
+        if current is None or line.startswith("\\"):
+            continue
+
+        marker, text = line[:1], line[1:]
+        changed_line = marker in ("+", "-")
+        stripped = text.strip()
+        if container is not None and stripped and not stripped.startswith("{") and _indent(text) <= container_indent:
+            # Dòng lùi về mức indent của class (hoặc thấp hơn) nghĩa là đã ra khỏi thân class
+            container = None
+        if stripped.startswith("@"):
+            decorators.append((text, changed_line))
+            if changed_line:
+                scan(text, True)
+            continue
+
+        definition = _definition(language, text)
+        if definition:
+            flush()
+            kind, name = definition
+            current = (kind, container if kind == "function" else None, name)
+            if kind == "class":
+                container, container_indent = name, _indent(text)
+            region, changed = [], False
+            region_decorators = [decorator for decorator, changed_decorator in decorators if not changed_decorator]
+        release_decorators()
+        region.append(text)
+        if changed_line:
+            changed = True
+            scan(text, True)
+    release_decorators()
+    flush()
+
+    ordered = sorted(symbols.values(), key=lambda symbol: _KIND_PRIORITY[symbol.kind])
+    return ordered[:configs.DIFF_MAX_QUERIES]
+
+
+def symbol_queries(pr_diff: str) -> Tuple[List[str], List[DiffSymbol]]:
+    """(query cho vector search, symbol tương ứng); diff không tách được symbol thì dùng cả diff làm query."""
+    symbols = extract_symbols(pr_diff)
+    if not symbols:
+        return [pr_diff], []
+    return [symbol.query for symbol in symbols], symbols
@@ -0,0 +1,135 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Sequence
+import numpy as np
+from src_bot.config.config import configs
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model_name TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    dim INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (model_name, text_hash)
+) WITHOUT ROWID;
+"""
+
+# SQLite giới hạn số tham số trong một câu lệnh
+_SQL_CHUNK = 500
+
+
+def normalize_text(text: str) -> str:
+    """Chuẩn hoá xuống dòng và khoảng trắng cuối dòng để text giống nhau có cùng hash."""
+    text = (text or "").replace("\r\n", "\n").replace("\r", "\n")
+    return "\n".join(line.rstrip() for line in text.strip().split("\n"))
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Kho embedding content-addressed, key = (model name, hash của text đã chuẩn hoá).
+
+    Gồm 2 tầng: LRU trong bộ nhớ và SQLite trên đĩa, dùng chung cho ingestion
+    (migrate_weaviate) và retrieval (CustomGraphRAGRetriever) để cùng một đoạn code
+    không bao giờ phải encode lại. Embedding của query (persist=False) chỉ được giữ trong
+    LRU: mỗi diff sinh ra query mới nên ghi xuống đĩa sẽ làm store phình mãi.
+    """
+
+    def __init__(self, model_name: str = None, db_path: str = None, lru_size: int = None):
+        self.model_name = model_name or configs.EMBEDDING_MODEL_NAME
+        self.db_path = db_path or configs.EMBEDDING_STORE_PATH
+        self.lru_size = lru_size if lru_size is not None else configs.EMBEDDING_STORE_LRU_SIZE
+        self._lru: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                vector = self._lru.get(key)
+                if vector is not None:
+                    self._lru.move_to_end(key)
+                    found[key] = vector
+                else:
+                    missing.append(key)
+
+            for i in range(0, len(missing), _SQL_CHUNK):
+                chunk = missing[i:i + _SQL_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model_name = ? AND text_hash IN ({placeholders})",
+                    [self.model_name, *chunk],
+                ).fetchall()
+                for key, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32)
+                    found[key] = vector
+                    self._remember(key, vector)
+        return found
+
+    def put_many(self, items: Dict[str, np.ndarray], persist: bool = True):
+        if not items:
+            return
+        rows = []
+        with self._lock:
+            for key, vector in items.items():
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                rows.append((self.model_name, key, vector.shape[0], vector.tobytes()))
+            if not persist:
+                return
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model_name, text_hash, dim, vector) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def encode(
+        self, texts: Sequence[str], encode_fn: Callable[[List[str]], np.ndarray], persist: bool = True
+    ) -> np.ndarray:
+        """
+        Trả về ma trận embedding (len(texts), dim) theo đúng thứ tự đầu vào.
+        Chỉ những text chưa có trong store (và không trùng nhau) mới được đưa vào encode_fn;
+        persist=False thì embedding mới chỉ được giữ trong LRU, không ghi xuống SQLite.
+        """
+        keys = [text_hash(text) for text in texts]
+        cached = self.get_many(list(dict.fromkeys(keys)))
+
+        pending: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in pending:
+                pending[key] = text
+
+        if pending:
+            vectors = np.asarray(encode_fn(list(pending.values())), dtype=np.float32)
+            computed = dict(zip(pending.keys(), vectors))
+            self.put_many(computed, persist=persist)
+            cached.update(computed)
+
+        if not keys:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([cached[key] for key in keys])
+
+    def _remember(self, key: str, vector: np.ndarray):
+        if self.lru_size <= 0:
+            return
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
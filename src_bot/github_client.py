@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from src_bot.config.config import configs
+from src_bot import metrics
+
+DIFF_MEDIA_TYPE = "application/vnd.github.v3.diff"
+JSON_MEDIA_TYPE = "application/vnd.github+json"
+# Secondary rate limit không kèm Retry-After: GitHub khuyên chờ ít nhất 1 phút
+SECONDARY_RATE_LIMIT_WAIT = 60
+RATE_LIMIT_MIN_WAIT = 1
+
+
+class GitHubError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(f"GitHub API {status_code}: {message}")
+        self.status_code = status_code
+
+
+class GitHubClient:
+    """
+    Lớp truy cập GitHub REST API dùng chung cho cả bot.
+
+    - Một requests.Session với connection pool, timeout và retry cho lỗi 5xx.
+    - Conditional request (ETag / If-None-Match): response 304 không bị tính vào rate limit.
+    - Theo dõi X-RateLimit-Remaining: khi budget còn dưới GITHUB_RATE_LIMIT_THRESHOLD,
+      các request tiếp theo chờ tới X-RateLimit-Reset thay vì bị GitHub chặn.
+    """
+
+    def __init__(self, token: str, base_url: str = None, timeout: float = None):
+        self.token = token
+        self.base_url = (base_url or configs.GITHUB_API_URL).rstrip("/")
+        self.timeout = timeout or configs.GITHUB_TIMEOUT
+        self.rate_limit_threshold = configs.GITHUB_RATE_LIMIT_THRESHOLD
+        self.rate_limit_max_wait = configs.GITHUB_RATE_LIMIT_MAX_WAIT
+        self.rate_limit_remaining: Optional[int] = None
+        self.rate_limit_reset: float = 0.0
+        self.etag_hits = 0
+        self._etag_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._etag_cache_size = configs.GITHUB_ETAG_CACHE_SIZE
+        self._lock = threading.Lock()
+
+        retry = Retry(
+            total=configs.GITHUB_MAX_RETRIES,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset({"GET"}),
+            respect_retry_after_header=True,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=configs.GITHUB_POOL_SIZE,
+            pool_maxsize=configs.GITHUB_POOL_SIZE,
+            max_retries=retry,
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Accept": JSON_MEDIA_TYPE,
+            "X-GitHub-Api-Version": "2022-11-28",
+        })
+
+    def close(self):
+        self.session.close()
+
+    def get_rate_limit(self) -> dict:
+        # /rate_limit không bị tính vào budget
+        return self._request("GET", "/rate_limit", use_etag=False, operation="rate_limit").json()
+
+    def get_pull(self, repo_name: str, pr_number: int) -> dict:
+        return self._get(f"/repos/{repo_name}/pulls/{pr_number}", operation="get_pull")
+
+    def get_pull_files(self, repo_name: str, pr_number: int) -> List[dict]:
+        """Danh sách file của PR (kèm `patch` của từng file), đọc hết các trang."""
+        files = []
+        page = 1
+        while True:
+            batch = self._get(
+                f"/repos/{repo_name}/pulls/{pr_number}/files",
+                params={"per_page": 100, "page": page},
+                operation="get_pull_files",
+            )
+            files.extend(batch)
+            if len(batch) < 100:
+                return files
+            page += 1
+
+    def get_pull_diff(self, repo_name: str, pr_number: int) -> str:
+        """Diff đầy đủ của PR. Chỉ cần khi file quá lớn và GitHub không trả `patch`."""
+        return self._get(f"/repos/{repo_name}/pulls/{pr_number}", accept=DIFF_MEDIA_TYPE, operation="get_pull_diff")
+
+    def create_review(
+        self,
+        repo_name: str,
+        pr_number: int,
+        commit_id: str,
+        comments: List[dict],
+        body: str = None,
+        event: str = "COMMENT",
+    ) -> dict:
+        payload = {"commit_id": commit_id, "event": event, "comments": comments}
+        if body:
+            payload["body"] = body
+        return self._request(
+            "POST", f"/repos/{repo_name}/pulls/{pr_number}/reviews", json=payload, operation="create_review"
+        ).json()
+
+    def _get(self, path: str, params: Dict = None, accept: str = JSON_MEDIA_TYPE, operation: str = "get"):
+        response = self._request("GET", path, params=params, accept=accept, operation=operation)
+        return response.json() if accept == JSON_MEDIA_TYPE else response.text
+
+    def _request(self, method: str, path: str, params: Dict = None, json=None,
+                 accept: str = JSON_MEDIA_TYPE, use_etag: bool = True, operation: str = "request"):
+        with metrics.track_call("github", operation):
+            return self._send(method, path, params, json, accept, use_etag)
+
+    def _send(self, method: str, path: str, params: Dict, json, accept: str, use_etag: bool):
+        url = f"{self.base_url}{path}"
+        headers = {"Accept": accept}
+        cache_key = (url, tuple(sorted((params or {}).items())), accept)
+        cached = None
+        if method == "GET" and use_etag:
+            with self._lock:
+                cached = self._etag_cache.get(cache_key)
+            if cached:
+                headers["If-None-Match"] = cached[0]
+
+        self._wait_for_budget()
+        response = self.session.request(
+            method, url, params=params, json=json, headers=headers, timeout=self.timeout
+        )
+        self._update_rate_limit(response)
+
+        if response.status_code in (403, 429) and self._is_rate_limited(response):
+            # Chờ theo Retry-After / X-RateLimit-Reset rồi thử lại một lần
+            time.sleep(self._rate_limit_delay(response))
+            self._wait_for_budget()
+            response = self.session.request(
+                method, url, params=params, json=json, headers=headers, timeout=self.timeout
+            )
+            self._update_rate_limit(response)
+
+        if response.status_code == 304 and cached:
+            self.etag_hits += 1
+            with self._lock:
+                self._etag_cache.move_to_end(cache_key)
+            return cached[1]
+        if response.status_code >= 400:
+            raise GitHubError(response.status_code, response.text[:500])
+
+        etag = response.headers.get("ETag")
+        if method == "GET" and use_etag and etag and self._etag_cache_size > 0:
+            with self._lock:
+                self._etag_cache[cache_key] = (etag, response)
+                self._etag_cache.move_to_end(cache_key)
+                while len(self._etag_cache) > self._etag_cache_size:
+                    self._etag_cache.popitem(last=False)
+        return response
+
+    def _is_rate_limited(self, response) -> bool:
+        return "Retry-After" in response.headers or response.headers.get("X-RateLimit-Remaining") == "0"
+
+    def _rate_limit_delay(self, response) -> float:
+        headers = response.headers
+        if "Retry-After" in headers:
+            return float(headers["Retry-After"])
+        if headers.get("X-RateLimit-Remaining") == "0" and "X-RateLimit-Reset" in headers:
+            # Primary rate limit: chờ tới lúc budget được reset
+            delay = int(headers["X-RateLimit-Reset"]) - time.time()
+            return min(max(delay, RATE_LIMIT_MIN_WAIT), self.rate_limit_max_wait)
+        return SECONDARY_RATE_LIMIT_WAIT
+
+    def _update_rate_limit(self, response):
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        reset = response.headers.get("X-RateLimit-Reset")
+        if remaining is None:
+            return
+        with self._lock:
+            self.rate_limit_remaining = int(remaining)
+            metrics.GITHUB_RATE_LIMIT_REMAINING.set(self.rate_limit_remaining)
+            if reset is not None:
+                self.rate_limit_reset = float(reset)
+
+    def _wait_for_budget(self):
+        with self._lock:
+            remaining = self.rate_limit_remaining
+            reset = self.rate_limit_reset
+        if remaining is None or remaining > self.rate_limit_threshold:
+            return
+        delay = reset - time.time()
+        if delay > 0:
+            print(f"GitHub rate limit low ({remaining} left), waiting {delay:.0f}s for reset.")
+            time.sleep(delay + 1)
+            with self._lock:
+                # Sau khi reset, giá trị thật sẽ được cập nhật từ response kế tiếp
+                if self.rate_limit_reset == reset:
+                    self.rate_limit_remaining = None
@@ -1,18 +1,90 @@
-import weaviate
-from typing import List
-from src_bot.neo4jdb.neo4j_service import Neo4jService
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from src_bot.neo4jdb.neo4j_db import AsyncNeo4jDB
+from src_bot.neo4jdb.neo4j_service import GraphService, Neo4jService
+from src_bot.neo4jdb.neo4j_async_service import AsyncNeo4jService
+from src_bot.neo4jdb.snapshot_service import GraphSnapshotService
 from src_bot.config.config import configs
-from sentence_transformers import SentenceTransformer
+from src_bot.embedding_store import EmbeddingStore
+from src_bot.context_packer import ContextPacker
+from src_bot.symbol_index import SymbolIndex, open_symbol_index
+from src_bot.vector_index import MmapVectorIndex, open_vector_index
+from src_bot import metrics
+
+
+HIT_PROPERTIES = ["ast_hash", "name", "content", "file_path", "node_type"]
+
+
+# torch / sentence_transformers / weaviate được import khi cần để khởi động nhanh
+def load_embedding_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(
+        configs.EMBEDDING_MODEL_NAME,
+        device=configs.EMBEDDING_DEVICE
+    )
+
+
+def connect_weaviate():
+    import weaviate
+    return weaviate.connect_to_local()
+
+
+def dedupe_hits(hits_per_query: List[List[dict]]) -> List[List[dict]]:
+    """Bỏ hit có ast_hash đã xuất hiện ở query trước (giữ thứ tự và thứ hạng của lần đầu)."""
+    seen = set()
+    deduped = []
+    for hits in hits_per_query:
+        kept = []
+        for hit in hits:
+            ast_hash = hit.get("ast_hash")
+            if ast_hash in seen:
+                continue
+            if ast_hash:
+                seen.add(ast_hash)
+            kept.append(hit)
+        deduped.append(kept)
+    return deduped
+
+
+def create_graph_service() -> GraphService:
+    """Neo4jService hoặc GraphSnapshotService tuỳ theo GRAPH_BACKEND."""
+    if configs.GRAPH_BACKEND == "snapshot":
+        return GraphSnapshotService()
+    return Neo4jService()
+
 
 class CustomGraphRAGRetriever:
-    def __init__(self):
-        self.neo4j_service = Neo4jService()
-        self.model = SentenceTransformer(
-            "microsoft/codebert-base",
-            device= "cpu"
-        )
-        self.weaviate_client = weaviate.connect_to_local()
+    def __init__(
+        self,
+        neo4j_service: GraphService = None,
+        model=None,
+        weaviate_client=None,
+        embedding_store: EmbeddingStore = None,
+        vector_index: MmapVectorIndex = None,
+        symbol_index: SymbolIndex = None,
+    ):
+        """
+        Các dependency có thể truyền vào (đã kết nối/warm-up sẵn), nếu không sẽ tự tạo.
+        Với RETRIEVAL_BACKEND=mmap (hoặc khi truyền vector_index), vector search chạy trong
+        process trên MmapVectorIndex và không cần kết nối Weaviate. Tương tự, với
+        GRAPH_BACKEND=snapshot traversal chạy trên GraphSnapshotService thay vì Neo4j.
+        symbol_index (mặc định mở SYMBOL_INDEX_PATH nếu có) bật fast path của symbol_search_batch.
+        """
+        self.neo4j_service = neo4j_service or create_graph_service()
+        self.model = model or load_embedding_model()
+        self.embedding_store = embedding_store or EmbeddingStore(configs.EMBEDDING_MODEL_NAME)
+        self.context_packer = ContextPacker()
+        self.vector_index = vector_index
+        if self.vector_index is None and weaviate_client is None and configs.RETRIEVAL_BACKEND == "mmap":
+            self.vector_index = open_vector_index()
+        self.weaviate_client = weaviate_client
+        if self.weaviate_client is None and self.vector_index is None:
+            self.weaviate_client = connect_weaviate()
         self.weaviate_collection = configs.WEAVIATE_COLLECTION_NAME
+        self.symbol_index = symbol_index if symbol_index is not None else open_symbol_index()
+        self.async_weaviate_client = None
+        self.async_neo4j_service = None
         self.cypher_query = """
         MATCH (startNode) WHERE startNode.ast_hash = $weaviate_id
         
@@ -34,56 +106,287 @@ class CustomGraphRAGRetriever:
         """
     def close(self):
         """Đóng kết nối khi không dùng nữa"""
-        self.neo4j_service.db.driver.close()
-        self.weaviate_client.close()
+        self.neo4j_service.close()
+        if self.weaviate_client is not None:
+            self.weaviate_client.close()
+        if self.vector_index is not None:
+            self.vector_index.close()
+        if self.symbol_index is not None:
+            self.symbol_index.close()
+        self.embedding_store.close()
+
+    async def ainitialize(self):
+        """Tạo client async (Weaviate, Neo4j) trên event loop đang chạy, trừ backend chạy trong process."""
+        if self.vector_index is None:
+            import weaviate
+            self.async_weaviate_client = weaviate.use_async_with_local()
+            await self.async_weaviate_client.connect()
+        if not isinstance(self.neo4j_service, GraphSnapshotService):
+            self.async_neo4j_service = AsyncNeo4jService(AsyncNeo4jDB(), self.neo4j_service.traversal_cache)
+
+    async def aclose(self):
+        if self.async_weaviate_client is not None:
+            await self.async_weaviate_client.close()
+            self.async_weaviate_client = None
+        if self.async_neo4j_service is not None:
+            await self.async_neo4j_service.close()
+            self.async_neo4j_service = None
+
+    def _encode(self, texts: List[str]):
+        with metrics.track_call("embedding", "encode"):
+            return self.model.encode(texts, normalize_embeddings=True)
 
     def search(self, query_text: str, top_k: int = 3) -> List[str]:
         """
         Thực hiện tìm kiếm lai: Vector (Weaviate) -> Graph (Neo4j)
         """
-        query_embedding = self.model.encode(query_text, normalize_embeddings=True)
+        return self.search_batch([query_text], top_k=top_k)[0]
+
+    def search_batch(self, query_texts: List[str], top_k: int = 3) -> List[List[str]]:
+        """
+        Tìm kiếm cho nhiều query cùng lúc (vd: mọi file của một PR).
+        Trả về danh sách context theo đúng thứ tự query_texts.
+        """
+        hits_per_query = self.vector_search_batch(query_texts, top_k=top_k)
+        return self.expand_hits_batch(hits_per_query)
+
+    def vector_search_batch(self, query_texts: List[str], top_k: int = 3) -> List[List[dict]]:
+        """
+        Encode tất cả query trong một lần forward pass, sau đó gửi các hybrid query
+        tới Weaviate song song. Trả về danh sách hit cho từng query.
+        """
+        if not query_texts:
+            return []
+        # Query thay đổi theo từng diff: chỉ giữ trong LRU, không ghi vào store trên đĩa
+        query_embeddings = self.embedding_store.encode(query_texts, self._encode, persist=False)
+        if self.vector_index is not None:
+            return self._index_query(query_texts, query_embeddings, top_k)
         collection = self.weaviate_client.collections.use(self.weaviate_collection)
-        response = collection.query.hybrid(
-            query=query_text,
-            vector=query_embedding.tolist(),
-            alpha=0.5,
-            limit=top_k,
-            return_properties=["ast_hash","name","content","file_path","node_type"]       # lấy field cần in
-        )
+
+        def hybrid(args):
+            query_text, query_embedding = args
+            return self._hybrid_query(collection, query_text, query_embedding, top_k)
+
+        if len(query_texts) == 1:
+            return [hybrid((query_texts[0], query_embeddings[0]))]
+        max_workers = min(len(query_texts), configs.REVIEW_RETRIEVAL_CONCURRENCY)
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="weaviate") as executor:
+            futures = [
+                metrics.submit_in_context(executor, hybrid, args)
+                for args in zip(query_texts, query_embeddings)
+            ]
+            return [future.result() for future in futures]
+
+    def symbol_search_batch(self, query_texts: List[str], symbols: List = None, top_k: int = 3) -> List[List[dict]]:
+        """
+        Như vector_search_batch nhưng query nào có symbol tra được trong symbol index thì lấy
+        thẳng object theo ast_hash (không embed, không hybrid search); chỉ các query còn lại
+        mới đi qua vector_search_batch. `symbols` song song với `query_texts` (None nếu không có).
+        """
+        resolved = self._resolve_symbols(query_texts, symbols, top_k)
+        fetched = self._fetch_by_ast_hashes([h for ast_hashes in resolved if ast_hashes for h in ast_hashes])
+        hits_per_query, misses = self._resolved_hits(resolved, fetched)
+        if misses:
+            searched = self.vector_search_batch([query_texts[i] for i in misses], top_k=top_k)
+            for i, hits in zip(misses, searched):
+                hits_per_query[i] = hits
+        return hits_per_query
+
+    def _resolve_symbols(self, query_texts: List[str], symbols, top_k: int) -> List:
+        if self.symbol_index is None or not symbols or len(symbols) != len(query_texts):
+            return [None] * len(query_texts)
+        with metrics.track_call("symbol_index", "resolve"):
+            return self.symbol_index.resolve_many(symbols, limit=top_k)
+
+    def _resolved_hits(self, resolved: List, fetched: Dict[str, dict]):
+        """(hit của từng query, None với query phải vector search; index các query đó)."""
+        hits_per_query, misses = [], []
+        for i, ast_hashes in enumerate(resolved):
+            hits = [fetched[ast_hash] for ast_hash in ast_hashes or [] if ast_hash in fetched]
+            # Symbol index cũ hơn vector store (object đã bị xoá) thì quay lại vector search
+            if ast_hashes and len(hits) == len(ast_hashes):
+                metrics.SYMBOL_LOOKUPS.labels("resolved").inc()
+                hits_per_query.append(hits)
+            else:
+                metrics.SYMBOL_LOOKUPS.labels("unresolved").inc()
+                hits_per_query.append(None)
+                misses.append(i)
+        return hits_per_query, misses
+
+    def _fetch_by_ast_hashes(self, ast_hashes: List[str]) -> Dict[str, dict]:
+        """Lấy object theo ast_hash: UUID generate_uuid5(ast_hash) trên Weaviate hoặc tra trong index mmap."""
+        if not ast_hashes:
+            return {}
+        if self.vector_index is not None:
+            with metrics.track_call("vector_index", "fetch"):
+                return self.vector_index.fetch_by_ast_hashes(ast_hashes, HIT_PROPERTIES)
+        collection = self.weaviate_client.collections.use(self.weaviate_collection)
+        with metrics.track_call("weaviate", "fetch_by_id"):
+            response = collection.query.fetch_objects(**self._fetch_by_id_args(ast_hashes))
+        return {hit["ast_hash"]: hit for hit in map(self._hit, response.objects)}
+
+    def _fetch_by_id_args(self, ast_hashes: List[str]) -> dict:
+        from weaviate.classes.query import Filter
+        from weaviate.util import generate_uuid5
+        uuids = [generate_uuid5(ast_hash) for ast_hash in dict.fromkeys(ast_hashes)]
+        return {
+            "filters": Filter.by_id().contains_any(uuids),
+            "limit": len(uuids),
+            "return_properties": HIT_PROPERTIES,
+        }
+
+    def _hybrid_query(self, collection, query_text: str, query_embedding, top_k: int) -> List[dict]:
+        with metrics.track_call("weaviate", "hybrid"):
+            response = collection.query.hybrid(
+                query=query_text,
+                vector=query_embedding.tolist(),
+                alpha=0.5,
+                limit=top_k,
+                return_properties=HIT_PROPERTIES       # lấy field cần in
+            )
+        return self._hits_from_response(response)
+
+    def _index_query(self, query_texts: List[str], query_embeddings, top_k: int) -> List[List[dict]]:
+        """Hybrid query cho cả batch trên MmapVectorIndex (một phép nhân ma trận, không qua mạng)."""
+        self.vector_index.maybe_reload()
+        with metrics.track_call("vector_index", "hybrid"):
+            hits_per_query = self.vector_index.hybrid_batch(query_texts, query_embeddings, alpha=0.5, top_k=top_k)
+        for hits in hits_per_query:
+            metrics.VECTOR_HITS.observe(len(hits))
+        return hits_per_query
+
+    def _hits_from_response(self, response) -> List[dict]:
+        metrics.VECTOR_HITS.observe(len(response.objects))
+        return [self._hit(obj) for obj in response.objects]
+
+    @staticmethod
+    def _hit(obj) -> dict:
+        return {key: obj.properties.get(key) for key in HIT_PROPERTIES}
+
+    def expand_hits(self, hits: List[dict]) -> List[str]:
+        """Mở rộng các hit của vector search qua graph Neo4j và format thành context."""
+        return self.expand_hits_batch([hits])[0]
+
+    def expand_hits_batch(self, hits_per_query: List[List[dict]]) -> List[List[str]]:
+        """
+        Mở rộng graph cho hit của nhiều query bằng một round trip Neo4j
+        (UNWIND trên toàn bộ ast_hash), rồi đóng gói context riêng cho từng query.
+        """
+        return [
+            self._context_list(relationships)
+            for relationships in self.expand_relationships_batch(hits_per_query)
+        ]
+
+    def expand_relationships_batch(self, hits_per_query: List[List[dict]]) -> List[List[dict]]:
+        """Giống expand_hits_batch nhưng trả về relationship thô để caller tự đóng gói."""
+        ast_hashes = self._hit_hashes(hits_per_query)
+        if configs.GRAPH_TRAVERSAL_MODE == "subgraph":
+            traversals = self.neo4j_service.get_related_subgraphs_by_ast_hashes(ast_hashes, max_level=7)
+        else:
+            traversals = self.neo4j_service.get_related_nodes_by_ast_hashes(ast_hashes, max_level=7)
+        return self._relationships_per_query(hits_per_query, traversals)
+
+    def _hit_hashes(self, hits_per_query: List[List[dict]]) -> List[str]:
+        return [
+            item.get("ast_hash")
+            for hits in hits_per_query
+            for item in hits
+            if item.get("ast_hash")
+        ]
+
+    def _relationships_per_query(self, hits_per_query: List[List[dict]], traversals: Dict[str, list]) -> List[List[dict]]:
+        extracted = {
+            ast_hash: self.neo4j_service.extract_relationships(related_nodes)
+            for ast_hash, related_nodes in traversals.items()
+        }
+
         results = []
-        for i, obj in enumerate(response.objects):
-            results.append({
-                "ast_hash": obj.properties.get("ast_hash"),
-                "name": obj.properties.get("name"),
-                "content": obj.properties.get("content"),
-                "file_path": obj.properties.get("file_path"),
-                "node_type": obj.properties.get("node_type"),
-            })
-        
-        final_context = []
-        for item in results:
-            ast_hash = item.get("ast_hash")
-            graph_data = self.neo4j_service.get_node_by_ast_hash(ast_hash)
-            if graph_data:
-                related_nodes = self.neo4j_service.get_related_nodes([graph_data], max_level=7)
-                relationship_data = self.neo4j_service.extract_relationships(related_nodes)
-                context_str = self._format_context(relationship_data)
-                if context_str:
-                    final_context.append(context_str)
-        
-        return final_context
+        for hits in hits_per_query:
+            relationships = []
+            for hit_rank, item in enumerate(hits):
+                for rel in extracted.get(item.get("ast_hash"), []):
+                    relationships.append({**rel, "hit_rank": hit_rank})
+            results.append(relationships)
+        return results
+
+    def _context_list(self, relationships: List[dict]) -> List[str]:
+        context_str = self._format_context(relationships)
+        return [context_str] if context_str else []
+
+    async def asearch_batch(self, query_texts: List[str], top_k: int = 3) -> List[List[str]]:
+        """Phiên bản async của search_batch (cần gọi ainitialize trước)."""
+        hits_per_query = await self.avector_search_batch(query_texts, top_k=top_k)
+        return await self.aexpand_hits_batch(hits_per_query)
+
+    async def asymbol_search_batch(self, query_texts: List[str], symbols: List = None, top_k: int = 3) -> List[List[dict]]:
+        """Phiên bản async của symbol_search_batch."""
+        resolved = self._resolve_symbols(query_texts, symbols, top_k)
+        fetched = await self._afetch_by_ast_hashes([h for ast_hashes in resolved if ast_hashes for h in ast_hashes])
+        hits_per_query, misses = self._resolved_hits(resolved, fetched)
+        if misses:
+            searched = await self.avector_search_batch([query_texts[i] for i in misses], top_k=top_k)
+            for i, hits in zip(misses, searched):
+                hits_per_query[i] = hits
+        return hits_per_query
+
+    async def _afetch_by_ast_hashes(self, ast_hashes: List[str]) -> Dict[str, dict]:
+        if not ast_hashes:
+            return {}
+        if self.vector_index is not None:
+            return await asyncio.to_thread(self._fetch_by_ast_hashes, ast_hashes)
+        collection = self.async_weaviate_client.collections.use(self.weaviate_collection)
+        with metrics.track_call("weaviate", "fetch_by_id"):
+            response = await collection.query.fetch_objects(**self._fetch_by_id_args(ast_hashes))
+        return {hit["ast_hash"]: hit for hit in map(self._hit, response.objects)}
+
+    async def avector_search_batch(self, query_texts: List[str], top_k: int = 3) -> List[List[dict]]:
+        if not query_texts:
+            return []
+        # Encode là CPU-bound nên chạy ngoài event loop
+        query_embeddings = await asyncio.to_thread(
+            self.embedding_store.encode, query_texts, self._encode, persist=False
+        )
+        if self.vector_index is not None:
+            return await asyncio.to_thread(self._index_query, query_texts, query_embeddings, top_k)
+        collection = self.async_weaviate_client.collections.use(self.weaviate_collection)
+
+        async def hybrid(query_text, query_embedding):
+            with metrics.track_call("weaviate", "hybrid"):
+                response = await collection.query.hybrid(
+                    query=query_text,
+                    vector=query_embedding.tolist(),
+                    alpha=0.5,
+                    limit=top_k,
+                    return_properties=HIT_PROPERTIES
+                )
+            return self._hits_from_response(response)
+
+        return list(await asyncio.gather(*(
+            hybrid(query_text, query_embedding)
+            for query_text, query_embedding in zip(query_texts, query_embeddings)
+        )))
+
+    async def aexpand_hits(self, hits: List[dict]) -> List[str]:
+        return (await self.aexpand_hits_batch([hits]))[0]
+
+    async def aexpand_hits_batch(self, hits_per_query: List[List[dict]]) -> List[List[str]]:
+        return [
+            self._context_list(relationships)
+            for relationships in await self.aexpand_relationships_batch(hits_per_query)
+        ]
+
+    async def aexpand_relationships_batch(self, hits_per_query: List[List[dict]]) -> List[List[dict]]:
+        if self.async_neo4j_service is None:
+            # Graph snapshot: traversal trong process, chạy ngoài event loop như _index_query
+            return await asyncio.to_thread(self.expand_relationships_batch, hits_per_query)
+        ast_hashes = self._hit_hashes(hits_per_query)
+        if configs.GRAPH_TRAVERSAL_MODE == "subgraph":
+            traversals = await self.async_neo4j_service.get_related_subgraphs_by_ast_hashes(ast_hashes, max_level=7)
+        else:
+            traversals = await self.async_neo4j_service.get_related_nodes_by_ast_hashes(ast_hashes, max_level=7)
+        return self._relationships_per_query(hits_per_query, traversals)
 
     def _format_context(self, relationship_data) -> str:
         if not relationship_data or len(relationship_data) == 0:
             return None
-        
-        description = "Based on the code graph, here are some related code relationships:\n"
-        for rel in relationship_data:
-            description += f"- Relationship Type: {rel['relationship_type']}\n"
-            description += f"  From ({', '.join(rel['from_labels'])}):\n"
-            description += f"  ```\n{rel['from_content']}\n```\n"
-            description += f"  To ({', '.join(rel['to_labels'])}):\n"
-            description += f"  ```\n{rel['to_content']}\n```\n"
-
-        return description
-    
\ No newline at end of file
+        return self.context_packer.pack(relationship_data).text or None
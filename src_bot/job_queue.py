@@ -0,0 +1,270 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+from src_bot.config.config import configs
+from src_bot import metrics
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+SUPERSEDED = "superseded"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    repo_name TEXT NOT NULL,
+    pr_number INTEGER NOT NULL,
+    head_sha TEXT NOT NULL,
+    action TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT,
+    UNIQUE (repo_name, pr_number, head_sha)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_available ON jobs (status, available_at, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_pr ON jobs (repo_name, pr_number, status);
+"""
+
+
+class JobQueue:
+    """
+    Hàng đợi review PR lưu trên SQLite, thay cho FastAPI BackgroundTasks.
+
+    - Dedupe theo (repo, PR, head SHA).
+    - Coalesce: job mới của cùng PR sẽ thay thế (superseded) các job cũ còn đang chờ,
+      job `synchronize` được trì hoãn JOB_QUEUE_COALESCE_SECONDS để gom các lần push liên tiếp.
+    - Worker pool cố định, retry với backoff, và job đang chạy dở được đưa lại hàng đợi khi restart.
+    """
+
+    def __init__(
+        self,
+        db_path: str = None,
+        num_workers: int = None,
+        max_pending: int = None,
+        max_attempts: int = None,
+    ):
+        self.db_path = db_path or configs.JOB_QUEUE_PATH
+        self.num_workers = num_workers or configs.JOB_QUEUE_WORKERS
+        self.max_pending = max_pending or configs.JOB_QUEUE_MAX_PENDING
+        self.max_attempts = max_attempts or configs.JOB_QUEUE_MAX_ATTEMPTS
+        self.handler: Optional[Callable] = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._workers = []
+        self._tasks = []
+        self._conn = None
+
+    def initialize(self, handler: Callable):
+        """
+        handler(repo_name, pr_number, head_sha) sẽ được gọi cho mỗi job.
+        Nếu handler là coroutine function, worker chạy dưới dạng task trên event loop
+        hiện tại (phải gọi từ bên trong loop, vd: lifespan của FastAPI).
+        """
+        self.handler = handler
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+
+        with self._lock:
+            recovered = self._conn.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?",
+                (QUEUED, time.time(), RUNNING),
+            ).rowcount
+        if recovered:
+            print(f"Job queue: re-queued {recovered} interrupted job(s).")
+        metrics.JOB_QUEUE_DEPTH.set_function(lambda: self.pending_count() if self._conn is not None else 0)
+
+        self._stopping.clear()
+        if asyncio.iscoroutinefunction(handler):
+            loop = asyncio.get_running_loop()
+            for i in range(self.num_workers):
+                self._tasks.append(loop.create_task(self._async_worker_loop(), name=f"review-worker-{i}"))
+        else:
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f"review-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+        print(f"Job queue initialized with {self.num_workers} worker(s) at {self.db_path}.")
+
+    def close(self):
+        self._stopping.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout=5)
+        self._workers = []
+        for task in self._tasks:
+            # Job bị huỷ giữa chừng vẫn ở trạng thái running và sẽ được chạy lại khi khởi động
+            task.cancel()
+        self._tasks = []
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            print("Job queue closed.")
+
+    def enqueue(self, repo_name: str, pr_number: int, head_sha: str, action: str) -> dict:
+        """
+        Trả về dict gồm status ("queued" | "duplicate" | "rejected"), job_id và queue_position.
+        """
+        now = time.time()
+        delay = configs.JOB_QUEUE_COALESCE_SECONDS if action == "synchronize" else 0
+        with self._lock:
+            existing = self._conn.execute(
+                "SELECT id, status FROM jobs WHERE repo_name = ? AND pr_number = ? AND head_sha = ?",
+                (repo_name, pr_number, head_sha),
+            ).fetchone()
+            if existing and existing["status"] in (QUEUED, RUNNING, DONE):
+                return {
+                    "status": "duplicate",
+                    "job_id": existing["id"],
+                    "queue_position": self._position(existing["id"]),
+                }
+
+            # Job đang chờ của chính PR này sẽ bị superseded bên dưới nên không tính vào sức chứa
+            pending = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND NOT (repo_name = ? AND pr_number = ?)",
+                (QUEUED, repo_name, pr_number),
+            ).fetchone()[0]
+            if pending >= self.max_pending:
+                return {"status": "rejected", "job_id": None, "queue_position": None}
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ? "
+                    "WHERE repo_name = ? AND pr_number = ? AND status = ? AND head_sha != ?",
+                    (SUPERSEDED, now, repo_name, pr_number, QUEUED, head_sha),
+                )
+                if existing:
+                    # Job cũ đã failed/superseded: đưa lại vào hàng đợi
+                    job_id = existing["id"]
+                    self._conn.execute(
+                        "UPDATE jobs SET status = ?, action = ?, attempts = 0, available_at = ?, "
+                        "updated_at = ?, last_error = NULL WHERE id = ?",
+                        (QUEUED, action, now + delay, now, job_id),
+                    )
+                else:
+                    job_id = self._conn.execute(
+                        "INSERT INTO jobs (repo_name, pr_number, head_sha, action, status, available_at, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (repo_name, pr_number, head_sha, action, QUEUED, now + delay, now, now),
+                    ).lastrowid
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            position = self._position(job_id)
+
+        self._wakeup.set()
+        return {"status": "queued", "job_id": job_id, "queue_position": position}
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+
+    def _position(self, job_id: int) -> Optional[int]:
+        row = self._conn.execute("SELECT status, available_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if not row or row["status"] != QUEUED:
+            return 0 if row and row["status"] == RUNNING else None
+        ahead = self._conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND (available_at < ? OR (available_at = ? AND id < ?))",
+            (QUEUED, row["available_at"], row["available_at"], job_id),
+        ).fetchone()[0]
+        return ahead + 1
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        now = time.time()
+        with self._lock:
+            # Không chạy song song 2 job của cùng một PR
+            row = self._conn.execute(
+                """
+                SELECT * FROM jobs j
+                WHERE j.status = ? AND j.available_at <= ?
+                AND NOT EXISTS (
+                    SELECT 1 FROM jobs r
+                    WHERE r.status = ? AND r.repo_name = j.repo_name AND r.pr_number = j.pr_number
+                )
+                ORDER BY j.available_at, j.id
+                LIMIT 1
+                """,
+                (QUEUED, now, RUNNING),
+            ).fetchone()
+            if not row:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (RUNNING, now, row["id"]),
+            )
+            return row
+
+    def _finish(self, job: sqlite3.Row, error: Exception = None):
+        now = time.time()
+        with self._lock:
+            if error is None:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ?, last_error = NULL WHERE id = ?",
+                    (DONE, now, job["id"]),
+                )
+                metrics.JOBS_FINISHED.labels(DONE).inc()
+                return
+            attempts = job["attempts"] + 1
+            if attempts < self.max_attempts:
+                backoff = configs.JOB_QUEUE_RETRY_BACKOFF_SECONDS * (2 ** (attempts - 1))
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, available_at = ?, updated_at = ?, last_error = ? WHERE id = ?",
+                    (QUEUED, now + backoff, now, str(error), job["id"]),
+                )
+                metrics.JOBS_FINISHED.labels("retry").inc()
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, updated_at = ?, last_error = ? WHERE id = ?",
+                    (FAILED, now, str(error), job["id"]),
+                )
+                metrics.JOBS_FINISHED.labels(FAILED).inc()
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            job = self._claim_next()
+            if job is None:
+                self._wakeup.wait(timeout=configs.JOB_QUEUE_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            try:
+                self.handler(
+                    repo_name=job["repo_name"],
+                    pr_number=job["pr_number"],
+                    head_sha=job["head_sha"],
+                )
+                self._finish(job)
+            except Exception as e:
+                print(f"Job {job['id']} ({job['repo_name']}#{job['pr_number']}) failed: {e}")
+                self._finish(job, e)
+
+    async def _async_worker_loop(self):
+        while not self._stopping.is_set():
+            job = self._claim_next()
+            if job is None:
+                await asyncio.sleep(configs.JOB_QUEUE_POLL_INTERVAL)
+                continue
+            try:
+                await self.handler(
+                    repo_name=job["repo_name"],
+                    pr_number=job["pr_number"],
+                    head_sha=job["head_sha"],
+                )
+                self._finish(job)
+            except Exception as e:
+                print(f"Job {job['id']} ({job['repo_name']}#{job['pr_number']}) failed: {e}")
+                self._finish(job, e)
+
+
+job_queue_instance = JobQueue()
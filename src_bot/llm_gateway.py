@@ -0,0 +1,295 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+from src_bot.config.config import configs
+from src_bot import metrics
+
+
+class LLMTimeoutError(TimeoutError):
+    """Generate vượt quá LLM_TIMEOUT_SECONDS."""
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: float
+    seq: int
+    wake: Callable[[], None] = field(compare=False)
+    granted: bool = field(default=False, compare=False)
+
+
+@dataclass(eq=False)
+class _Generation:
+    """Một lần generate dùng chung cho mọi request có cùng prompt, kèm số request đang chờ nó."""
+    result: Future = field(default_factory=Future)
+    waiters: int = 1
+    task: Optional[asyncio.Task] = None
+    loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+class _PriorityLimiter:
+    """
+    Giới hạn số request đồng thời tới LLM. Khi một slot được trả, nó được trao thẳng cho
+    request đang chờ có priority nhỏ nhất (cùng priority thì theo thứ tự tới).
+    Dùng chung cho thread (BotService sync) và event loop (BotService async).
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self._active = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def _enqueue(self, priority: float, wake: Callable[[], None]) -> Optional[_Waiter]:
+        """Lấy slot ngay nếu còn (trả về None), ngược lại xếp hàng."""
+        with self._lock:
+            if self._active < self.limit:
+                self._active += 1
+                return None
+            waiter = _Waiter(priority, next(self._seq), wake)
+            heapq.heappush(self._waiters, waiter)
+            metrics.LLM_QUEUE_DEPTH.set(len(self._waiters))
+            return waiter
+
+    def release(self):
+        with self._lock:
+            if not self._waiters:
+                self._active -= 1
+                return
+            waiter = heapq.heappop(self._waiters)
+            waiter.granted = True
+            metrics.LLM_QUEUE_DEPTH.set(len(self._waiters))
+            waiter.wake()
+
+    def _abandon(self, waiter: _Waiter):
+        """Request bị huỷ trong lúc chờ: rời hàng đợi, hoặc trả lại slot nếu vừa được trao."""
+        with self._lock:
+            if not waiter.granted:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+                metrics.LLM_QUEUE_DEPTH.set(len(self._waiters))
+                return
+        self.release()
+
+    @contextmanager
+    def slot(self, priority: float):
+        started = time.perf_counter()
+        event = threading.Event()
+        waiter = self._enqueue(priority, event.set)
+        if waiter is not None:
+            try:
+                event.wait()
+            except BaseException:
+                self._abandon(waiter)
+                raise
+        metrics.LLM_QUEUE_WAIT.observe(time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self, priority: float):
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._enqueue(priority, wake)
+        if waiter is not None:
+            try:
+                await granted
+            except BaseException:
+                self._abandon(waiter)
+                raise
+        metrics.LLM_QUEUE_WAIT.observe(time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class LLMGateway:
+    """
+    Điểm duy nhất gọi tới Ollama, dùng chung cho mọi review đang chạy trong process:
+    - tối đa REVIEW_LLM_CONCURRENCY request cùng lúc (nên bằng OLLAMA_NUM_PARALLEL), request
+      chờ theo priority: PR nhỏ được ưu tiên, mỗi LLM_PRIORITY_CHARS_PER_SECOND ký tự diff
+      tương đương tới muộn 1 giây nên PR lớn không bị chờ mãi;
+    - model được giữ trong bộ nhớ (keep_alive) với num_ctx cố định để Ollama không load lại;
+    - các prompt giống hệt nhau đang chạy được gộp thành một lần generate;
+    - generate dạng stream, giới hạn LLM_NUM_PREDICT token và LLM_TIMEOUT_SECONDS.
+    """
+
+    def __init__(self, llm=None, max_concurrency: int = None, timeout: float = None):
+        self.llm = llm
+        self.timeout = timeout or configs.LLM_TIMEOUT_SECONDS
+        self.limiter = _PriorityLimiter(max_concurrency or configs.REVIEW_LLM_CONCURRENCY)
+        self._inflight: Dict[str, _Generation] = {}
+        self._lock = threading.Lock()
+
+    def initialize(self):
+        """Tạo ChatOllama (import nặng chỉ khi khởi tạo) và load model vào bộ nhớ."""
+        if self.llm is None:
+            from langchain_ollama import ChatOllama
+
+            self.llm = ChatOllama(
+                model=configs.LLM_MODEL_NAME,
+                temperature=0,
+                keep_alive=_keep_alive(configs.LLM_KEEP_ALIVE),
+                num_ctx=configs.LLM_NUM_CTX or None,
+                num_predict=configs.LLM_NUM_PREDICT,
+                # Timeout đọc của httpx: server treo giữa chừng cũng không giữ slot mãi
+                client_kwargs={"timeout": self.timeout},
+            )
+        # Buộc Ollama load model vào bộ nhớ trước review đầu tiên
+        self.llm.invoke("ping")
+        return self
+
+    def priority(self, pr_size: int) -> float:
+        """Key của hàng đợi: thời điểm tới, lùi thêm theo kích thước diff của PR."""
+        if configs.LLM_PRIORITY_CHARS_PER_SECOND <= 0:
+            return time.monotonic()
+        return time.monotonic() + pr_size / configs.LLM_PRIORITY_CHARS_PER_SECOND
+
+    def generate(self, messages, pr_size: int = 0) -> str:
+        key, generation, leader = self._join(messages)
+        try:
+            if not leader:
+                metrics.LLM_REQUESTS.labels("coalesced").inc()
+                return generation.result.result()
+            try:
+                with self.limiter.slot(self.priority(pr_size)):
+                    content = self._stream(messages)
+            except BaseException as e:
+                self._finish(key, generation, error=e)
+                raise
+            self._finish(key, generation, content=content)
+            return content
+        finally:
+            self._leave(key, generation)
+
+    async def agenerate(self, messages, pr_size: int = 0) -> str:
+        key, generation, leader = self._join(messages)
+        if leader:
+            # Generate chạy thành task riêng: request đầu tiên bị huỷ không kéo theo các request đi kèm
+            generation.loop = asyncio.get_running_loop()
+            generation.task = generation.loop.create_task(self._agenerate(key, generation, messages, pr_size))
+        else:
+            metrics.LLM_REQUESTS.labels("coalesced").inc()
+        try:
+            # shield: request bị huỷ / timeout chỉ rời khỏi generation chung, không huỷ nó
+            return await asyncio.shield(asyncio.wrap_future(generation.result))
+        finally:
+            self._leave(key, generation)
+
+    async def _agenerate(self, key: str, generation: _Generation, messages, pr_size: int):
+        try:
+            async with self.limiter.aslot(self.priority(pr_size)):
+                content = await self._astream(messages)
+        except Exception as e:
+            # Lỗi được trả cho mọi request qua generation.result
+            self._finish(key, generation, error=e)
+            return
+        except BaseException as e:
+            self._finish(key, generation, error=e)
+            raise
+        self._finish(key, generation, content=content)
+
+    def _join(self, messages) -> Tuple[str, _Generation, bool]:
+        """(key của prompt, generation chung, True nếu request này phải khởi động generate)."""
+        key = _prompt_key(self.llm, messages)
+        with self._lock:
+            generation = self._inflight.get(key)
+            if generation is not None:
+                generation.waiters += 1
+                return key, generation, False
+            generation = self._inflight[key] = _Generation()
+            return key, generation, True
+
+    def _leave(self, key: str, generation: _Generation):
+        """Request không chờ nữa; request cuối cùng rời đi thì huỷ generate async còn đang chạy."""
+        with self._lock:
+            generation.waiters -= 1
+            if generation.waiters > 0 or generation.result.done():
+                return
+            # Request sau với cùng prompt sẽ generate lại từ đầu
+            if self._inflight.get(key) is generation:
+                del self._inflight[key]
+            task, loop = generation.task, generation.loop
+        if task is not None:
+            loop.call_soon_threadsafe(task.cancel)
+
+    def _finish(self, key: str, generation: _Generation, content: str = None, error: BaseException = None):
+        with self._lock:
+            if self._inflight.get(key) is generation:
+                del self._inflight[key]
+        if isinstance(error, asyncio.CancelledError):
+            metrics.LLM_REQUESTS.labels("cancelled").inc()
+            generation.result.cancel()
+        elif error is not None:
+            metrics.LLM_REQUESTS.labels("timeout" if isinstance(error, LLMTimeoutError) else "error").inc()
+            generation.result.set_exception(error)
+        else:
+            generation.result.set_result(content)
+
+    def _stream(self, messages) -> str:
+        deadline = time.monotonic() + self.timeout
+        parts, last = [], None
+        with metrics.track_call("ollama", "generate"):
+            stream = self.llm.stream(messages)
+            try:
+                for last in stream:
+                    parts.append(last.content)
+                    if time.monotonic() > deadline:
+                        raise LLMTimeoutError(f"LLM không trả lời xong trong {self.timeout:g}s")
+            finally:
+                stream.close()
+        return self._completed(parts, last)
+
+    async def _astream(self, messages) -> str:
+        parts, last = [], None
+
+        async def consume():
+            nonlocal last
+            async for last in self.llm.astream(messages):
+                parts.append(last.content)
+
+        with metrics.track_call("ollama", "generate"):
+            try:
+                await asyncio.wait_for(consume(), self.timeout)
+            except asyncio.TimeoutError:
+                raise LLMTimeoutError(f"LLM không trả lời xong trong {self.timeout:g}s") from None
+        return self._completed(parts, last)
+
+    @staticmethod
+    def _completed(parts: List[str], last) -> str:
+        metadata = getattr(last, "response_metadata", None) or {}
+        if metadata.get("done_reason") == "length":
+            print(f"  -> Review bị cắt ở {configs.LLM_NUM_PREDICT} token (LLM_NUM_PREDICT)")
+            metrics.LLM_REQUESTS.labels("truncated").inc()
+        else:
+            metrics.LLM_REQUESTS.labels("generated").inc()
+        return "".join(parts)
+
+
+def _keep_alive(value: str):
+    """"-1" / "3600" -> số giây (âm: giữ model mãi), "30m" / "2h" -> chuỗi duration của Ollama."""
+    return int(value) if value.lstrip("-").isdigit() else value
+
+
+def _prompt_key(llm, messages) -> str:
+    payload = json.dumps(
+        [getattr(llm, "model", None), [(message.type, message.content) for message in messages]],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
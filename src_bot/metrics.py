@@ -0,0 +1,146 @@
+import contextvars
+import functools
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from src_bot.config.config import configs
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+_SIZE_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+_TOKEN_BUCKETS = (0, 250, 500, 1000, 2000, 4000, 6000, 8000, 16000, 32000)
+
+STAGE_LATENCY = Histogram(
+    "codebot_stage_seconds", "Thời gian chạy mỗi node LangGraph", ["stage"], buckets=_LATENCY_BUCKETS
+)
+EXTERNAL_CALL_LATENCY = Histogram(
+    "codebot_external_call_seconds", "Thời gian mỗi lời gọi ra ngoài",
+    ["service", "operation"], buckets=_LATENCY_BUCKETS,
+)
+EXTERNAL_CALL_ERRORS = Counter(
+    "codebot_external_call_errors_total", "Số lời gọi ra ngoài bị lỗi", ["service", "operation"]
+)
+PR_REVIEW_LATENCY = Histogram(
+    "codebot_pr_review_seconds", "Thời gian review toàn bộ một PR", ["mode"], buckets=_LATENCY_BUCKETS
+)
+CONTEXT_TOKENS = Histogram(
+    "codebot_context_tokens", "Số token (ước lượng) của graph context đưa vào prompt", buckets=_TOKEN_BUCKETS
+)
+CONTEXT_RELATIONSHIPS = Histogram(
+    "codebot_context_relationships", "Số relationship được đưa vào / bị bỏ khỏi context",
+    ["result"], buckets=_SIZE_BUCKETS,
+)
+TRAVERSAL_RESULTS = Histogram(
+    "codebot_traversal_results", "Số path (hoặc cạnh của subgraph) Neo4j trả về cho mỗi truy vấn",
+    ["mode"], buckets=_SIZE_BUCKETS,
+)
+VECTOR_HITS = Histogram("codebot_vector_hits", "Số hit của mỗi hybrid query", buckets=_SIZE_BUCKETS)
+REVIEW_CACHE_LOOKUPS = Counter("codebot_review_cache_lookups_total", "Tra cứu review cache", ["result"])
+SYMBOL_LOOKUPS = Counter(
+    "codebot_symbol_lookups_total", "Symbol của diff lấy thẳng theo ast_hash / phải qua vector search", ["result"]
+)
+LLM_REQUESTS = Counter(
+    "codebot_llm_requests_total", "Request qua LLM gateway: generated / truncated / coalesced / timeout / error / cancelled", ["result"]
+)
+LLM_QUEUE_DEPTH = Gauge("codebot_llm_queue_depth", "Số request đang chờ slot LLM")
+LLM_QUEUE_WAIT = Histogram("codebot_llm_queue_wait_seconds", "Thời gian chờ slot LLM", buckets=_LATENCY_BUCKETS)
+JOBS_FINISHED = Counter("codebot_jobs_finished_total", "Job review đã kết thúc", ["status"])
+JOB_QUEUE_DEPTH = Gauge("codebot_job_queue_depth", "Số job đang chờ trong hàng đợi")
+GITHUB_RATE_LIMIT_REMAINING = Gauge("codebot_github_rate_limit_remaining", "Số request GitHub API còn lại")
+
+# Trace theo PR (bật bằng METRICS_TRACE_PRS): danh sách span của PR đang xử lý trong context hiện tại
+_current_trace: contextvars.ContextVar[Optional["PrTrace"]] = contextvars.ContextVar("codebot_pr_trace", default=None)
+
+
+class PrTrace:
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: List[tuple] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, started: float, seconds: float, error: bool = False):
+        with self._lock:
+            self.spans.append((started - self.started, name, seconds, error))
+
+    def report(self) -> str:
+        total = time.perf_counter() - self.started
+        lines = [f"--- TRACE {self.name}: {total * 1000:.0f} ms ---"]
+        for offset, name, seconds, error in sorted(self.spans):
+            flag = " ERROR" if error else ""
+            lines.append(f"  +{offset * 1000:8.1f} ms  {seconds * 1000:8.1f} ms  {name}{flag}")
+        return "\n".join(lines)
+
+
+def _record_span(name: str, started: float, error: bool):
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(name, started, time.perf_counter() - started, error)
+
+
+@contextmanager
+def trace_pr(repo_name: str, pr_number: int, mode: str = "sync"):
+    """Đo thời gian review một PR; nếu METRICS_TRACE_PRS bật thì in các span của PR khi xong."""
+    trace = PrTrace(f"{repo_name}#{pr_number}") if configs.METRICS_TRACE_PRS else None
+    token = _current_trace.set(trace)
+    started = time.perf_counter()
+    try:
+        yield trace
+    finally:
+        PR_REVIEW_LATENCY.labels(mode).observe(time.perf_counter() - started)
+        _current_trace.reset(token)
+        if trace is not None:
+            print(trace.report())
+
+
+@contextmanager
+def track_call(service: str, operation: str):
+    """Ghi latency (và lỗi) của một lời gọi ra ngoài: embedding, weaviate, neo4j, ollama, github."""
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        EXTERNAL_CALL_ERRORS.labels(service, operation).inc()
+        raise
+    finally:
+        EXTERNAL_CALL_LATENCY.labels(service, operation).observe(time.perf_counter() - started)
+        _record_span(f"{service}.{operation}", started, error)
+
+
+def track_stage(stage: str):
+    """Decorator cho node LangGraph (sync hoặc async)."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    STAGE_LATENCY.labels(stage).observe(time.perf_counter() - started)
+                    _record_span(f"stage.{stage}", started, False)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                STAGE_LATENCY.labels(stage).observe(time.perf_counter() - started)
+                _record_span(f"stage.{stage}", started, False)
+        return wrapper
+    return decorator
+
+
+def submit_in_context(executor, fn, *args):
+    """executor.submit nhưng giữ contextvars (trace của PR) trong thread worker."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def render_latest():
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,490 @@
+import hashlib
+import json
+import mmap
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from src_bot.config.config import configs
+from src_bot.neo4jdb.graph_types import GraphNode, GraphPath, GraphRelationship, GraphTraversal
+
+FORMAT_VERSION = 1
+# Các loại quan hệ được traversal dùng tới (xem relationship_filter của Neo4jService)
+RELATIONSHIP_TYPES = ("CALL", "USE", "IMPLEMENT", "EXTEND", "BRANCH")
+
+_META = "meta.json"
+_NODE_RECORDS = "nodes.bin"
+_NODE_OFFSETS = "node_offsets.npy"
+_NODE_HAS_METHOD = "node_has_method.npy"
+_NODE_BRANCH = "node_branch.npy"
+_AST_HASH_KEYS = "ast_hash_keys.npy"
+_AST_HASH_NODES = "ast_hash_nodes.npy"
+_SCOPE_KEYS = "scope_keys.npy"
+_SCOPE_NODES = "scope_nodes.npy"
+
+
+def _key(value) -> int:
+    digest = hashlib.blake2b(json.dumps(value, ensure_ascii=False).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def scope_key(project_id, class_name, branch, method_name) -> Optional[int]:
+    """
+    Key của _MATCH_ENDPOINT: cùng project/class/branch và method_name (NULL khớp NULL).
+    Trả về None khi thiếu project/class/branch vì phép so sánh bằng với NULL trong Cypher không khớp.
+    """
+    if project_id is None or class_name is None or branch is None:
+        return None
+    return _key([project_id, class_name, branch, method_name])
+
+
+def parse_relationship_filter(relationship_filter: str) -> List[Tuple[str, bool, bool]]:
+    """"CALL>|<IMPLEMENT|USE" -> [("CALL", out, in), ...] theo cú pháp relationshipFilter của APOC."""
+    rules = []
+    for token in relationship_filter.split("|"):
+        if token.startswith("<"):
+            rules.append((token[1:], False, True))
+        elif token.endswith(">"):
+            rules.append((token[:-1], True, False))
+        else:
+            rules.append((token, True, True))
+    return rules
+
+
+class GraphSnapshotWriter:
+    """
+    Ghi snapshot của code property graph: node được intern thành int theo thứ tự thêm vào
+    (add_node phải được gọi cho mọi node trước add_relationship), property của node nằm trong
+    một blob JSON, quan hệ được lưu thành mảng CSR theo từng loại và từng chiều.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._tmp_path = f"{path}.tmp"
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+        os.makedirs(self._tmp_path)
+        self._records = open(os.path.join(self._tmp_path, _NODE_RECORDS), "wb")
+        self._offsets = [0]
+        self._ids: Dict[str, int] = {}
+        self._has_method = []
+        self._branch = []
+        self._branches: Dict[str, int] = {}
+        self._ast_hash_keys = []
+        self._scope_keys = []
+        self._relationships: Dict[str, Tuple[List[int], List[int]]] = {
+            rel_type: ([], []) for rel_type in RELATIONSHIP_TYPES
+        }
+        self.skipped_relationships = 0
+
+    @property
+    def node_count(self) -> int:
+        return len(self._has_method)
+
+    def add_node(self, element_id: str, node_id: Optional[int], labels: Sequence[str], properties: Dict) -> int:
+        if element_id in self._ids:
+            return self._ids[element_id]
+        index = self.node_count
+        self._ids[element_id] = index
+
+        record = json.dumps({
+            "element_id": element_id,
+            "id": node_id,
+            "labels": list(labels),
+            "properties": properties,
+        }, ensure_ascii=False, default=str).encode("utf-8")
+        self._records.write(record)
+        self._offsets.append(self._offsets[-1] + len(record))
+
+        self._has_method.append(properties.get("method_name") is not None)
+        branch = properties.get("branch")
+        self._branch.append(-1 if branch is None else self._branches.setdefault(branch, len(self._branches)))
+        if properties.get("ast_hash") is not None:
+            self._ast_hash_keys.append((_key(properties["ast_hash"]), index))
+        key = scope_key(
+            properties.get("project_id"), properties.get("class_name"),
+            properties.get("branch"), properties.get("method_name"),
+        )
+        if key is not None:
+            self._scope_keys.append((key, index))
+        return index
+
+    def add_relationship(self, rel_type: str, start_element_id: str, end_element_id: str) -> bool:
+        start = self._ids.get(start_element_id)
+        end = self._ids.get(end_element_id)
+        if rel_type not in self._relationships or start is None or end is None:
+            self.skipped_relationships += 1
+            return False
+        starts, ends = self._relationships[rel_type]
+        starts.append(start)
+        ends.append(end)
+        return True
+
+    def finish(self, graph_version: Optional[int] = None) -> Dict:
+        """Ghi các mảng, thay thế snapshot cũ tại `path` bằng một lần rename và trả về meta."""
+        self._records.close()
+        count = self.node_count
+        self._save(_NODE_OFFSETS, np.asarray(self._offsets, dtype=np.int64))
+        self._save(_NODE_HAS_METHOD, np.asarray(self._has_method, dtype=bool))
+        self._save(_NODE_BRANCH, np.asarray(self._branch, dtype=np.int32))
+        self._save_lookup(_AST_HASH_KEYS, _AST_HASH_NODES, self._ast_hash_keys)
+        self._save_lookup(_SCOPE_KEYS, _SCOPE_NODES, self._scope_keys)
+
+        relationship_counts = {}
+        for rel_type, (starts, ends) in self._relationships.items():
+            starts = np.asarray(starts, dtype=np.int32)
+            ends = np.asarray(ends, dtype=np.int32)
+            relationship_counts[rel_type] = int(starts.shape[0])
+            self._save_csr(f"{rel_type}.out", starts, ends, count)
+            self._save_csr(f"{rel_type}.in", ends, starts, count)
+
+        meta = {
+            "format": FORMAT_VERSION,
+            "node_count": count,
+            "relationships": relationship_counts,
+            "branches": sorted(self._branches, key=self._branches.get),
+            "graph_version": graph_version,
+            "created_at": time.strftime(configs.DATETIME_FORMAT),
+        }
+        with open(os.path.join(self._tmp_path, _META), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+        # Process đang mmap snapshot cũ vẫn đọc được file cũ cho tới khi reload
+        old_path = f"{self.path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(self.path):
+            os.rename(self.path, old_path)
+        os.rename(self._tmp_path, self.path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        return meta
+
+    def abort(self):
+        self._records.close()
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+    def _save_lookup(self, keys_name: str, nodes_name: str, pairs: List[Tuple[int, int]]):
+        keys = np.fromiter((key for key, _ in pairs), dtype=np.uint64, count=len(pairs))
+        nodes = np.fromiter((node for _, node in pairs), dtype=np.int32, count=len(pairs))
+        order = np.lexsort((nodes, keys))
+        self._save(keys_name, keys[order])
+        self._save(nodes_name, nodes[order])
+
+    def _save_csr(self, name: str, sources: np.ndarray, targets: np.ndarray, count: int):
+        order = np.argsort(sources, kind="stable")
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=count), out=offsets[1:])
+        self._save(f"{name}_offsets.npy", offsets)
+        self._save(f"{name}_targets.npy", targets[order])
+
+    def _save(self, name: str, array: np.ndarray):
+        np.save(os.path.join(self._tmp_path, name), array)
+
+
+class _SnapshotData:
+    """Các mảng mmap của một phiên bản snapshot (được thay nguyên khối khi reload)."""
+
+    __slots__ = (
+        "meta", "mtime", "node_offsets", "has_method", "branch", "develop", "main",
+        "ast_hash_keys", "ast_hash_nodes", "scope_keys", "scope_nodes", "csr", "records_file", "records",
+    )
+
+    def __init__(self, path: str):
+        meta_path = os.path.join(path, _META)
+        self.mtime = os.stat(meta_path).st_mtime_ns
+        with open(meta_path, encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Graph snapshot {path} có format {self.meta.get('format')}, cần {FORMAT_VERSION}")
+
+        def load(name):
+            return np.asarray(np.load(os.path.join(path, name), mmap_mode="r"))
+
+        self.node_offsets = load(_NODE_OFFSETS)
+        self.has_method = load(_NODE_HAS_METHOD)
+        self.branch = load(_NODE_BRANCH)
+        branches = self.meta["branches"]
+        self.develop = branches.index("develop") if "develop" in branches else -2
+        self.main = branches.index("main") if "main" in branches else -2
+        self.ast_hash_keys = load(_AST_HASH_KEYS)
+        self.ast_hash_nodes = load(_AST_HASH_NODES)
+        self.scope_keys = load(_SCOPE_KEYS)
+        self.scope_nodes = load(_SCOPE_NODES)
+        self.csr = {
+            (rel_type, direction): (load(f"{rel_type}.{direction}_offsets.npy"), load(f"{rel_type}.{direction}_targets.npy"))
+            for rel_type in self.meta["relationships"]
+            for direction in ("out", "in")
+        }
+        self.records_file = open(os.path.join(path, _NODE_RECORDS), "rb")
+        size = os.fstat(self.records_file.fileno()).st_size
+        self.records = mmap.mmap(self.records_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def close(self):
+        if isinstance(self.records, mmap.mmap):
+            self.records.close()
+        self.records_file.close()
+
+
+class SnapshotQuery:
+    """
+    Decode node của một lần truy vấn: mỗi node chỉ được decode một lần (giống NodeIdentityMap)
+    và luôn dùng cùng một phiên bản snapshot kể cả khi có reload giữa chừng.
+    """
+
+    def __init__(self, data: _SnapshotData):
+        self.data = data
+        self.nodes: Dict[int, GraphNode] = {}
+        self._csr: Dict[str, list] = {}
+        self._neighbours: Dict[Tuple[str, int], list] = {}
+
+    def node(self, index: int) -> GraphNode:
+        node = self.nodes.get(index)
+        if node is None:
+            start, end = self.data.node_offsets[index], self.data.node_offsets[index + 1]
+            record = json.loads(self.data.records[start:end])
+            node = GraphNode(
+                element_id=record["element_id"],
+                id=record["id"],
+                labels=tuple(record["labels"]),
+                properties=record["properties"],
+            )
+            self.nodes[index] = node
+        return node
+
+    def _lookup(self, keys: np.ndarray, nodes: np.ndarray, key: int) -> List[int]:
+        start = np.searchsorted(keys, np.uint64(key), side="left")
+        end = np.searchsorted(keys, np.uint64(key), side="right")
+        return nodes[start:end].tolist()
+
+    def find_by_ast_hash(self, ast_hash: str) -> Optional[int]:
+        """Node đầu tiên có ast_hash (thứ tự label như _MATCH_BY_AST_HASH, tương đương collect(t)[0])."""
+        for index in self._lookup(self.data.ast_hash_keys, self.data.ast_hash_nodes, _key(ast_hash)):
+            if self.node(index).ast_hash == ast_hash:
+                return index
+        return None
+
+    def find_endpoints(self, project_id, class_name, branch, method_name) -> List[int]:
+        """Tương đương _MATCH_ENDPOINT."""
+        key = scope_key(project_id, class_name, branch, method_name)
+        if key is None:
+            return []
+        scope = (project_id, class_name, branch, method_name)
+        endpoints = []
+        for index in self._lookup(self.data.scope_keys, self.data.scope_nodes, key):
+            node = self.node(index)
+            # Kiểm tra lại property vì key chỉ là hash 64-bit
+            if (node.project_id, node.class_name, node.branch, node.method_name) == scope:
+                endpoints.append(index)
+        return endpoints
+
+    def neighbours(self, index: int, relationship_filter: str) -> List[Tuple[str, str, int]]:
+        """[(loại quan hệ, "out"/"in", node kề)] theo thứ tự của relationship_filter (được nhớ trong query)."""
+        key = (relationship_filter, index)
+        neighbours = self._neighbours.get(key)
+        if neighbours is not None:
+            return neighbours
+
+        csr = self._csr.get(relationship_filter)
+        if csr is None:
+            csr = self._csr[relationship_filter] = [
+                (rel_type, direction, *self.data.csr[(rel_type, direction)])
+                for rel_type, outgoing, incoming in parse_relationship_filter(relationship_filter)
+                for direction, enabled in (("out", outgoing), ("in", incoming))
+                if enabled and (rel_type, direction) in self.data.csr
+            ]
+        neighbours = self._neighbours[key] = [
+            (rel_type, direction, target)
+            for rel_type, direction, offsets, targets in csr
+            for target in targets[offsets[index]:offsets[index + 1]].tolist()
+        ]
+        return neighbours
+
+    def expand(self, start: int, relationship_filter: str, min_level: int, max_level: int, limit: int = None):
+        """
+        BFS với uniqueness NODE_GLOBAL như apoc.path.expandConfig: mỗi node chỉ được đi tới
+        một lần qua path ngắn nhất tìm thấy đầu tiên. Trả về (parents, thứ tự các node đích).
+        """
+        parents = {start: None}
+        reached = []
+        frontier = [start]
+        for level in range(1, max_level + 1):
+            next_frontier = []
+            for current in frontier:
+                for rel_type, _, neighbour in self.neighbours(current, relationship_filter):
+                    if neighbour in parents:
+                        continue
+                    parents[neighbour] = (current, rel_type)
+                    next_frontier.append(neighbour)
+                    if level >= min_level:
+                        reached.append(neighbour)
+                        if limit is not None and len(reached) >= limit:
+                            return parents, reached
+            frontier = next_frontier
+            if not frontier:
+                break
+        return parents, reached
+
+    def path(self, parents: Dict, end: int) -> Tuple[List[int], List[str]]:
+        nodes, rel_types = [end], []
+        while parents[nodes[-1]] is not None:
+            previous, rel_type = parents[nodes[-1]]
+            nodes.append(previous)
+            rel_types.append(rel_type)
+        nodes.reverse()
+        rel_types.reverse()
+        return nodes, rel_types
+
+    def visited_nodes(self, nodes: List[int], rel_types: List[str]) -> List[int]:
+        """filtered_nodes trừ exclude_nodes của _EXPAND_AND_FILTER."""
+        data = self.data
+        excluded = {
+            nodes[i + 1] for i, rel_type in enumerate(rel_types)
+            if rel_type == "BRANCH" and data.branch[nodes[i + 1]] == data.develop and data.branch[nodes[i]] == data.main
+        }
+        visited = []
+        for i, rel_type in enumerate(rel_types):
+            following = nodes[i + 1]
+            keep = (
+                (rel_type == "CALL" and data.has_method[following])
+                or rel_type in ("IMPLEMENT", "EXTEND", "BRANCH")
+                or (rel_type == "USE" and not data.has_method[following])
+            )
+            if keep and following not in excluded:
+                visited.append(following)
+        return visited
+
+    def traversals(self, endpoint: int, relationship_filter: str, min_level: int, max_level: int) -> List[GraphTraversal]:
+        parents, reached = self.expand(endpoint, relationship_filter, min_level, max_level)
+        traversals = []
+        for end in reached:
+            nodes, rel_types = self.path(parents, end)
+            graph_nodes = [self.node(index) for index in nodes]
+            traversals.append(GraphTraversal(
+                endpoint=graph_nodes[0],
+                paths=GraphPath(
+                    nodes=graph_nodes,
+                    relationships=[
+                        GraphRelationship(type=rel_type, start_node=graph_nodes[i], end_node=graph_nodes[i + 1], properties={})
+                        for i, rel_type in enumerate(rel_types)
+                    ],
+                ),
+                visited_nodes=[self.node(index) for index in self.visited_nodes(nodes, rel_types)],
+            ))
+        return traversals
+
+    def subgraph(self, endpoint: int, relationship_filter: str, max_level: int, node_limit: int):
+        """
+        Tương đương apoc.path.subgraphAll + bộ lọc cạnh của RELATED_SUBGRAPH_BY_AST_HASHES_QUERY.
+        Trả về (node, cạnh đã lọc) dưới dạng record để dùng chung _record_to_subgraph.
+        """
+        _, reached = self.expand(endpoint, relationship_filter, 1, max_level, limit=max(node_limit - 1, 0))
+        members = [endpoint, *reached]
+        member_set = set(members)
+        data = self.data
+        seen = set()
+        relationships = []
+        for index in members:
+            for rel_type, direction, other in self.neighbours(index, relationship_filter):
+                if other not in member_set:
+                    continue
+                start, end = (index, other) if direction == "out" else (other, index)
+                if (rel_type, start, end) in seen:
+                    continue
+                seen.add((rel_type, start, end))
+                if rel_type == "CALL" and not data.has_method[end]:
+                    continue
+                if rel_type == "USE" and data.has_method[end]:
+                    continue
+                if rel_type == "BRANCH" and data.branch[end] == data.main and data.branch[start] == data.develop:
+                    continue
+                relationships.append(GraphRelationship(
+                    type=rel_type, start_node=self.node(start), end_node=self.node(end), properties={}
+                ))
+        return {
+            "endpoint": self.node(endpoint),
+            "nodes": [self.node(index) for index in members],
+            "relationships": relationships,
+        }
+
+
+class GraphSnapshot:
+    """
+    Snapshot CSR của code property graph, mở bằng mmap nên các worker process dùng chung
+    page cache. Tự mở lại khi snapshot được export lại (kiểm tra tối đa mỗi `reload_interval` giây).
+    """
+
+    def __init__(self, path: str = None, reload_interval: float = None):
+        self.path = path or configs.GRAPH_SNAPSHOT_PATH
+        self.reload_interval = reload_interval if reload_interval is not None else configs.GRAPH_SNAPSHOT_RELOAD_SECONDS
+        self._lock = threading.Lock()
+        self._data = _SnapshotData(self.path)
+        self._checked_at = time.monotonic()
+
+    @property
+    def meta(self) -> Dict:
+        return self._data.meta
+
+    def query(self) -> SnapshotQuery:
+        self.maybe_reload()
+        return SnapshotQuery(self._data)
+
+    def maybe_reload(self) -> bool:
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return False
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(os.path.join(self.path, _META)).st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if mtime == self._data.mtime:
+                return False
+            # Không đóng bản cũ: query đang chạy vẫn có thể đọc nó, GC sẽ unmap
+            self._data = _SnapshotData(self.path)
+        print(f"Graph snapshot reloaded: {self.meta['node_count']} nodes (version {self.meta['graph_version']})")
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._data is not None:
+                self._data.close()
+                self._data = None
+
+
+# Export từ Neo4j: node theo thứ tự label của CPG_LABELS, sau đó là quan hệ
+EXPORT_NODES_QUERY = """
+MATCH (n:__LABEL__)
+RETURN elementId(n) AS element_id, id(n) AS id, labels(n) AS labels, properties(n) AS properties
+"""
+
+EXPORT_RELATIONSHIPS_QUERY = """
+MATCH (a)-[r:CALL|USE|IMPLEMENT|EXTEND|BRANCH]->(b)
+RETURN type(r) AS type, elementId(a) AS start, elementId(b) AS end
+"""
+
+
+def _stream(driver, query: str, params: Dict = None) -> Iterable:
+    with driver.session(fetch_size=configs.INGEST_FETCH_SIZE) as session:
+        yield from session.run(query, params or {})
+
+
+def export_snapshot(driver, path: str = None, graph_version: Optional[int] = None) -> Dict:
+    """Đọc toàn bộ node CPG và quan hệ từ Neo4j rồi ghi thành GraphSnapshot tại `path`."""
+    from src_bot.neo4jdb.neo4j_service import CPG_LABELS
+
+    writer = GraphSnapshotWriter(path or configs.GRAPH_SNAPSHOT_PATH)
+    try:
+        for label in CPG_LABELS:
+            for record in _stream(driver, EXPORT_NODES_QUERY.replace("__LABEL__", label)):
+                writer.add_node(record["element_id"], record["id"], record["labels"], record["properties"])
+            print(f"  {label}: {writer.node_count} nodes total")
+        for record in _stream(driver, EXPORT_RELATIONSHIPS_QUERY):
+            writer.add_relationship(record["type"], record["start"], record["end"])
+    except BaseException:
+        writer.abort()
+        raise
+    meta = writer.finish(graph_version=graph_version)
+    if writer.skipped_relationships:
+        print(f"  skipped {writer.skipped_relationships} relationships to nodes outside the CPG labels")
+    return meta
@@ -0,0 +1,128 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass(slots=True, eq=False)
+class GraphNode:
+    """
+    Node Neo4j đã decode, dùng nội bộ trong retrieval thay cho Neo4jNodeDto.
+    Property chỉ được lưu một lần; pydantic DTO chỉ được tạo ở API boundary.
+    """
+    element_id: str
+    id: Optional[int]
+    labels: Tuple[str, ...]
+    properties: Dict[str, Any]
+
+    def get(self, key: str, default=None):
+        return self.properties.get(key, default)
+
+    @property
+    def project_id(self): return self.properties.get("project_id")
+
+    @property
+    def branch(self): return self.properties.get("branch")
+
+    @property
+    def class_name(self): return self.properties.get("class_name")
+
+    @property
+    def method_name(self): return self.properties.get("method_name")
+
+    @property
+    def file_path(self): return self.properties.get("file_path")
+
+    @property
+    def content(self): return self.properties.get("content")
+
+    @property
+    def ast_hash(self): return self.properties.get("ast_hash")
+
+    @property
+    def endpoint(self): return self.properties.get("endpoint")
+
+    @property
+    def name(self): return self.properties.get("name")
+
+
+@dataclass(slots=True, eq=False)
+class GraphRelationship:
+    type: str
+    start_node: GraphNode        # theo thứ tự duyệt của path, không phải chiều của cạnh
+    end_node: GraphNode
+    properties: Dict[str, Any]
+
+
+@dataclass(slots=True, eq=False)
+class GraphPath:
+    nodes: List[GraphNode]
+    relationships: List[GraphRelationship]
+
+    @property
+    def start_node(self) -> Optional[GraphNode]:
+        return self.nodes[0] if self.nodes else None
+
+    @property
+    def end_node(self) -> Optional[GraphNode]:
+        return self.nodes[-1] if self.nodes else None
+
+    @property
+    def total_length(self) -> int:
+        return len(self.relationships)
+
+
+@dataclass(slots=True, eq=False)
+class GraphTraversal:
+    endpoint: GraphNode
+    paths: Optional[GraphPath]
+    visited_nodes: List[GraphNode]
+
+
+@dataclass(slots=True, eq=False)
+class GraphEdge:
+    type: str
+    from_id: str                 # element_id của node gần endpoint hơn
+    to_id: str
+    depth: int
+
+
+@dataclass(slots=True, eq=False)
+class GraphSubgraph:
+    endpoint: GraphNode
+    nodes: Dict[str, GraphNode]  # key: element_id
+    edges: List[GraphEdge]
+    truncated: bool = False
+
+
+@dataclass(slots=True)
+class NodeIdentityMap:
+    """Identity map theo element_id: mỗi node chỉ được decode một lần trong một query."""
+    nodes: Dict[str, GraphNode] = field(default_factory=dict)
+
+    def node(self, node) -> Optional[GraphNode]:
+        if node is None:
+            return None
+        decoded = self.nodes.get(node.element_id)
+        if decoded is None:
+            decoded = GraphNode(
+                element_id=node.element_id,
+                id=node.id,
+                labels=tuple(node.labels),
+                properties=dict(node),
+            )
+            self.nodes[node.element_id] = decoded
+        return decoded
+
+    def path(self, path) -> Optional[GraphPath]:
+        if path is None:
+            return None
+        nodes = [self.node(node) for node in path.nodes]
+        relationships = [
+            GraphRelationship(
+                type=rel.type,
+                start_node=nodes[i],
+                end_node=nodes[i + 1],
+                properties=dict(rel),
+            )
+            for i, rel in enumerate(path.relationships)
+        ]
+        return GraphPath(nodes=nodes, relationships=relationships)
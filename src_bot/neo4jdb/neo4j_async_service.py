@@ -0,0 +1,118 @@
+from typing import Dict, List, Optional
+from src_bot.config.config import configs
+from src_bot import metrics
+from src_bot.neo4jdb.neo4j_db import AsyncNeo4jDB
+from src_bot.neo4jdb.graph_types import GraphSubgraph, GraphTraversal, NodeIdentityMap
+from src_bot.neo4jdb.neo4j_service import (
+    GRAPH_VERSION_NAME,
+    GRAPH_VERSION_QUERY,
+    RELATED_NODES_BY_AST_HASHES_QUERY,
+    RELATED_SUBGRAPH_BY_AST_HASHES_QUERY,
+    _cache_fetched_traversals,
+    _observe_subgraph_results,
+    _observe_traversal_results,
+    _record_to_subgraph,
+    _record_to_traversal,
+    _split_cached_traversals,
+)
+from src_bot.neo4jdb.traversal_cache import TraversalCache
+
+
+class AsyncNeo4jService:
+    """
+    Phiên bản async (AsyncGraphDatabase) của các truy vấn dùng trong retrieval.
+    Dùng chung câu Cypher và traversal cache với Neo4jService.
+    """
+
+    def __init__(self, db: AsyncNeo4jDB, traversal_cache: TraversalCache):
+        self.db = db
+        self.traversal_cache = traversal_cache
+
+    async def close(self):
+        await self.db.close()
+
+    async def get_graph_version(self) -> Optional[int]:
+        with metrics.track_call("neo4j", "graph_version"):
+            async with self.db.driver.session() as session:
+                result = await session.run(GRAPH_VERSION_QUERY, {"name": GRAPH_VERSION_NAME})
+                record = await result.single()
+        return record["version"] if record else None
+
+    async def get_related_nodes_by_ast_hashes(
+            self,
+            ast_hashes: List[str],
+            max_level: int = 20,
+            min_level: int = 1,
+            relationship_filter: str = "CALL>|<IMPLEMENT|<EXTEND|USE>|<BRANCH"
+    ) -> Dict[str, List[GraphTraversal]]:
+        if not ast_hashes:
+            return {}
+
+        cache_args = (relationship_filter, min_level, max_level)
+        await self.traversal_cache.aensure_version(self.get_graph_version)
+        results, misses = _split_cached_traversals(self.traversal_cache, ast_hashes, cache_args)
+        if not misses:
+            return results
+
+        params = {
+            'ast_hashes': misses,
+            'relationship_filter': relationship_filter,
+            'min_level': min_level,
+            'max_level': max_level
+        }
+
+        async def work(tx):
+            fetched: Dict[str, List[GraphTraversal]] = {}
+            identity_map = NodeIdentityMap()
+            result = await tx.run(RELATED_NODES_BY_AST_HASHES_QUERY, params)
+            async for record in result:
+                fetched.setdefault(record['ast_hash'], []).append(_record_to_traversal(record, identity_map))
+            return fetched
+
+        with metrics.track_call("neo4j", "related_nodes_by_ast_hashes"):
+            async with self.db.driver.session() as session:
+                fetched = await session.execute_read(work)
+        _observe_traversal_results(fetched)
+
+        return _cache_fetched_traversals(self.traversal_cache, misses, fetched, cache_args, results)
+
+    async def get_related_subgraphs_by_ast_hashes(
+            self,
+            ast_hashes: List[str],
+            max_level: int = 20,
+            relationship_filter: str = "CALL>|<IMPLEMENT|<EXTEND|USE>|<BRANCH",
+            node_limit: int = None
+    ) -> Dict[str, List[GraphSubgraph]]:
+        if not ast_hashes:
+            return {}
+
+        node_limit = node_limit or configs.TRAVERSAL_NODE_LIMIT
+        cache_args = ("subgraph", relationship_filter, max_level, node_limit)
+        await self.traversal_cache.aensure_version(self.get_graph_version)
+        results, misses = _split_cached_traversals(self.traversal_cache, ast_hashes, cache_args)
+        if not misses:
+            return results
+
+        params = {
+            'ast_hashes': misses,
+            'relationship_filter': relationship_filter,
+            'max_level': max_level,
+            'node_limit': node_limit
+        }
+
+        async def work(tx):
+            fetched: Dict[str, List[GraphSubgraph]] = {}
+            identity_map = NodeIdentityMap()
+            result = await tx.run(RELATED_SUBGRAPH_BY_AST_HASHES_QUERY, params)
+            async for record in result:
+                fetched.setdefault(record['ast_hash'], []).append(
+                    _record_to_subgraph(record, node_limit, identity_map)
+                )
+            return fetched
+
+        with metrics.track_call("neo4j", "related_subgraphs_by_ast_hashes"):
+            async with self.db.driver.session() as session:
+                fetched = await session.execute_read(work)
+        _observe_subgraph_results(fetched)
+
+        return _cache_fetched_traversals(self.traversal_cache, misses, fetched, cache_args, results)
@@ -1,4 +1,4 @@
-from neo4j import GraphDatabase
+from neo4j import AsyncGraphDatabase, GraphDatabase
 from src_bot.config.config import configs
 
 
@@ -38,3 +38,29 @@ class Neo4jDB:
         self.driver.close()
 
 
+class AsyncNeo4jDB:
+    def __init__(
+        self,
+        url: str = None,
+        user: str = None,
+        password: str = None,
+        max_connection_lifetime: int = None,
+        max_connection_pool_size: int = None,
+        connection_timeout: int = None
+    ):
+        """
+        Async counterpart of Neo4jDB, backed by AsyncGraphDatabase.
+
+        Must be created and used from the event loop that runs the queries.
+        """
+        self.driver = AsyncGraphDatabase.driver(
+            url or configs.APP_NEO4J_URL,
+            auth=(user or configs.APP_NEO4J_USER, password or configs.APP_NEO4J_PASSWORD),
+            max_connection_lifetime=max_connection_lifetime or configs.NEO4J_MAX_CONNECTION_LIFETIME,
+            max_connection_pool_size=max_connection_pool_size or configs.NEO4J_MAX_CONNECTION_POOL_SIZE,
+            connection_timeout=connection_timeout or configs.NEO4J_CONNECTION_TIMEOUT
+        )
+        print('Setup async Neo4j DB with URL:', configs.APP_NEO4J_URL)
+
+    async def close(self):
+        await self.driver.close()
@@ -3,6 +3,7 @@ from typing import List, Optional, Dict, Any
 
 class Neo4jNodeDto(BaseModel):
     id: Optional[int] = None
+    element_id: Optional[str] = None
     labels: List[str] = []
     properties: Dict[str, Any] = {}
 
@@ -52,4 +53,18 @@ class Neo4jPathDto(BaseModel):
 class Neo4jTraversalResultDto(BaseModel):
     endpoint: Neo4jNodeDto
     paths: Neo4jPathDto | Any
-    visited_nodes: List[Neo4jNodeDto]
\ No newline at end of file
+    visited_nodes: List[Neo4jNodeDto]
+
+
+class Neo4jSubgraphEdgeDto(BaseModel):
+    type: str
+    from_id: str                 # element_id của node gần endpoint hơn
+    to_id: str
+    depth: int
+
+
+class Neo4jSubgraphDto(BaseModel):
+    endpoint: Neo4jNodeDto
+    nodes: Dict[str, Neo4jNodeDto]    # key: element_id
+    edges: List[Neo4jSubgraphEdgeDto]
+    truncated: bool = False
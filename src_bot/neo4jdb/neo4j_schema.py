@@ -0,0 +1,89 @@
+from typing import Dict, List
+from src_bot.neo4jdb.neo4j_service import (
+    CPG_LABELS,
+    GRAPH_VERSION_NAME,
+    GRAPH_VERSION_QUERY,
+    NODE_BY_AST_HASH_QUERY,
+    NODES_BY_AST_HASHES_QUERY,
+    RELATED_NODES_BY_AST_HASHES_QUERY,
+    RELATED_NODES_QUERY,
+    RELATED_SUBGRAPH_BY_AST_HASHES_QUERY,
+)
+
+# Operator trong query plan cho thấy lookup không dùng được index
+FORBIDDEN_OPERATORS = ("AllNodesScan", "NodeByLabelScan")
+
+
+def schema_statements() -> List[str]:
+    statements = [
+        "CREATE CONSTRAINT graph_version_name IF NOT EXISTS "
+        "FOR (v:GraphVersion) REQUIRE v.name IS UNIQUE",
+    ]
+    for label in CPG_LABELS:
+        prefix = label.lower()
+        # ast_hash không unique: cùng một đoạn code có thể xuất hiện ở nhiều branch
+        statements.append(
+            f"CREATE RANGE INDEX {prefix}_ast_hash IF NOT EXISTS FOR (n:{label}) ON (n.ast_hash)"
+        )
+        # Lookup endpoint theo (project, class, branch) rồi lọc method_name
+        statements.append(
+            f"CREATE RANGE INDEX {prefix}_scope IF NOT EXISTS "
+            f"FOR (n:{label}) ON (n.project_id, n.class_name, n.branch)"
+        )
+    return statements
+
+
+def create_schema(driver, wait_seconds: int = 300):
+    """Tạo index/constraint cho các label của CPG (idempotent) và chờ index ONLINE."""
+    with driver.session() as session:
+        for statement in schema_statements():
+            session.run(statement).consume()
+            print(f"  -> {statement}")
+        session.run("CALL db.awaitIndexes($seconds)", {"seconds": wait_seconds}).consume()
+
+
+def _checked_queries() -> Dict[str, tuple]:
+    target = {
+        "project_id": "p", "class_name": "C", "branch": "main",
+        "method_name": "m", "ast_hash": "h",
+    }
+    traversal = {"relationship_filter": "CALL>", "min_level": 1, "max_level": 1}
+    return {
+        "get_graph_version": (GRAPH_VERSION_QUERY, {"name": GRAPH_VERSION_NAME}),
+        "get_node_by_ast_hash": (NODE_BY_AST_HASH_QUERY, {"ast_hash": "h"}),
+        "get_nodes_by_ast_hashes": (NODES_BY_AST_HASHES_QUERY, {"ast_hashes": ["h"]}),
+        "get_related_nodes": (RELATED_NODES_QUERY, {"targets": [target], **traversal}),
+        "get_related_nodes_by_ast_hashes": (
+            RELATED_NODES_BY_AST_HASHES_QUERY, {"ast_hashes": ["h"], **traversal}
+        ),
+        "get_related_subgraphs_by_ast_hashes": (
+            RELATED_SUBGRAPH_BY_AST_HASHES_QUERY,
+            {"ast_hashes": ["h"], "relationship_filter": "CALL>", "max_level": 1, "node_limit": 1},
+        ),
+    }
+
+
+def find_forbidden_operators(plan: dict) -> List[str]:
+    """Duyệt plan (dict của ResultSummary.plan) và trả về các operator bị cấm."""
+    found = []
+    operator = plan.get("operatorType", "").split("@")[0]
+    if operator in FORBIDDEN_OPERATORS:
+        found.append(operator)
+    for child in plan.get("children", []):
+        found.extend(find_forbidden_operators(child))
+    return found
+
+
+def check_query_plans(driver) -> Dict[str, List[str]]:
+    """
+    EXPLAIN các query của Neo4jService; trả về {tên query: [operator bị cấm]}.
+    Dict rỗng nghĩa là mọi lookup đều đi qua index.
+    """
+    failures = {}
+    with driver.session() as session:
+        for name, (query, params) in _checked_queries().items():
+            plan = session.run("EXPLAIN " + query, params).consume().plan
+            operators = find_forbidden_operators(plan or {})
+            if operators:
+                failures[name] = operators
+    return failures
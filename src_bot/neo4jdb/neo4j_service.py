@@ -1,19 +1,26 @@
 from src_bot.neo4jdb.neo4j_db import Neo4jDB
-from src_bot.neo4jdb.neo4j_dto import Neo4jNodeDto,Neo4jTraversalResultDto,Neo4jPathDto,Neo4jRelationshipDto
-from typing import List,Optional
+from src_bot.neo4jdb.traversal_cache import TraversalCache
+from src_bot.config.config import configs
+from src_bot import metrics
+from src_bot.neo4jdb.neo4j_dto import Neo4jNodeDto,Neo4jTraversalResultDto,Neo4jPathDto,Neo4jSubgraphDto,Neo4jSubgraphEdgeDto
+from src_bot.neo4jdb.graph_types import GraphEdge,GraphNode,GraphPath,GraphSubgraph,GraphTraversal,NodeIdentityMap
+from collections import deque
+from typing import Dict,List,Optional
 
-def _node_to_dto(node) -> Neo4jNodeDto:
+# Các hàm *_to_dto chỉ dùng ở API boundary; retrieval làm việc trực tiếp với graph_types.
+def _node_to_dto(node: GraphNode) -> Neo4jNodeDto:
     if not node:
         return None
 
-    node_dict = dict(node)
+    node_dict = node.properties
     return Neo4jNodeDto(
         id=node.id,
+        element_id=node.element_id,
         labels=list(node.labels),
         properties=node_dict,
         **node_dict
     )
-def _path_to_dto(path) -> Optional[Neo4jPathDto]:
+def _path_to_dto(path: GraphPath) -> Optional[Neo4jPathDto]:
     if not path:
         return None
 
@@ -38,6 +45,24 @@ def _path_to_dto(path) -> Optional[Neo4jPathDto]:
         path_summary=path_summary
     )
 
+def traversal_to_dto(traversal: GraphTraversal) -> Neo4jTraversalResultDto:
+    return Neo4jTraversalResultDto(
+        endpoint=_node_to_dto(traversal.endpoint),
+        paths=_path_to_dto(traversal.paths),
+        visited_nodes=[_node_to_dto(node) for node in traversal.visited_nodes]
+    )
+
+def subgraph_to_dto(subgraph: GraphSubgraph) -> Neo4jSubgraphDto:
+    return Neo4jSubgraphDto(
+        endpoint=_node_to_dto(subgraph.endpoint),
+        nodes={element_id: _node_to_dto(node) for element_id, node in subgraph.nodes.items()},
+        edges=[
+            Neo4jSubgraphEdgeDto(type=edge.type, from_id=edge.from_id, to_id=edge.to_id, depth=edge.depth)
+            for edge in subgraph.edges
+        ],
+        truncated=subgraph.truncated,
+    )
+
 def _get_relationship_nodes(nodes, index):
     start_node = nodes[index] if index < len(nodes) else None
     end_node = nodes[index + 1] if index + 1 < len(nodes) else None
@@ -49,7 +74,7 @@ def _create_relationship_data(rel, start_node, end_node):
         "type": rel.type,
         "start_node": start_node,
         "end_node": end_node,
-        "properties": dict(rel)
+        "properties": rel.properties
     }
 
 
@@ -69,16 +94,327 @@ def _create_node_summary(node):
         "node_type": node.labels[0] if node and node.labels else None
     }
 
-class Neo4jService:
+def _node_display_name(node) -> str:
+    if node.endpoint:
+        return node.endpoint
+    name = ".".join(part for part in (node.class_name, node.method_name) if part)
+    return name or getattr(node, "name", None) or node.file_path or "?"
+
+
+_EXPAND_AND_FILTER = """
+    CALL apoc.path.expandConfig(endpoint, {
+      relationshipFilter: $relationship_filter,
+      minLevel: $min_level,
+      maxLevel: $max_level,
+      bfs: true,
+      uniqueness: "NODE_GLOBAL",
+      filterStartNode: false
+    }) YIELD path
+    WITH __CARRY__, path,
+         nodes(path) AS node_list,
+         relationships(path) AS rel_list
+    WITH __CARRY__, path, node_list, rel_list, 
+        [i IN range(0, size(rel_list) - 1) |
+        CASE 
+            WHEN type(rel_list[i]) = 'BRANCH'
+                AND node_list[i + 1].branch = 'develop'
+                AND node_list[i].branch = 'main'
+            THEN node_list[i+1]
+            ELSE null
+        END
+        ] AS exclude_nodes
+    WITH __CARRY__, path, node_list, rel_list, exclude_nodes,
+         [i IN range(0, size(rel_list)-1) |
+            CASE
+              WHEN type(rel_list[i]) = 'CALL'
+                   AND node_list[i+1].method_name IS NOT NULL
+              THEN node_list[i+1]
+
+              WHEN type(rel_list[i]) IN ['IMPLEMENT', 'EXTEND', 'BRANCH']
+              THEN node_list[i+1]
+
+              WHEN type(rel_list[i]) = 'USE'
+                   AND node_list[i+1].method_name IS NULL
+              THEN node_list[i+1]
+              ELSE null
+            END
+         ] AS filtered_nodes
+"""
+
+
+def _expand_and_filter(carry: str = "endpoint") -> str:
+    """Đoạn Cypher mở rộng path từ `endpoint`, giữ lại các biến `carry` qua các mệnh đề WITH."""
+    return _EXPAND_AND_FILTER.replace("__CARRY__", carry)
+
+# Label của các node trong code property graph. Index chỉ tồn tại theo label
+# (xem neo4j_schema.py), nên mọi lookup được tách thành một MATCH cho từng label.
+CPG_LABELS = ("MethodNode", "EndpointNode", "ConfigurationNode", "ClassNode")
+
+
+def _match_cpg_node(variable: str, predicate: str, imports: str) -> str:
+    """CALL { ... UNION ... } tìm `variable` trên từng label để planner dùng index seek."""
+    branches = [
+        f"  WITH {imports}\n  MATCH ({variable}:{label}) WHERE {predicate}\n  RETURN {variable}"
+        for label in CPG_LABELS
+    ]
+    return "CALL {\n" + "\n  UNION\n".join(branches) + "\n}\n"
+
+
+_MATCH_BY_AST_HASH = _match_cpg_node("t", "t.ast_hash = ast_hash", "ast_hash")
+
+# Tìm node tương ứng với `t` (cùng project/class/branch/method) bằng các phép so sánh bằng
+_MATCH_ENDPOINT = _match_cpg_node(
+    "endpoint",
+    """endpoint.project_id = t.project_id
+    AND endpoint.class_name = t.class_name
+    AND endpoint.branch = t.branch
+    AND (
+      (t.method_name IS NULL AND endpoint.method_name IS NULL)
+      OR (t.method_name = endpoint.method_name)
+    )""",
+    "t",
+)
+
+GRAPH_VERSION_NAME = "cpg"
+
+GRAPH_VERSION_QUERY = """
+MATCH (v:GraphVersion {name: $name}) RETURN v.version AS version
+"""
+
+NODE_BY_AST_HASH_QUERY = """
+WITH $ast_hash AS ast_hash
+""" + _MATCH_BY_AST_HASH + """
+RETURN t AS n
+LIMIT 1
+"""
+
+NODES_BY_AST_HASHES_QUERY = """
+UNWIND $ast_hashes AS ast_hash
+""" + _MATCH_BY_AST_HASH + """
+WITH ast_hash, collect(t)[0] AS n
+RETURN ast_hash, n
+"""
+
+RELATED_NODES_QUERY = """
+UNWIND $targets AS t
+""" + _MATCH_ENDPOINT + """
+WITH DISTINCT endpoint
+""" + _expand_and_filter() + """
+RETURN endpoint, path,
+       [node IN filtered_nodes WHERE node IS NOT NULL AND NOT node IN exclude_nodes] AS visited_nodes
+ORDER BY path
+"""
+
+RELATED_NODES_BY_AST_HASHES_QUERY = """
+UNWIND $ast_hashes AS ast_hash
+""" + _MATCH_BY_AST_HASH + """
+WITH ast_hash, collect(t)[0] AS t
+""" + _MATCH_ENDPOINT + _expand_and_filter("ast_hash, endpoint") + """
+RETURN ast_hash, endpoint, path,
+       [node IN filtered_nodes WHERE node IS NOT NULL AND NOT node IN exclude_nodes] AS visited_nodes
+ORDER BY ast_hash, path
+"""
+
+# Chế độ subgraph: mỗi endpoint chỉ trả về một lần tập node và cạnh (không lặp lại theo path).
+# Lọc theo cạnh tương đương filtered_nodes / exclude_nodes của chế độ path:
+#   - CALL chỉ tới node có method_name, USE chỉ tới node không có method_name
+#   - bỏ cạnh BRANCH đi từ nhánh main sang develop (cạnh được duyệt ngược chiều: <BRANCH)
+# `limit` giới hạn số path của BFS, với uniqueness NODE_GLOBAL chính là số node.
+RELATED_SUBGRAPH_BY_AST_HASHES_QUERY = """
+UNWIND $ast_hashes AS ast_hash
+""" + _MATCH_BY_AST_HASH + """
+WITH ast_hash, collect(t)[0] AS t
+""" + _MATCH_ENDPOINT + """
+CALL apoc.path.subgraphAll(endpoint, {
+  relationshipFilter: $relationship_filter,
+  maxLevel: $max_level,
+  limit: $node_limit,
+  bfs: true
+}) YIELD nodes, relationships
+RETURN ast_hash, endpoint, nodes,
+       [r IN relationships WHERE
+          (type(r) <> 'CALL' OR endNode(r).method_name IS NOT NULL)
+          AND (type(r) <> 'USE' OR endNode(r).method_name IS NULL)
+          AND NOT (type(r) = 'BRANCH' AND endNode(r).branch = 'main' AND startNode(r).branch = 'develop')
+       ] AS relationships
+ORDER BY ast_hash
+"""
+
+
+def _record_to_traversal(record, identity_map: NodeIdentityMap) -> GraphTraversal:
+    return GraphTraversal(
+        endpoint=identity_map.node(record['endpoint']),
+        paths=identity_map.path(record['path']),
+        visited_nodes=[identity_map.node(node) for node in record['visited_nodes']]
+    )
+
+
+def _record_to_subgraph(record, node_limit: int, identity_map: NodeIdentityMap) -> GraphSubgraph:
+    """
+    Dựng subgraph từ một record: tính khoảng cách BFS từ endpoint theo các cạnh đã lọc,
+    bỏ node không còn tới được và định hướng cạnh từ node gần endpoint tới node xa hơn.
+    """
+    nodes = {node.element_id: node for node in record['nodes']}
+    endpoint = record['endpoint']
+    adjacency: Dict[str, List[str]] = {}
+    edges = []
+    for rel in record['relationships']:
+        start_id, end_id = rel.start_node.element_id, rel.end_node.element_id
+        if start_id in nodes and end_id in nodes:
+            adjacency.setdefault(start_id, []).append(end_id)
+            adjacency.setdefault(end_id, []).append(start_id)
+            edges.append((rel.type, start_id, end_id))
+
+    depths = {endpoint.element_id: 0}
+    queue = deque([endpoint.element_id])
+    while queue:
+        current = queue.popleft()
+        for neighbour in adjacency.get(current, []):
+            if neighbour not in depths:
+                depths[neighbour] = depths[current] + 1
+                queue.append(neighbour)
+
+    graph_edges = []
+    for rel_type, start_id, end_id in edges:
+        if start_id not in depths or end_id not in depths:
+            continue
+        from_id, to_id = (start_id, end_id) if depths[start_id] <= depths[end_id] else (end_id, start_id)
+        graph_edges.append(GraphEdge(type=rel_type, from_id=from_id, to_id=to_id, depth=depths[from_id] + 1))
+    graph_edges.sort(key=lambda edge: edge.depth)
+
+    return GraphSubgraph(
+        endpoint=identity_map.node(endpoint),
+        nodes={element_id: identity_map.node(nodes[element_id]) for element_id in depths if element_id in nodes},
+        edges=graph_edges,
+        truncated=len(nodes) >= node_limit,
+    )
+
+
+def _split_cached_traversals(cache: TraversalCache, ast_hashes: List[str], cache_args: tuple):
+    """Tách ast_hash thành (kết quả đã có trong cache, danh sách cần query)."""
+    results: Dict[str, list] = {}
+    misses = []
+    for ast_hash in dict.fromkeys(ast_hashes):
+        cached = cache.get((ast_hash, *cache_args))
+        if cached is None:
+            misses.append(ast_hash)
+        elif cached:
+            results[ast_hash] = cached
+    return results, misses
+
+
+def _cache_fetched_traversals(cache: TraversalCache, misses, fetched, cache_args: tuple, results):
+    # Kết quả rỗng cũng được cache để không traverse lại node không có path
+    for ast_hash in misses:
+        traversals = fetched.get(ast_hash, [])
+        cache.put((ast_hash, *cache_args), traversals)
+        if traversals:
+            results[ast_hash] = traversals
+    return results
+
+
+def _observe_traversal_results(fetched: Dict[str, List[GraphTraversal]]):
+    metrics.TRAVERSAL_RESULTS.labels("paths").observe(sum(len(traversals) for traversals in fetched.values()))
+
+
+def _observe_subgraph_results(fetched: Dict[str, List[GraphSubgraph]]):
+    metrics.TRAVERSAL_RESULTS.labels("subgraph_edges").observe(
+        sum(len(subgraph.edges) for subgraphs in fetched.values() for subgraph in subgraphs)
+    )
+
+
+class GraphService:
+    """
+    Phần chung của các backend graph cho retrieval (Neo4jService, GraphSnapshotService):
+    traversal cache và extract_relationships. Mỗi backend cung cấp get_graph_version,
+    get_node_by_ast_hash, get_nodes_by_ast_hashes, get_related_nodes,
+    get_related_nodes_by_ast_hashes, get_related_subgraphs_by_ast_hashes và close.
+    """
+
+    def __init__(self):
+        self.traversal_cache = TraversalCache(
+            max_entries=configs.TRAVERSAL_CACHE_SIZE,
+            version_check_interval=configs.GRAPH_VERSION_CHECK_SECONDS,
+        )
+
+    def extract_relationships(
+        self,
+        traversal_results: List[GraphTraversal | GraphSubgraph]
+    ):
+        results = []
+        seen_relationships = set()
+
+        def node_key(node: GraphNode):
+            return (
+                node.element_id
+                or node.id
+                or node.ast_hash
+                or (node.class_name, node.method_name, node.file_path)
+            )
+
+        def add(rel_type: str, depth: int, start_node: GraphNode, end_node: GraphNode):
+            rk = (rel_type, node_key(start_node), node_key(end_node))
+            if rk in seen_relationships:
+                return
+            seen_relationships.add(rk)
+            results.append({
+                "type": "relationship",
+                "relationship_type": rel_type,
+                "depth": depth,
+                "from_key": rk[1],
+                "to_key": rk[2],
+                "from_name": _node_display_name(start_node),
+                "to_name": _node_display_name(end_node),
+                "from_labels": start_node.labels,
+                "to_labels": end_node.labels,
+                "from_content": start_node.content,
+                "to_content": end_node.content,
+            })
+
+        for traversal in traversal_results:
+            # GraphSubgraph (hoặc Neo4jSubgraphDto) có `edges`, GraphTraversal có `paths`
+            if hasattr(traversal, "edges"):
+                for edge in traversal.edges:
+                    add(edge.type, edge.depth, traversal.nodes[edge.from_id], traversal.nodes[edge.to_id])
+                continue
+
+            path = traversal.paths
+            if path and hasattr(path, "relationships"):
+                for depth, rel in enumerate(path.relationships, start=1):
+                    add(rel.type, depth, rel.start_node, rel.end_node)
+
+        return results
+
+
+class Neo4jService(GraphService):
     def __init__(self, db: Neo4jDB | None = None):
         self.db = db or Neo4jDB()
-    def get_node_by_ast_hash(self, ast_hash: str) -> Optional[Neo4jNodeDto]:
+        super().__init__()
+
+    def close(self):
+        self.db.close()
+
+    def get_graph_version(self) -> Optional[int]:
+        with metrics.track_call("neo4j", "graph_version"), self.db.driver.session() as session:
+            record = session.run(GRAPH_VERSION_QUERY, {"name": GRAPH_VERSION_NAME}).single()
+            return record["version"] if record else None
+
+    def bump_graph_version(self) -> int:
+        """Gọi sau mỗi lần ingest graph để vô hiệu hoá traversal cache ở mọi process."""
         query = """
-        MATCH (n) WHERE n.ast_hash = $ast_hash RETURN n
+        MERGE (v:GraphVersion {name: $name})
+        SET v.version = coalesce(v.version, 0) + 1, v.updated_at = datetime()
+        RETURN v.version AS version
         """
-        with self.db.driver.session() as session:
-            result = session.run(query, {"ast_hash": ast_hash}).single()
-            return _node_to_dto(result["n"]) if result else None
+        with metrics.track_call("neo4j", "bump_graph_version"), self.db.driver.session() as session:
+            version = session.run(query, {"name": GRAPH_VERSION_NAME}).single()["version"]
+        self.traversal_cache.clear()
+        return version
+
+    def get_node_by_ast_hash(self, ast_hash: str) -> Optional[Neo4jNodeDto]:
+        with metrics.track_call("neo4j", "node_by_ast_hash"), self.db.driver.session() as session:
+            result = session.run(NODE_BY_AST_HASH_QUERY, {"ast_hash": ast_hash}).single()
+            return _node_to_dto(NodeIdentityMap().node(result["n"])) if result else None
         
     def get_related_nodes(
             self,
@@ -87,60 +423,6 @@ class Neo4jService:
             min_level: int = 1,
             relationship_filter: str = "CALL>|<IMPLEMENT|<EXTEND|USE>|<BRANCH"
     ) -> List[Neo4jTraversalResultDto]:
-        query = """
-        WITH $targets AS targets
-        MATCH (endpoint)
-        WHERE endpoint.project_id = $targets[0].project_id
-        AND any(t IN targets WHERE
-          t.class_name = endpoint.class_name AND
-          t.branch = endpoint.branch AND
-          (
-            (t.method_name IS NULL AND endpoint.method_name IS NULL)
-            OR (t.method_name = endpoint.method_name)
-          )
-        )
-        CALL apoc.path.expandConfig(endpoint, {
-          relationshipFilter: "CALL>|<IMPLEMENT|<EXTEND|USE>|<BRANCH",
-          minLevel: $min_level,
-          maxLevel: $max_level,
-          bfs: true,
-          uniqueness: "NODE_GLOBAL",
-          filterStartNode: false
-        }) YIELD path
-        WITH endpoint, path,
-             nodes(path) AS node_list,
-             relationships(path) AS rel_list
-        WITH endpoint, path, node_list, rel_list, 
-            [i IN range(0, size(rel_list) - 1) |
-            CASE 
-                WHEN type(rel_list[i]) = 'BRANCH'
-                    AND node_list[i + 1].branch = 'develop'
-                    AND node_list[i].branch = 'main'
-                THEN node_list[i+1]
-                ELSE null
-            END
-            ] AS exclude_nodes
-        WITH endpoint, path, node_list, rel_list, exclude_nodes,
-             [i IN range(0, size(rel_list)-1) |
-                CASE
-                  WHEN type(rel_list[i]) = 'CALL'
-                       AND node_list[i+1].method_name IS NOT NULL
-                  THEN node_list[i+1]
-
-                  WHEN type(rel_list[i]) IN ['IMPLEMENT', 'EXTEND', 'BRANCH']
-                  THEN node_list[i+1]
-
-                  WHEN type(rel_list[i]) = 'USE'
-                       AND node_list[i+1].method_name IS NULL
-                  THEN node_list[i+1]
-                  ELSE null
-                END
-             ] AS filtered_nodes
-        RETURN endpoint, path,
-               [node IN filtered_nodes WHERE node IS NOT NULL AND NOT node IN exclude_nodes] AS visited_nodes
-        ORDER BY path
-        """
-
         params = {
             'targets': [node.model_dump() for node in target_nodes],
             'relationship_filter': relationship_filter,
@@ -148,53 +430,120 @@ class Neo4jService:
             'max_level': max_level
         }
 
-        with self.db.driver.session() as session:
-            result = session.run(query, params)
-            return [
-                Neo4jTraversalResultDto(
-                    endpoint=_node_to_dto(record['endpoint']),
-                    paths=_path_to_dto(record['path']),
-                    visited_nodes=[_node_to_dto(node) for node in record['visited_nodes']]
-                )
-                for record in result
-            ]
+        target_hashes = tuple(node.ast_hash for node in target_nodes)
+        cache_key = None
+        if target_hashes and all(target_hashes):
+            self.traversal_cache.ensure_version(self.get_graph_version)
+            cache_key = (target_hashes, relationship_filter, min_level, max_level)
+            cached = self.traversal_cache.get(cache_key)
+            if cached is not None:
+                return [traversal_to_dto(traversal) for traversal in cached]
+
+        identity_map = NodeIdentityMap()
+        with metrics.track_call("neo4j", "related_nodes"), self.db.driver.session() as session:
+            result = session.run(RELATED_NODES_QUERY, params)
+            traversals = [_record_to_traversal(record, identity_map) for record in result]
+        metrics.TRAVERSAL_RESULTS.labels("paths").observe(len(traversals))
+        if cache_key is not None:
+            self.traversal_cache.put(cache_key, traversals)
+        return [traversal_to_dto(traversal) for traversal in traversals]
     
-    def extract_relationships(
-        traversal_results: List[Neo4jTraversalResultDto]
-    ):
-        results = []
-        seen_relationships = set()
+    def get_nodes_by_ast_hashes(self, ast_hashes: List[str]) -> Dict[str, Neo4jNodeDto]:
+        """Lấy nhiều node theo ast_hash trong một round trip."""
+        if not ast_hashes:
+            return {}
 
-        def node_key(node: Neo4jNodeDto):
-            return (
-                node.id
-                or node.ast_hash
-                or (node.class_name, node.method_name, node.file_path)
-            )
+        def work(tx):
+            identity_map = NodeIdentityMap()
+            return {
+                record["ast_hash"]: _node_to_dto(identity_map.node(record["n"]))
+                for record in tx.run(NODES_BY_AST_HASHES_QUERY, {"ast_hashes": list(ast_hashes)})
+            }
 
-        def rel_key(rel: Neo4jRelationshipDto):
-            return (
-                rel.type,
-                node_key(rel.start_node),
-                node_key(rel.end_node),
-            )
+        with metrics.track_call("neo4j", "nodes_by_ast_hashes"), self.db.driver.session() as session:
+            return session.execute_read(work)
 
-        for traversal in traversal_results:
-            path = traversal.paths
-        if path and hasattr(path, "relationships"):
-            for rel in path.relationships:
-                rk = rel_key(rel)
-                if rk in seen_relationships:
-                    continue
-
-                seen_relationships.add(rk)
-                results.append({
-                    "type": "relationship",
-                    "relationship_type": rel.type,
-                    "from_labels": rel.start_node.labels,
-                    "to_labels": rel.end_node.labels,
-                    "from_content": rel.start_node.content,
-                    "to_content": rel.end_node.content,
-                })
-
-        return results
\ No newline at end of file
+    def get_related_nodes_by_ast_hashes(
+            self,
+            ast_hashes: List[str],
+            max_level: int = 20,
+            min_level: int = 1,
+            relationship_filter: str = "CALL>|<IMPLEMENT|<EXTEND|USE>|<BRANCH"
+    ) -> Dict[str, List[GraphTraversal]]:
+        """
+        Phiên bản batch của get_node_by_ast_hash + get_related_nodes: tìm node gốc và
+        traversal của tất cả ast_hash bằng một câu UNWIND trong một read transaction.
+        Kết quả chỉ chứa các ast_hash có ít nhất một path, dưới dạng graph_types
+        (dùng traversal_to_dto nếu cần DTO).
+        """
+        if not ast_hashes:
+            return {}
+
+        cache_args = (relationship_filter, min_level, max_level)
+        self.traversal_cache.ensure_version(self.get_graph_version)
+        results, misses = _split_cached_traversals(self.traversal_cache, ast_hashes, cache_args)
+        if not misses:
+            return results
+
+        params = {
+            'ast_hashes': misses,
+            'relationship_filter': relationship_filter,
+            'min_level': min_level,
+            'max_level': max_level
+        }
+
+        def work(tx):
+            fetched: Dict[str, List[GraphTraversal]] = {}
+            identity_map = NodeIdentityMap()
+            for record in tx.run(RELATED_NODES_BY_AST_HASHES_QUERY, params):
+                fetched.setdefault(record['ast_hash'], []).append(_record_to_traversal(record, identity_map))
+            return fetched
+
+        with metrics.track_call("neo4j", "related_nodes_by_ast_hashes"), self.db.driver.session() as session:
+            fetched = session.execute_read(work)
+        _observe_traversal_results(fetched)
+
+        return _cache_fetched_traversals(self.traversal_cache, misses, fetched, cache_args, results)
+
+    def get_related_subgraphs_by_ast_hashes(
+            self,
+            ast_hashes: List[str],
+            max_level: int = 20,
+            relationship_filter: str = "CALL>|<IMPLEMENT|<EXTEND|USE>|<BRANCH",
+            node_limit: int = None
+    ) -> Dict[str, List[GraphSubgraph]]:
+        """
+        Giống get_related_nodes_by_ast_hashes nhưng mỗi endpoint trả về một GraphSubgraph
+        (node và cạnh phân biệt theo element_id, tối đa `node_limit` node).
+        """
+        if not ast_hashes:
+            return {}
+
+        node_limit = node_limit or configs.TRAVERSAL_NODE_LIMIT
+        cache_args = ("subgraph", relationship_filter, max_level, node_limit)
+        self.traversal_cache.ensure_version(self.get_graph_version)
+        results, misses = _split_cached_traversals(self.traversal_cache, ast_hashes, cache_args)
+        if not misses:
+            return results
+
+        params = {
+            'ast_hashes': misses,
+            'relationship_filter': relationship_filter,
+            'max_level': max_level,
+            'node_limit': node_limit
+        }
+
+        def work(tx):
+            fetched: Dict[str, List[GraphSubgraph]] = {}
+            identity_map = NodeIdentityMap()
+            for record in tx.run(RELATED_SUBGRAPH_BY_AST_HASHES_QUERY, params):
+                fetched.setdefault(record['ast_hash'], []).append(
+                    _record_to_subgraph(record, node_limit, identity_map)
+                )
+            return fetched
+
+        with metrics.track_call("neo4j", "related_subgraphs_by_ast_hashes"), self.db.driver.session() as session:
+            fetched = session.execute_read(work)
+        _observe_subgraph_results(fetched)
+
+        return _cache_fetched_traversals(self.traversal_cache, misses, fetched, cache_args, results)
@@ -0,0 +1,137 @@
+from typing import Dict, List, Optional
+from src_bot import metrics
+from src_bot.config.config import configs
+from src_bot.neo4jdb.graph_snapshot import GraphSnapshot, SnapshotQuery
+from src_bot.neo4jdb.graph_types import GraphSubgraph, GraphTraversal, NodeIdentityMap
+from src_bot.neo4jdb.neo4j_dto import Neo4jNodeDto, Neo4jTraversalResultDto
+from src_bot.neo4jdb.neo4j_service import (
+    GraphService,
+    _cache_fetched_traversals,
+    _node_to_dto,
+    _observe_subgraph_results,
+    _observe_traversal_results,
+    _record_to_subgraph,
+    _split_cached_traversals,
+    traversal_to_dto,
+)
+
+
+class GraphSnapshotService(GraphService):
+    """
+    Backend graph chạy trên GraphSnapshot (GRAPH_BACKEND=snapshot): traversal được thực hiện
+    trong process trên mảng CSR, cùng bộ lọc quan hệ với các query APOC. Snapshot là read-only,
+    graph_version lấy từ lúc export nên traversal cache tự reset khi snapshot được reload.
+    """
+
+    def __init__(self, snapshot: GraphSnapshot | None = None):
+        self.snapshot = snapshot or GraphSnapshot()
+        super().__init__()
+
+    def close(self):
+        self.snapshot.close()
+
+    def get_graph_version(self) -> Optional[int]:
+        self.snapshot.maybe_reload()
+        return self.snapshot.meta.get("graph_version")
+
+    def get_node_by_ast_hash(self, ast_hash: str) -> Optional[Neo4jNodeDto]:
+        query = self.snapshot.query()
+        index = query.find_by_ast_hash(ast_hash)
+        return _node_to_dto(query.node(index)) if index is not None else None
+
+    def get_nodes_by_ast_hashes(self, ast_hashes: List[str]) -> Dict[str, Neo4jNodeDto]:
+        query = self.snapshot.query()
+        nodes = {}
+        for ast_hash in ast_hashes:
+            index = query.find_by_ast_hash(ast_hash)
+            if index is not None:
+                nodes[ast_hash] = _node_to_dto(query.node(index))
+        return nodes
+
+    def get_related_nodes(
+            self,
+            target_nodes: List[Neo4jNodeDto],
+            max_level: int = 20,
+            min_level: int = 1,
+            relationship_filter: str = "CALL>|<IMPLEMENT|<EXTEND|USE>|<BRANCH"
+    ) -> List[Neo4jTraversalResultDto]:
+        query = self.snapshot.query()
+        endpoints = {}
+        for target in target_nodes:
+            for index in query.find_endpoints(target.project_id, target.class_name, target.branch, target.method_name):
+                endpoints.setdefault(index, None)
+
+        with metrics.track_call("graph_snapshot", "related_nodes"):
+            traversals = [
+                traversal
+                for endpoint in endpoints
+                for traversal in query.traversals(endpoint, relationship_filter, min_level, max_level)
+            ]
+        metrics.TRAVERSAL_RESULTS.labels("paths").observe(len(traversals))
+        return [traversal_to_dto(traversal) for traversal in traversals]
+
+    def get_related_nodes_by_ast_hashes(
+            self,
+            ast_hashes: List[str],
+            max_level: int = 20,
+            min_level: int = 1,
+            relationship_filter: str = "CALL>|<IMPLEMENT|<EXTEND|USE>|<BRANCH"
+    ) -> Dict[str, List[GraphTraversal]]:
+        if not ast_hashes:
+            return {}
+
+        cache_args = (relationship_filter, min_level, max_level)
+        self.traversal_cache.ensure_version(self.get_graph_version)
+        results, misses = _split_cached_traversals(self.traversal_cache, ast_hashes, cache_args)
+        if not misses:
+            return results
+
+        query = self.snapshot.query()
+        fetched: Dict[str, List[GraphTraversal]] = {}
+        with metrics.track_call("graph_snapshot", "related_nodes_by_ast_hashes"):
+            for ast_hash in misses:
+                for endpoint in self._endpoints(query, ast_hash):
+                    traversals = query.traversals(endpoint, relationship_filter, min_level, max_level)
+                    if traversals:
+                        fetched.setdefault(ast_hash, []).extend(traversals)
+        _observe_traversal_results(fetched)
+
+        return _cache_fetched_traversals(self.traversal_cache, misses, fetched, cache_args, results)
+
+    def get_related_subgraphs_by_ast_hashes(
+            self,
+            ast_hashes: List[str],
+            max_level: int = 20,
+            relationship_filter: str = "CALL>|<IMPLEMENT|<EXTEND|USE>|<BRANCH",
+            node_limit: int = None
+    ) -> Dict[str, List[GraphSubgraph]]:
+        if not ast_hashes:
+            return {}
+
+        node_limit = node_limit or configs.TRAVERSAL_NODE_LIMIT
+        cache_args = ("subgraph", relationship_filter, max_level, node_limit)
+        self.traversal_cache.ensure_version(self.get_graph_version)
+        results, misses = _split_cached_traversals(self.traversal_cache, ast_hashes, cache_args)
+        if not misses:
+            return results
+
+        query = self.snapshot.query()
+        fetched: Dict[str, List[GraphSubgraph]] = {}
+        with metrics.track_call("graph_snapshot", "related_subgraphs_by_ast_hashes"):
+            for ast_hash in misses:
+                for endpoint in self._endpoints(query, ast_hash):
+                    record = query.subgraph(endpoint, relationship_filter, max_level, node_limit)
+                    # Node đã là GraphNode nên identity map chỉ cần biết trước chúng
+                    identity_map = NodeIdentityMap({node.element_id: node for node in record["nodes"]})
+                    fetched.setdefault(ast_hash, []).append(_record_to_subgraph(record, node_limit, identity_map))
+        _observe_subgraph_results(fetched)
+
+        return _cache_fetched_traversals(self.traversal_cache, misses, fetched, cache_args, results)
+
+    @staticmethod
+    def _endpoints(query: SnapshotQuery, ast_hash: str) -> List[int]:
+        index = query.find_by_ast_hash(ast_hash)
+        if index is None:
+            return []
+        node = query.node(index)
+        return query.find_endpoints(node.project_id, node.class_name, node.branch, node.method_name)
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+
+class TraversalCache:
+    """
+    LRU cache cho kết quả traversal của Neo4jService, gắn với graph version stamp.
+
+    Khi ingestion bump version (xem Neo4jService.bump_graph_version), toàn bộ cache bị xoá.
+    Version chỉ được đọc lại từ Neo4j tối đa một lần mỗi `version_check_interval` giây.
+    """
+
+    def __init__(self, max_entries: int, version_check_interval: float):
+        self.max_entries = max_entries
+        self.version_check_interval = version_check_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = None
+        self._version_checked_at = 0.0
+
+    def ensure_version(self, load_version: Callable[[], Optional[int]]):
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        version = load_version()
+        self._apply_version(now, version)
+
+    async def aensure_version(self, load_version: Callable[[], Awaitable[Optional[int]]]):
+        """Giống ensure_version nhưng đọc version bằng coroutine (AsyncNeo4jService)."""
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        version = await load_version()
+        self._apply_version(now, version)
+
+    def _apply_version(self, checked_at: float, version: Optional[int]):
+        with self._lock:
+            self._version_checked_at = checked_at
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version_checked_at = 0.0
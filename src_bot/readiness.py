@@ -0,0 +1,63 @@
+import threading
+import time
+from typing import Callable, Dict, List
+from src_bot.config.config import configs
+
+PENDING = "pending"
+STARTING = "starting"
+READY = "ready"
+FAILED = "failed"
+
+
+class Readiness:
+    """Theo dõi trạng thái khởi động của từng dependency, dùng cho endpoint /ready."""
+
+    def __init__(self, components: List[str]):
+        self._lock = threading.Lock()
+        self._status: Dict[str, dict] = {
+            name: {"status": PENDING, "error": None, "seconds": None}
+            for name in components
+        }
+
+    def run(self, name: str, fn: Callable):
+        """Chạy bước khởi động `fn` của dependency `name`, ghi lại thời gian và lỗi nếu có."""
+        self._set(name, status=STARTING, error=None, seconds=None)
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            self._set(name, status=FAILED, error=str(e), seconds=round(time.perf_counter() - started, 3))
+            raise
+        self._set(name, status=READY, seconds=round(time.perf_counter() - started, 3))
+        return result
+
+    def mark_ready(self, name: str):
+        self._set(name, status=READY, error=None)
+
+    def mark_failed(self, name: str, error: Exception):
+        self._set(name, status=FAILED, error=str(error))
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            return all(item["status"] == READY for item in self._status.values())
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "ready": all(item["status"] == READY for item in self._status.values()),
+                "dependencies": {name: dict(item) for name, item in self._status.items()},
+            }
+
+    def _set(self, name: str, **values):
+        with self._lock:
+            self._status.setdefault(name, {"status": PENDING, "error": None, "seconds": None}).update(values)
+
+
+readiness_instance = Readiness([
+    "github",
+    "graph_snapshot" if configs.GRAPH_BACKEND == "snapshot" else "neo4j",
+    "vector_index" if configs.RETRIEVAL_BACKEND == "mmap" else "weaviate",
+    "embedding_model",
+    "llm",
+    "job_queue",
+])
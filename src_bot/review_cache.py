@@ -0,0 +1,98 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from src_bot.config.config import configs
+from src_bot.embedding_store import text_hash
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reviews (
+    cache_key TEXT PRIMARY KEY,
+    review TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_reviews_last_used ON reviews (last_used_at);
+"""
+
+
+def review_key(patch: str, context: str, model_name: str, prompt_version: str) -> str:
+    """Key = hash(patch, context đã đóng gói, model, version của prompt template)."""
+    parts = (text_hash(patch), text_hash(context), model_name, prompt_version)
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ReviewCache:
+    """
+    Cache kết quả review của LLM trên SQLite.
+
+    LLM chạy với temperature=0 nên cùng (patch, context, model, prompt) cho ra cùng review;
+    PR được reopen / chạy lại / force-push với file không đổi sẽ không phải gọi LLM lần nữa.
+    Entry quá TTL hoặc vượt quá max_entries (ít dùng gần đây nhất) sẽ bị xoá.
+    """
+
+    def __init__(self, db_path: str = None, max_entries: int = None, ttl_seconds: float = None):
+        self.db_path = db_path or configs.REVIEW_CACHE_PATH
+        self.max_entries = max_entries if max_entries is not None else configs.REVIEW_CACHE_MAX_ENTRIES
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else configs.REVIEW_CACHE_TTL_SECONDS
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self.evict()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        if self.max_entries <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT review, created_at FROM reviews WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE reviews SET last_used_at = ? WHERE cache_key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, review: str):
+        if self.max_entries <= 0 or not review:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reviews (cache_key, review, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+                (key, review, now, now),
+            )
+            self._conn.commit()
+        self.evict()
+
+    def evict(self):
+        """Xoá entry hết hạn, sau đó xoá bớt entry lâu không dùng nếu vượt max_entries."""
+        with self._lock:
+            self._conn.execute("DELETE FROM reviews WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+            count = self._conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM reviews WHERE cache_key IN "
+                    "(SELECT cache_key FROM reviews ORDER BY last_used_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "size": size}
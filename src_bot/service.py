@@ -1,18 +1,104 @@
-from github import Github, Auth,PullRequest
-from unidiff import PatchSet
+from unidiff import PatchSet, PatchedFile
 from src_bot.bot import bot_instance as langgraph_bot
 from src_bot.config.config import configs
-import requests
+from src_bot.diff_symbols import CODE_EXTENSIONS
+from src_bot.github_client import GitHubClient
+from src_bot.readiness import Readiness, readiness_instance
+from src_bot import metrics
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+# Đoạn code được trích trong review: ```block``` hoặc `inline`
+_CODE_BLOCK_RE = re.compile(r"```[\w+-]*\n(.*?)```", re.S)
+_INLINE_CODE_RE = re.compile(r"`([^`\n]+)`")
+_MIN_SNIPPET_LENGTH = 4
+
+
+@dataclass
+class ReviewDraft:
+    """Các comment của một PR, được gửi một lần qua submit_review."""
+    repo_name: str
+    pr_number: int
+    commit_sha: str
+    files: Dict[str, PatchedFile]
+    comments: List[dict] = field(default_factory=list)
+
+
+def index_patch_set(patch_set: PatchSet) -> Dict[str, PatchedFile]:
+    return {patched_file.path: patched_file for patched_file in patch_set}
+
+
+def index_patch_files(files: List[dict]) -> Dict[str, PatchedFile]:
+    """Dựng PatchedFile từ `patch` của từng file trong API /pulls/{n}/files (không cần tải diff)."""
+    index = {}
+    for f in files:
+        if not f.get("patch"):
+            continue
+        name = f["filename"]
+        index.update(index_patch_set(PatchSet(f"--- a/{name}\n+++ b/{name}\n{f['patch']}\n")))
+    return index
+
+
+def _quoted_snippets(comment_body: str) -> List[str]:
+    snippets = []
+    for block in _CODE_BLOCK_RE.findall(comment_body):
+        snippets.extend(line.strip() for line in block.split("\n"))
+    snippets.extend(snippet.strip() for snippet in _INLINE_CODE_RE.findall(comment_body))
+    return [snippet for snippet in snippets if len(snippet) >= _MIN_SNIPPET_LENGTH]
+
+
+def find_anchor_line(patched_file: PatchedFile, comment_body: str) -> Optional[int]:
+    """
+    Chọn dòng để gắn comment: hunk có nhiều dòng khớp với code được trích trong review nhất,
+    ưu tiên dòng được thêm mới. Không khớp gì thì dùng dòng đầu tiên của hunk đầu tiên.
+    """
+    snippets = _quoted_snippets(comment_body)
+    best_line, best_score = None, 0
+    for hunk in patched_file:
+        score, first_match = 0, None
+        for line in hunk:
+            if line.is_removed:
+                continue
+            text = line.value.strip()
+            if len(text) >= _MIN_SNIPPET_LENGTH and any(snippet in text or text in snippet for snippet in snippets):
+                score += 2 if line.is_added else 1
+                if first_match is None or (line.is_added and not first_match[1]):
+                    first_match = (line.target_line_no, line.is_added)
+        if score > best_score:
+            best_line, best_score = first_match[0], score
+
+    if best_line is not None:
+        return best_line
+    if len(patched_file) == 0:
+        return None
+    for line in patched_file[0]:
+        if not line.is_removed:
+            return line.target_line_no
+    return None
+
+
 class BotService:
     def __init__(self):
         self.github_token = configs.GITHUB_TOKEN
+        # Generate không cần semaphore: LLMGateway của bot giới hạn và xếp hàng theo kích thước PR
+        self.retrieval_semaphore = threading.BoundedSemaphore(configs.REVIEW_RETRIEVAL_CONCURRENCY)
+        self.async_retrieval_semaphore = asyncio.Semaphore(configs.REVIEW_RETRIEVAL_CONCURRENCY)
+        self.github_client = None
     
-    def initialize(self):
+    def initialize(self, readiness: Readiness = readiness_instance):
+        readiness.run("github", self._connect_github)
+        print("GitHub client initialized.")
+
+    def _connect_github(self):
         if not self.github_token:
             raise ValueError("GITHUB_TOKEN is not set in the configuration.")
-        self.github_auth = Auth.Token(self.github_token)
-        self.github_client = Github(auth=self.github_auth)
-        print("GitHub client initialized.")
+        self.github_client = GitHubClient(self.github_token)
+        # Kiểm tra token + kết nối tới GitHub API trước khi nhận webhook
+        self.github_client.get_rate_limit()
     
     def close(self):
         if self.github_client is not None:
@@ -20,61 +106,179 @@ class BotService:
             print("GitHub client closed.")
 
 
-    def process_pr_review(self, repo_name: str, pr_number: int):
+    def process_pr_review(self, repo_name: str, pr_number: int, head_sha: str = None):
         print(f"--- STARTING REVIEW FOR PR: {repo_name}#{pr_number} ---")
     
-        try:
-            g = self.github_client
-            repo = g.get_repo(repo_name)
-            pr = repo.get_pull(pr_number)
-        
-            files = pr.get_files()
-            code_files = [f for f in files if f.filename.endswith(('.py', '.js', '.java', '.cpp', '.ts', '.go', '.rb'))]
+        with metrics.trace_pr(repo_name, pr_number, mode="sync"):
+            try:
+                fetched = self._fetch_pr(repo_name, pr_number, head_sha)
+                if fetched is None:
+                    return
+                draft, code_files = fetched
 
-            diff_response = requests.get(pr.url, headers={"Authorization": f"token {self.github_auth.token}", "Accept": "application/vnd.github.v3.diff"})
-            diff_content = diff_response.text
-            patch_set = PatchSet(diff_content)
+                if configs.REVIEW_CONCURRENT_MODE:
+                    self._review_files_concurrently(draft, code_files)
+                else:
+                    for f, bot_input in zip(code_files, self._bot_inputs(code_files)):
+                        result = langgraph_bot.invoke(bot_input)
+                        review_body = result.get("final_review")
+                        if review_body:
+                            self.post_comment_on_line(draft, f["filename"], review_body)
 
-            for f in code_files:
-                bot_input = {"pr_diff": f"{f.filename}\n{f.patch}"}
-                result = langgraph_bot.invoke(bot_input)
-                review_body = result.get("final_review")
-                if review_body:
-                    self.post_comment_on_line(pr, patch_set, f.filename, review_body)
+                self.submit_review(draft)
             
-            print(f"--- FINISHED REVIEW FOR {repo_name}#{pr_number} ---")
+                print(f"--- FINISHED REVIEW FOR {repo_name}#{pr_number} ---")
 
-        except Exception as e:
-            print(f"ERROR reviewing PR {repo_name}#{pr_number}: {str(e)}")
+            except Exception as e:
+                print(f"ERROR reviewing PR {repo_name}#{pr_number}: {str(e)}")
+                raise
     
-    def post_comment_on_line(self,pr : PullRequest, patch_set:PatchSet,file_path:str, comment_body:str, side="RIGHT"):
-        target_file = None
-        for patched_file in patch_set:
-            if patched_file.path == file_path:
-                target_file = patched_file
-                break
-                
+    async def aprocess_pr_review(self, repo_name: str, pr_number: int, head_sha: str = None):
+        """
+        Phiên bản async của process_pr_review: nhiều review cùng chạy trên một event loop.
+        Retrieval/LLM dùng client async; GitHub API (sync) và encode chạy qua asyncio.to_thread.
+        """
+        print(f"--- STARTING REVIEW FOR PR: {repo_name}#{pr_number} (async) ---")
+
+        with metrics.trace_pr(repo_name, pr_number, mode="async"):
+            try:
+                fetched = await asyncio.to_thread(self._fetch_pr, repo_name, pr_number, head_sha)
+                if fetched is None:
+                    return
+                draft, code_files = fetched
+
+                if code_files:
+                    states = await langgraph_bot.aprefetch(self._bot_inputs(code_files))
+                    tasks = {
+                        asyncio.ensure_future(self._areview_single_file(state)): f
+                        for f, state in zip(code_files, states)
+                    }
+                    pending = set(tasks)
+                    while pending:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            f = tasks[task]
+                            if task.exception():
+                                print(f"  -> Error reviewing {f['filename']}: {task.exception()}")
+                                continue
+                            review_body = task.result()
+                            if review_body:
+                                self.post_comment_on_line(draft, f["filename"], review_body)
+
+                await asyncio.to_thread(self.submit_review, draft)
+                print(f"--- FINISHED REVIEW FOR {repo_name}#{pr_number} ---")
+
+            except Exception as e:
+                print(f"ERROR reviewing PR {repo_name}#{pr_number}: {str(e)}")
+                raise
+
+    def _fetch_pr(self, repo_name: str, pr_number: int, head_sha: str = None):
+        """
+        Đọc PR và danh sách file (kèm patch) qua GitHubClient.
+        Trả về None nếu head đã cũ, ngược lại (ReviewDraft, code_files).
+        """
+        pr = self.github_client.get_pull(repo_name, pr_number)
+        if head_sha and pr["head"]["sha"] != head_sha:
+            # Đã có push mới hơn, job của head mới sẽ review thay
+            print(f"--- SKIPPED STALE HEAD {head_sha[:7]} FOR {repo_name}#{pr_number} ---")
+            return None
+
+        files = self.github_client.get_pull_files(repo_name, pr_number)
+        # Head commit và index các file trong patch chỉ resolve một lần cho cả PR
+        draft = ReviewDraft(
+            repo_name=repo_name,
+            pr_number=pr_number,
+            commit_sha=pr["head"]["sha"],
+            files=index_patch_files(files),
+        )
+        code_files = [f for f in files if f["filename"].endswith(CODE_EXTENSIONS)]
+        if any(not f.get("patch") for f in code_files):
+            # GitHub bỏ `patch` với file quá lớn: chỉ khi đó mới tải diff đầy đủ
+            diff_content = self.github_client.get_pull_diff(repo_name, pr_number)
+            full_index = index_patch_set(PatchSet(diff_content))
+            for f in code_files:
+                if not f.get("patch") and f["filename"] in full_index:
+                    f["patch"] = "".join(str(hunk) for hunk in full_index[f["filename"]])
+                    draft.files[f["filename"]] = full_index[f["filename"]]
+        code_files = [f for f in code_files if f.get("patch")]
+        return draft, code_files
+
+    @staticmethod
+    def _bot_inputs(code_files) -> List[dict]:
+        """Input của bot cho từng file, kèm kích thước cả PR để LLMGateway ưu tiên PR nhỏ."""
+        pr_size = sum(len(f["patch"]) for f in code_files)
+        return [{"pr_diff": f"{f['filename']}\n{f['patch']}", "pr_size": pr_size} for f in code_files]
+
+    async def _areview_single_file(self, state):
+        async with self.async_retrieval_semaphore:
+            state = await langgraph_bot.aretrieve(state)
+        result = await langgraph_bot.areview(state)
+        return result.get("final_review")
+
+    def _review_single_file(self, state):
+        """Retrieve (giới hạn bởi semaphore) rồi generate qua LLMGateway cho 1 file."""
+        with self.retrieval_semaphore:
+            state = langgraph_bot.retrieve(state)
+        result = langgraph_bot.review(state)
+        return result.get("final_review")
+
+    def _review_files_concurrently(self, draft: ReviewDraft, code_files):
+        """
+        Pipeline song song: retrieval của file N+1 chạy trong lúc file N đang generate.
+        Comment của từng file được gom vào draft ngay khi review hoàn thành.
+        """
+        if not code_files:
+            return
+        max_workers = configs.REVIEW_RETRIEVAL_CONCURRENCY + configs.REVIEW_LLM_CONCURRENCY
+        # Vector search cho cả PR chạy một lần theo batch trước khi vào pipeline
+        states = langgraph_bot.prefetch(self._bot_inputs(code_files))
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="review") as executor:
+            futures = {
+                metrics.submit_in_context(executor, self._review_single_file, state): f
+                for f, state in zip(code_files, states)
+            }
+            for future in as_completed(futures):
+                f = futures[future]
+                try:
+                    review_body = future.result()
+                except Exception as e:
+                    print(f"  -> Error reviewing {f['filename']}: {e}")
+                    continue
+                if review_body:
+                    self.post_comment_on_line(draft, f["filename"], review_body)
+
+    def post_comment_on_line(self, draft: ReviewDraft, file_path: str, comment_body: str, side="RIGHT"):
+        """Gắn comment vào hunk liên quan của file và thêm vào draft (chưa gọi GitHub API)."""
+        target_file = draft.files.get(file_path)
         if not target_file:
             print(f"File {file_path} không tìm thấy trong PR này.")
             return
-        
-        first_hunk = target_file[0] 
-        if not first_hunk:
-            return
-        valid_line = None
-        for line in first_hunk:
-            if not line.is_removed:
-                valid_line = line.target_line_no
-                break
-        last_commit = pr.get_commits()[pr.commits - 1]
+
+        valid_line = find_anchor_line(target_file, comment_body)
         if valid_line:
+            draft.comments.append({
+                "path": file_path,
+                "body": comment_body,
+                "line": valid_line,
+                "side": side,
+            })
+
+    def submit_review(self, draft: ReviewDraft):
+        """Gửi toàn bộ comment của PR trong một lần gọi create_review."""
+        if not draft.comments:
+            return
+        try:
+            self.github_client.create_review(
+                draft.repo_name, draft.pr_number, draft.commit_sha, draft.comments, event="COMMENT"
+            )
+            print(f"  -> Posted review with {len(draft.comments)} comment(s)")
+        except Exception as e:
+            # Thường do một dòng không còn nằm trong diff: gửi lại dưới dạng review body
+            print(f"  -> Error: {e}")
+            body = "\n\n".join(f"**{c['path']}** (line {c['line']})\n\n{c['body']}" for c in draft.comments)
             try:
-                pr.create_review_comment(
-                    body=comment_body, 
-                    commit=last_commit, 
-                    path=file_path, 
-                    side=side,
-                    line=valid_line
+                self.github_client.create_review(
+                    draft.repo_name, draft.pr_number, draft.commit_sha, [], body=body, event="COMMENT"
                 )
             except Exception as e:
                 print(f"  -> Error: {e}")
@@ -0,0 +1,175 @@
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence
+from src_bot.config.config import configs
+from src_bot.diff_symbols import DiffSymbol
+
+# Tăng khi đổi bảng: index cũ bị bỏ qua (dùng vector search) tới khi migrate_weaviate dựng lại
+SCHEMA_VERSION = 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS symbols (
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    class_name TEXT,
+    file_path TEXT,
+    ast_hash TEXT NOT NULL,
+    PRIMARY KEY (kind, name, ast_hash)
+) WITHOUT ROWID;
+"""
+
+# Tên của các node CPG đã được đưa vào Weaviate (cùng tập node với CHUNK_QUERY của migrate_weaviate),
+# theo đúng kind của DiffSymbol
+SYMBOL_QUERY = """
+CALL {
+    MATCH (m:MethodNode)
+    RETURN 'function' AS kind, coalesce(m.method_name, m.name) AS name, m.class_name AS class_name,
+           m.file_path AS file_path, m.ast_hash AS ast_hash
+    UNION ALL
+
+    MATCH (cl:ClassNode)
+    RETURN 'class' AS kind, coalesce(cl.class_name, cl.name) AS name, cl.class_name AS class_name,
+           cl.file_path AS file_path, cl.ast_hash AS ast_hash
+    UNION ALL
+
+    MATCH (e:EndpointNode)
+    RETURN 'endpoint' AS kind, e.endpoint AS name, e.class_name AS class_name,
+           e.file_path AS file_path, e.ast_hash AS ast_hash
+    UNION ALL
+
+    MATCH (c:ConfigurationNode)
+    RETURN 'config' AS kind, c.name AS name, c.class_name AS class_name,
+           c.file_path AS file_path, c.ast_hash AS ast_hash
+}
+WITH * WHERE name IS NOT NULL AND ast_hash IS NOT NULL
+RETURN kind, name, class_name, file_path, ast_hash
+"""
+
+
+def _normalize_path(file_path: Optional[str]) -> Optional[str]:
+    if not file_path:
+        return None
+    path = file_path.replace("\\", "/")
+    while path.startswith("./"):
+        path = path[2:]
+    return path.lstrip("/")
+
+
+def _same_file(node_path: Optional[str], diff_path: Optional[str]) -> bool:
+    """Path trong CPG có thể là tuyệt đối hoặc có thêm thư mục gốc, path trong diff tính từ root repo."""
+    if not node_path or not diff_path:
+        return False
+    return node_path == diff_path or node_path.endswith("/" + diff_path) or diff_path.endswith("/" + node_path)
+
+
+class SymbolIndex:
+    """
+    Index tên symbol -> ast_hash trên SQLite, dựng lại mỗi lần ingest (migrate_weaviate).
+
+    Symbol của diff (function, class, endpoint, config key) tra được ở đây sẽ được lấy thẳng
+    theo ast_hash (UUID generate_uuid5(ast_hash) trong Weaviate) thay vì embed + hybrid search.
+    Chỉ coi là resolve được khi tên đầy đủ khớp: cùng tên, cùng file với diff và cùng class
+    (nếu diff cho biết class chứa symbol), với 1..limit node. Node cùng tên ở file khác không
+    được dùng vì có thể là symbol không liên quan.
+    """
+
+    def __init__(self, db_path: str = None):
+        self.db_path = db_path or configs.SYMBOL_INDEX_PATH
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self.schema_version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def rebuild(self, rows: Iterable[Dict]) -> int:
+        """Thay toàn bộ index trong một transaction (process đang đọc vẫn thấy bản cũ tới khi commit)."""
+        count = 0
+
+        def values():
+            nonlocal count
+            for row in rows:
+                count += 1
+                yield row["kind"], row["name"], row.get("class_name"), _normalize_path(row.get("file_path")), row["ast_hash"]
+
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                # Dựng lại bảng theo schema hiện tại (index cũ có thể khác schema)
+                self._conn.execute("DROP TABLE IF EXISTS symbols")
+                self._conn.execute(_SCHEMA)
+                self._conn.executemany(
+                    "INSERT OR IGNORE INTO symbols (kind, name, class_name, file_path, ast_hash) VALUES (?, ?, ?, ?, ?)",
+                    values(),
+                )
+                self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            self.schema_version = SCHEMA_VERSION
+        return count
+
+    def resolve(self, symbol: Optional[DiffSymbol], limit: int = 3) -> Optional[List[str]]:
+        """ast_hash của các node ứng với symbol (cùng tên, cùng file, cùng class), hoặc None."""
+        if symbol is None or symbol.kind == "hunk" or not symbol.file_path:
+            return None
+
+        name, container = symbol.name, symbol.container
+        names = [name]
+        if symbol.kind == "endpoint" and " " in name:
+            names.append(name.split(" ", 1)[1])
+        elif symbol.kind == "function" and "::" in name:
+            # C++ Foo::run
+            container, name = name.rsplit("::", 1)
+            names = [name]
+
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT ast_hash, class_name, file_path FROM symbols WHERE kind = ? AND name IN ({','.join('?' * len(names))})",
+                (symbol.kind, *names),
+            ).fetchall()
+
+        file_path = _normalize_path(symbol.file_path)
+        rows = [row for row in rows if _same_file(row[2], file_path)]
+        if container and symbol.kind == "function":
+            rows = [row for row in rows if row[1] == container]
+        if not rows or len(rows) > limit:
+            return None
+        return [row[0] for row in rows]
+
+    def resolve_many(self, symbols: Sequence[Optional[DiffSymbol]], limit: int = 3) -> List[Optional[List[str]]]:
+        return [self.resolve(symbol, limit) for symbol in symbols]
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = self._conn.execute("SELECT COUNT(*) FROM symbols").fetchone()[0]
+        return {"size": size}
+
+
+def rebuild_from_neo4j(driver, index: SymbolIndex = None) -> int:
+    """Dựng lại symbol index từ các node CPG trong Neo4j."""
+    index = index or SymbolIndex()
+    with driver.session(fetch_size=configs.INGEST_FETCH_SIZE) as session:
+        return index.rebuild(dict(record) for record in session.run(SYMBOL_QUERY))
+
+
+def open_symbol_index(db_path: str = None) -> Optional[SymbolIndex]:
+    """SymbolIndex nếu fast path được bật và index đã được dựng, ngược lại None (chỉ dùng vector search)."""
+    db_path = db_path or configs.SYMBOL_INDEX_PATH
+    if not configs.SYMBOL_FAST_PATH:
+        return None
+    if not os.path.exists(db_path):
+        print(f"Symbol index {db_path} chưa có, chạy `python migrate_weaviate.py` để dựng (chỉ dùng vector search).")
+        return None
+    index = SymbolIndex(db_path)
+    if index.schema_version != SCHEMA_VERSION:
+        print(f"Symbol index {db_path} đã cũ, chạy `python migrate_weaviate.py` để dựng lại (chỉ dùng vector search).")
+        index.close()
+        return None
+    return index
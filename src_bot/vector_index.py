@@ -0,0 +1,422 @@
+import hashlib
+import json
+import mmap
+import os
+import re
+import shutil
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence
+import numpy as np
+from src_bot.config.config import configs
+
+FORMAT_VERSION = 2
+PROPERTIES = ("ast_hash", "name", "content", "file_path", "node_type")
+# Property được đánh index BM25, giống các property index_searchable của collection Weaviate
+SEARCHABLE_PROPERTIES = ("name", "content", "file_path")
+
+# Tokenization "word" của Weaviate: chỉ giữ chữ/số, lowercase
+_TOKEN_RE = re.compile(r"[^\W_]+")
+# Số dòng vector float16 được đổi sang float32 mỗi lần khi tính điểm
+_FLOAT16_CHUNK_ROWS = 16384
+
+_META = "meta.json"
+_VECTORS = "vectors.npy"
+_PROPERTIES_BLOB = "properties.bin"
+_PROPERTY_OFFSETS = "property_offsets.npy"
+_TERM_HASHES = "term_hashes.npy"
+_TERM_OFFSETS = "term_offsets.npy"
+_POSTING_DOCS = "posting_docs.npy"
+_POSTING_WEIGHTS = "posting_weights.npy"
+_AST_HASH_KEYS = "ast_hash_keys.npy"
+_AST_HASH_DOCS = "ast_hash_docs.npy"
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def term_hash(term: str) -> int:
+    """Vocabulary lưu dưới dạng hash 64-bit đã sort để tra bằng searchsorted trên mmap."""
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class VectorIndexWriter:
+    """
+    Ghi index theo kiểu streaming (không cần biết trước số object):
+    vector được ghi thẳng ra file tạm, metadata thành blob JSON, posting BM25 gom theo document.
+    finish() dựng các mảng .npy rồi thay thế index cũ bằng một lần rename.
+    """
+
+    def __init__(self, path: str, dtype: str = None, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.dtype = np.dtype(dtype or configs.VECTOR_INDEX_DTYPE)
+        self.k1 = k1
+        self.b = b
+        self.dim = None
+        self.count = 0
+        self._tmp_path = f"{path}.tmp"
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+        os.makedirs(self._tmp_path)
+        self._raw_vectors = open(os.path.join(self._tmp_path, "vectors.f32"), "wb")
+        self._blob = open(os.path.join(self._tmp_path, _PROPERTIES_BLOB), "wb")
+        self._offsets = [0]
+        self._doc_lengths = []
+        self._term_cache: Dict[str, int] = {}
+        self._posting_hashes = []
+        self._posting_docs = []
+        self._posting_tf = []
+        self._ast_hashes = []
+
+    def add(self, properties: Dict, vector):
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        if self.dim is None:
+            self.dim = vector.shape[0]
+        elif vector.shape[0] != self.dim:
+            raise ValueError(f"Vector dim {vector.shape[0]} khác dim của index ({self.dim})")
+        norm = np.linalg.norm(vector)
+        self._raw_vectors.write((vector / norm if norm else vector).tobytes())
+
+        record = json.dumps({key: properties.get(key) for key in PROPERTIES}, ensure_ascii=False).encode("utf-8")
+        self._blob.write(record)
+        self._offsets.append(self._offsets[-1] + len(record))
+
+        tokens = [token for key in SEARCHABLE_PROPERTIES for token in tokenize(properties.get(key))]
+        counts = Counter(tokens)
+        if counts:
+            self._posting_hashes.append(np.fromiter(
+                (self._hash(term) for term in counts), dtype=np.uint64, count=len(counts)
+            ))
+            self._posting_docs.append(np.full(len(counts), self.count, dtype=np.int32))
+            self._posting_tf.append(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        self._doc_lengths.append(len(tokens))
+        if properties.get("ast_hash"):
+            self._ast_hashes.append((term_hash(properties["ast_hash"]), self.count))
+        self.count += 1
+
+    def add_batch(self, rows: Iterable[Dict], vectors: Iterable):
+        for properties, vector in zip(rows, vectors):
+            self.add(properties, vector)
+
+    def _hash(self, term: str) -> int:
+        value = self._term_cache.get(term)
+        if value is None:
+            value = self._term_cache[term] = term_hash(term)
+        return value
+
+    def finish(self) -> int:
+        """Ghi các mảng còn lại, thay thế index cũ tại `path` và trả về số object."""
+        self._raw_vectors.close()
+        self._blob.close()
+        dim = self.dim or 0
+        raw_path = os.path.join(self._tmp_path, "vectors.f32")
+        vectors = np.lib.format.open_memmap(
+            os.path.join(self._tmp_path, _VECTORS), mode="w+", dtype=self.dtype, shape=(self.count, dim)
+        )
+        if self.count and dim:
+            raw = np.memmap(raw_path, dtype=np.float32, mode="r", shape=(self.count, dim))
+            for start in range(0, self.count, _FLOAT16_CHUNK_ROWS):
+                vectors[start:start + _FLOAT16_CHUNK_ROWS] = raw[start:start + _FLOAT16_CHUNK_ROWS]
+            del raw
+        vectors.flush()
+        del vectors
+        os.remove(raw_path)
+
+        self._save(_PROPERTY_OFFSETS, np.asarray(self._offsets, dtype=np.int64))
+        doc_lengths = np.asarray(self._doc_lengths, dtype=np.float32)
+        self._write_postings(doc_lengths)
+        self._write_ast_hashes()
+
+        with open(os.path.join(self._tmp_path, _META), "w", encoding="utf-8") as f:
+            json.dump({
+                "format": FORMAT_VERSION,
+                "count": self.count,
+                "dim": dim,
+                "dtype": self.dtype.name,
+                "avgdl": float(doc_lengths.mean()) if self.count else 0.0,
+                "k1": self.k1,
+                "b": self.b,
+                "created_at": time.strftime(configs.DATETIME_FORMAT),
+            }, f, indent=2)
+
+        # Process đang mmap index cũ vẫn đọc được file cũ cho tới khi reload
+        old_path = f"{self.path}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(self.path):
+            os.rename(self.path, old_path)
+        os.rename(self._tmp_path, self.path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        return self.count
+
+    def abort(self):
+        self._raw_vectors.close()
+        self._blob.close()
+        shutil.rmtree(self._tmp_path, ignore_errors=True)
+
+    def _write_postings(self, doc_lengths: np.ndarray):
+        if self._posting_hashes:
+            hashes = np.concatenate(self._posting_hashes)
+            docs = np.concatenate(self._posting_docs)
+            tf = np.concatenate(self._posting_tf)
+        else:
+            hashes = np.empty(0, dtype=np.uint64)
+            docs = np.empty(0, dtype=np.int32)
+            tf = np.empty(0, dtype=np.float32)
+        self._posting_hashes = self._posting_docs = self._posting_tf = None
+
+        order = np.lexsort((docs, hashes))
+        hashes, docs, tf = hashes[order], docs[order], tf[order]
+        terms, starts = np.unique(hashes, return_index=True)
+        offsets = np.append(starts, len(hashes)).astype(np.int64)
+        # Phần BM25 chỉ phụ thuộc (term, document) được tính sẵn, lúc query chỉ còn nhân với idf
+        avgdl = float(doc_lengths.mean()) if len(doc_lengths) else 1.0
+        norm = self.k1 * (1 - self.b + self.b * doc_lengths[docs] / (avgdl or 1.0))
+        weights = (tf * (self.k1 + 1) / (tf + norm)).astype(np.float32)
+        self._save(_TERM_HASHES, terms)
+        self._save(_TERM_OFFSETS, offsets)
+        self._save(_POSTING_DOCS, docs)
+        self._save(_POSTING_WEIGHTS, weights)
+
+    def _write_ast_hashes(self):
+        # Tra object theo ast_hash (fast path của symbol index) bằng searchsorted
+        keys = np.fromiter((key for key, _ in self._ast_hashes), dtype=np.uint64, count=len(self._ast_hashes))
+        docs = np.fromiter((doc for _, doc in self._ast_hashes), dtype=np.int32, count=len(self._ast_hashes))
+        order = np.lexsort((docs, keys))
+        self._save(_AST_HASH_KEYS, keys[order])
+        self._save(_AST_HASH_DOCS, docs[order])
+        self._ast_hashes = None
+
+    def _save(self, name: str, array: np.ndarray):
+        np.save(os.path.join(self._tmp_path, name), array)
+
+
+class _IndexData:
+    """Các mảng mmap của một phiên bản index (được thay nguyên khối khi reload)."""
+
+    __slots__ = (
+        "meta", "mtime", "vectors", "property_offsets",
+        "term_hashes", "term_offsets", "posting_docs", "posting_weights", "ast_hash_keys", "ast_hash_docs",
+        "blob_file", "blob",
+    )
+
+    def __init__(self, path: str):
+        meta_path = os.path.join(path, _META)
+        self.mtime = os.stat(meta_path).st_mtime_ns
+        with open(meta_path, encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Vector index {path} có format {self.meta.get('format')}, cần {FORMAT_VERSION}")
+
+        def load(name):
+            # ndarray thường (vẫn trỏ vào vùng mmap) để tránh overhead của np.memmap khi slice
+            return np.asarray(np.load(os.path.join(path, name), mmap_mode="r"))
+
+        self.vectors = load(_VECTORS)
+        self.property_offsets = load(_PROPERTY_OFFSETS)
+        self.term_hashes = load(_TERM_HASHES)
+        self.term_offsets = load(_TERM_OFFSETS)
+        self.posting_docs = load(_POSTING_DOCS)
+        self.posting_weights = load(_POSTING_WEIGHTS)
+        self.ast_hash_keys = load(_AST_HASH_KEYS)
+        self.ast_hash_docs = load(_AST_HASH_DOCS)
+        self.blob_file = open(os.path.join(path, _PROPERTIES_BLOB), "rb")
+        size = os.fstat(self.blob_file.fileno()).st_size
+        self.blob = mmap.mmap(self.blob_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def close(self):
+        if isinstance(self.blob, mmap.mmap):
+            self.blob.close()
+        self.blob_file.close()
+
+
+class MmapVectorIndex:
+    """
+    Index vector + BM25 chạy trong process, thay cho hybrid query tới Weaviate.
+
+    Mọi mảng được np.load(mmap_mode="r") nên nhiều worker process dùng chung page cache
+    của cùng một file. Điểm hybrid theo relativeScoreFusion của Weaviate:
+    alpha * vector_score + (1 - alpha) * bm25_score, mỗi điểm được chuẩn hoá min-max về [0, 1].
+    """
+
+    def __init__(self, path: str = None, reload_interval: float = None):
+        self.path = path or configs.VECTOR_INDEX_PATH
+        self.reload_interval = reload_interval if reload_interval is not None else configs.VECTOR_INDEX_RELOAD_SECONDS
+        self._lock = threading.Lock()
+        self._data = _IndexData(self.path)
+        self._checked_at = time.monotonic()
+
+    def __len__(self) -> int:
+        return self._data.meta["count"]
+
+    @property
+    def meta(self) -> Dict:
+        return self._data.meta
+
+    def close(self):
+        with self._lock:
+            if self._data is not None:
+                self._data.close()
+                self._data = None
+
+    def maybe_reload(self) -> bool:
+        """Mở lại index nếu file đã được export lại (kiểm tra tối đa mỗi `reload_interval` giây)."""
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return False
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.stat(os.path.join(self.path, _META)).st_mtime_ns
+            except FileNotFoundError:
+                return False
+            if mtime == self._data.mtime:
+                return False
+            # Không đóng bản cũ: request đang chạy vẫn có thể đọc nó, GC sẽ unmap
+            self._data = _IndexData(self.path)
+        print(f"Vector index reloaded: {len(self)} objects")
+        return True
+
+    def hybrid_batch(
+        self,
+        query_texts: Sequence[str],
+        query_vectors,
+        alpha: float = 0.5,
+        top_k: int = 3,
+        return_properties: Sequence[str] = PROPERTIES,
+    ) -> List[List[Dict]]:
+        """Top-k hybrid cho nhiều query: một phép nhân ma trận cho phần vector, BM25 theo từng query."""
+        data = self._data
+        count = data.meta["count"]
+        if not query_texts or count == 0:
+            return [[] for _ in query_texts]
+
+        vector_scores = self._vector_scores(data, np.asarray(query_vectors, dtype=np.float32)) if alpha > 0 else None
+        results = []
+        for i, query_text in enumerate(query_texts):
+            # relativeScoreFusion của Weaviate: mỗi modality lấy top-k riêng, chuẩn hoá min-max
+            # trong chính tập đó rồi cộng theo alpha
+            candidates = []
+            fused = np.zeros(count, dtype=np.float32)
+            if alpha > 0:
+                docs, normalized = _relative_scores(vector_scores[:, i], top_k)
+                fused[docs] += alpha * normalized
+                candidates.append(docs)
+            if alpha < 1:
+                # BM25 chỉ trả về document có chứa term của query
+                docs, normalized = _relative_scores(self._bm25_scores(data, query_text), top_k, positive_only=True)
+                fused[docs] += (1 - alpha) * normalized
+                candidates.append(docs)
+            candidates = np.unique(np.concatenate(candidates))
+            top = candidates[_top_k(fused[candidates], top_k)]
+            results.append([self._properties(data, doc, return_properties) for doc in top])
+        return results
+
+    def fetch_by_ast_hashes(
+        self, ast_hashes: Sequence[str], return_properties: Sequence[str] = PROPERTIES
+    ) -> Dict[str, Dict]:
+        """Lấy object theo ast_hash (tương đương fetch theo UUID generate_uuid5(ast_hash) của Weaviate)."""
+        data = self._data
+        results = {}
+        for ast_hash in dict.fromkeys(ast_hashes):
+            hashed = np.uint64(term_hash(ast_hash))
+            start = np.searchsorted(data.ast_hash_keys, hashed, side="left")
+            end = np.searchsorted(data.ast_hash_keys, hashed, side="right")
+            for doc in data.ast_hash_docs[start:end].tolist():
+                properties = self._properties(data, doc, PROPERTIES)
+                if properties["ast_hash"] == ast_hash:
+                    results[ast_hash] = {key: properties.get(key) for key in return_properties}
+                    break
+        return results
+
+    def _vector_scores(self, data: _IndexData, queries: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+        vectors = data.vectors
+        if vectors.dtype == np.float32:
+            return vectors @ queries.T
+        # float16 tiết kiệm một nửa bộ nhớ nhưng phải đổi sang float32 theo từng khối
+        scores = np.empty((vectors.shape[0], queries.shape[0]), dtype=np.float32)
+        for start in range(0, vectors.shape[0], _FLOAT16_CHUNK_ROWS):
+            chunk = vectors[start:start + _FLOAT16_CHUNK_ROWS].astype(np.float32)
+            scores[start:start + chunk.shape[0]] = chunk @ queries.T
+        return scores
+
+    def _bm25_scores(self, data: _IndexData, query_text: str) -> np.ndarray:
+        count = data.meta["count"]
+        terms = Counter(tokenize(query_text))
+        if not terms or not len(data.term_hashes):
+            return np.zeros(count, dtype=np.float32)
+
+        hashes = np.fromiter((term_hash(term) for term in terms), dtype=np.uint64, count=len(terms))
+        query_tf = np.fromiter(terms.values(), dtype=np.float32, count=len(terms))
+        positions = np.minimum(np.searchsorted(data.term_hashes, hashes), len(data.term_hashes) - 1)
+        found = data.term_hashes[positions] == hashes
+        if not found.any():
+            return np.zeros(count, dtype=np.float32)
+
+        # Gom posting của mọi term trong query rồi cộng dồn bằng một lần bincount
+        positions, query_tf = positions[found], query_tf[found]
+        starts = data.term_offsets[positions]
+        ends = data.term_offsets[positions + 1]
+        lengths = ends - starts
+        idf = np.log(1 + (count - lengths + 0.5) / (lengths + 0.5)).astype(np.float32)
+        docs = np.concatenate([data.posting_docs[start:end] for start, end in zip(starts, ends)])
+        weights = np.concatenate([
+            data.posting_weights[start:end] * factor
+            for start, end, factor in zip(starts, ends, query_tf * idf)
+        ])
+        return np.bincount(docs, weights=weights, minlength=count).astype(np.float32)
+
+    def _properties(self, data: _IndexData, doc: int, return_properties: Sequence[str]) -> Dict:
+        start, end = data.property_offsets[doc], data.property_offsets[doc + 1]
+        record = json.loads(data.blob[start:end])
+        return {key: record.get(key) for key in return_properties}
+
+
+def _relative_scores(scores: np.ndarray, k: int, positive_only: bool = False):
+    """(top-k document, điểm min-max trong chính top-k đó); các điểm bằng nhau đều được 1."""
+    docs = _top_k(scores, k)
+    if positive_only:
+        docs = docs[scores[docs] > 0]
+    if not len(docs):
+        return docs, np.empty(0, dtype=np.float32)
+    top = scores[docs]
+    low, high = top.min(), top.max()
+    if high <= low:
+        return docs, np.ones(len(docs), dtype=np.float32)
+    return docs, ((top - low) / (high - low)).astype(np.float32)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, scores.shape[0])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def export_collection(collection, path: str = None, dtype: str = None, batch_log: int = 10000) -> int:
+    """Đọc toàn bộ object (kèm vector) của collection Weaviate và ghi thành MmapVectorIndex."""
+    writer = VectorIndexWriter(path or configs.VECTOR_INDEX_PATH, dtype=dtype)
+    try:
+        for obj in collection.iterator(include_vector=True, return_properties=list(PROPERTIES)):
+            vector = obj.vector.get("default") if isinstance(obj.vector, dict) else obj.vector
+            if vector is None:
+                continue
+            writer.add(obj.properties, vector)
+            if writer.count % batch_log == 0:
+                print(f"  exported {writer.count} objects")
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.finish()
+
+
+def open_vector_index(path: Optional[str] = None) -> MmapVectorIndex:
+    path = path or configs.VECTOR_INDEX_PATH
+    if not os.path.exists(os.path.join(path, _META)):
+        raise FileNotFoundError(
+            f"Không tìm thấy vector index tại {path}, chạy `python migrate_weaviate.py --export-index` trước."
+        )
+    return MmapVectorIndex(path)
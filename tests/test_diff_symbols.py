@@ -0,0 +1,53 @@
+from src_bot.diff_symbols import extract_symbols
+
+
+def _functions(pr_diff):
+    return {(symbol.container, symbol.name) for symbol in extract_symbols(pr_diff) if symbol.kind == "function"}
+
+
+def test_module_function_after_class_has_no_container():
+    pr_diff = "\n".join([
+        "app/service.py",
+        "@@ -1,9 +1,9 @@",
+        " class Foo:",
+        "     def bar(self):",
+        "-        return 1",
+        "+        return 2",
+        " ",
+        " ",
+        " def helper():",
+        "-    pass",
+        "+    return 3",
+    ])
+    assert _functions(pr_diff) == {("Foo", "bar"), (None, "helper")}
+
+
+def test_class_from_hunk_header_ends_on_dedent():
+    pr_diff = "\n".join([
+        "app/service.py",
+        "@@ -10,7 +10,7 @@ class Foo:",
+        "     def bar(self):",
+        "-        return 1",
+        "+        return 2",
+        " ",
+        " @cache",
+        " def helper():",
+        "-    pass",
+        "+    return 3",
+    ])
+    assert _functions(pr_diff) == {("Foo", "bar"), (None, "helper")}
+
+
+def test_brace_on_its_own_line_stays_in_class():
+    pr_diff = "\n".join([
+        "src/Foo.java",
+        "@@ -1,8 +1,8 @@",
+        " public class Foo",
+        " {",
+        "     public int bar() {",
+        "-        return 1;",
+        "+        return 2;",
+        "     }",
+        " }",
+    ])
+    assert _functions(pr_diff) == {("Foo", "bar")}
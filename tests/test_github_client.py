@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+from src_bot import github_client
+from src_bot.github_client import GitHubClient
+
+
+class FakeClock:
+    def __init__(self, now: float):
+        self.now = now
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def _response(status_code, headers, body=None):
+    return SimpleNamespace(
+        status_code=status_code, headers=headers, text="", json=lambda: body
+    )
+
+
+def _client(monkeypatch, responses, now=1000.0):
+    clock = FakeClock(now)
+    monkeypatch.setattr(github_client, "time", clock)
+    client = GitHubClient("token")
+    calls = iter(responses)
+    client.session.request = lambda *args, **kwargs: next(calls)
+    return client, clock
+
+
+def test_primary_rate_limit_waits_until_reset(monkeypatch):
+    client, clock = _client(monkeypatch, [
+        _response(403, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1120"}),
+        _response(200, {"X-RateLimit-Remaining": "4999", "X-RateLimit-Reset": "4600"}, {"number": 1}),
+    ])
+
+    assert client.get_pull("org/repo", 1) == {"number": 1}
+    assert clock.sleeps == [120]
+
+
+def test_primary_rate_limit_wait_is_capped(monkeypatch):
+    client, _ = _client(monkeypatch, [])
+    client.rate_limit_max_wait = 300
+
+    far = _response(429, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "4600"})
+    past = _response(429, {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "900"})
+    assert client._rate_limit_delay(far) == 300
+    assert client._rate_limit_delay(past) == github_client.RATE_LIMIT_MIN_WAIT
+
+
+def test_retry_after_takes_precedence(monkeypatch):
+    client, _ = _client(monkeypatch, [])
+
+    response = _response(403, {"Retry-After": "7", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "4600"})
+    assert client._rate_limit_delay(response) == 7
+
+
+def test_secondary_rate_limit_without_headers_waits_a_minute(monkeypatch):
+    client, _ = _client(monkeypatch, [])
+
+    response = _response(403, {"X-RateLimit-Remaining": "12", "X-RateLimit-Reset": "4600"})
+    assert client._rate_limit_delay(response) == github_client.SECONDARY_RATE_LIMIT_WAIT
@@ -0,0 +1,41 @@
+from src_bot.job_queue import JobQueue, QUEUED, SUPERSEDED
+
+
+def _queue(tmp_path, max_pending):
+    queue = JobQueue(db_path=str(tmp_path / "jobs.sqlite3"), num_workers=1, max_pending=max_pending)
+    # Job `synchronize` bị trì hoãn JOB_QUEUE_COALESCE_SECONDS nên worker không claim trong lúc test
+    queue.initialize(lambda **kwargs: None)
+    return queue
+
+
+def _status(queue, job_id):
+    return queue._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()["status"]
+
+
+def test_full_queue_still_supersedes_same_pr(tmp_path):
+    queue = _queue(tmp_path, max_pending=2)
+    try:
+        first = queue.enqueue("org/repo", 1, "sha-a", "synchronize")
+        other = queue.enqueue("org/repo", 2, "sha-x", "synchronize")
+        assert queue.pending_count() == 2
+
+        newer = queue.enqueue("org/repo", 1, "sha-b", "synchronize")
+        assert newer["status"] == "queued"
+        assert _status(queue, first["job_id"]) == SUPERSEDED
+        assert _status(queue, other["job_id"]) == QUEUED
+        assert queue.pending_count() == 2
+    finally:
+        queue.close()
+
+
+def test_full_queue_rejects_new_pr(tmp_path):
+    queue = _queue(tmp_path, max_pending=2)
+    try:
+        queue.enqueue("org/repo", 1, "sha-a", "synchronize")
+        queue.enqueue("org/repo", 2, "sha-x", "synchronize")
+
+        rejected = queue.enqueue("org/repo", 3, "sha-y", "synchronize")
+        assert rejected == {"status": "rejected", "job_id": None, "queue_position": None}
+        assert queue.pending_count() == 2
+    finally:
+        queue.close()
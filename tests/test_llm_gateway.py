@@ -0,0 +1,53 @@
+import asyncio
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import HumanMessage
+from src_bot.llm_gateway import LLMGateway
+
+MESSAGES = [HumanMessage("review this diff")]
+
+
+def _gateway():
+    # Mỗi ký tự được stream sau 10ms; mỗi lần generate lấy response kế tiếp
+    llm = FakeListChatModel(responses=["first review", "second review"], sleep=0.01)
+    return LLMGateway(llm, max_concurrency=1, timeout=5)
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        gateway = _gateway()
+        leader = asyncio.create_task(gateway.agenerate(MESSAGES))
+        await asyncio.sleep(0.03)
+        follower = asyncio.create_task(gateway.agenerate(MESSAGES))
+        await asyncio.sleep(0)
+
+        leader.cancel()
+        assert await follower == "first review"
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert gateway._inflight == {}
+        assert gateway.limiter._active == 0
+
+    asyncio.run(scenario())
+
+
+def test_generation_is_cancelled_when_last_waiter_leaves():
+    async def scenario():
+        gateway = _gateway()
+        leader = asyncio.create_task(gateway.agenerate(MESSAGES))
+        await asyncio.sleep(0.03)
+        follower = asyncio.create_task(gateway.agenerate(MESSAGES))
+        await asyncio.sleep(0)
+        [generation] = gateway._inflight.values()
+
+        leader.cancel()
+        follower.cancel()
+        await asyncio.gather(leader, follower, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        assert generation.task.cancelled()
+        assert gateway.limiter._active == 0
+
+        # Prompt giống hệt sau đó được generate lại, không nhận kết quả đã huỷ
+        assert await gateway.agenerate(MESSAGES) == "second review"
+
+    asyncio.run(scenario())
@@ -0,0 +1,57 @@
+import json
+import os
+from types import SimpleNamespace
+import pytest
+from src_bot.neo4jdb.neo4j_schema import _checked_queries, check_query_plans, find_forbidden_operators
+
+PLANS_DIR = os.path.join(os.path.dirname(__file__), "plans")
+
+
+def _plan(name: str) -> dict:
+    with open(os.path.join(PLANS_DIR, name)) as f:
+        return json.load(f)
+
+
+class FakeSession:
+    """Trả về cùng một plan cho mọi EXPLAIN."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.queries = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def run(self, query, params=None):
+        self.queries.append(query)
+        summary = SimpleNamespace(plan=self.plan)
+        return SimpleNamespace(consume=lambda: summary)
+
+
+def test_index_seek_plan_passes():
+    assert find_forbidden_operators(_plan("node_by_ast_hash_index_seek.json")) == []
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("node_by_ast_hash_label_scan.json", ["NodeByLabelScan"] * 4),
+    ("graph_version_all_nodes_scan.json", ["AllNodesScan"]),
+])
+def test_scan_plans_are_flagged(name, expected):
+    assert find_forbidden_operators(_plan(name)) == expected
+
+
+def test_check_query_plans_reports_every_query_with_scans():
+    session = FakeSession(_plan("node_by_ast_hash_label_scan.json"))
+    driver = SimpleNamespace(session=lambda: session)
+
+    failures = check_query_plans(driver)
+    assert set(failures) == set(_checked_queries())
+    assert all(query.startswith("EXPLAIN ") for query in session.queries)
+
+
+def test_check_query_plans_passes_index_seeks():
+    driver = SimpleNamespace(session=lambda: FakeSession(_plan("node_by_ast_hash_index_seek.json")))
+    assert check_query_plans(driver) == {}
@@ -0,0 +1,45 @@
+import pytest
+from src_bot.vector_index import MmapVectorIndex, VectorIndexWriter
+
+# Cùng độ dài (5 token kể cả name) nên BM25 của "parse" chỉ phụ thuộc tf: tf * 2.2 / (tf + 1.2)
+DOCS = [
+    ("d0", "alpha beta gamma delta", (1.0, 0.0)),
+    ("d1", "parse beta gamma delta", (0.8, 0.6)),
+    ("d2", "parse parse gamma delta", (0.0, 1.0)),
+    ("d3", "parse parse parse delta", (-1.0, 0.0)),
+    ("d4", "alpha beta gamma omega", (0.6, 0.8)),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = str(tmp_path / "vector_index")
+    writer = VectorIndexWriter(path, dtype="float32")
+    for name, content, vector in DOCS:
+        writer.add({"ast_hash": f"h-{name}", "name": name, "content": content, "node_type": "Method"}, vector)
+    writer.finish()
+    index = MmapVectorIndex(path)
+    yield index
+    index.close()
+
+
+def _names(hits):
+    return [hit["name"] for hit in hits]
+
+
+def test_hybrid_matches_relative_score_fusion(index):
+    # top-3 vector (cosine): d0 1.0, d1 0.8, d4 0.6          -> min-max: d0 1, d1 0.5, d4 0
+    # top-3 BM25:            d3 1.5714, d2 1.375, d1 1.0      -> min-max: d3 1, d2 0.65625, d1 0
+    # alpha = 0.6: d0 0.6, d3 0.4, d1 0.3, d2 0.2625, d4 0
+    # (min-max trên toàn bộ document sẽ xếp d1 0.7945, d2 0.65, d0 0.6)
+    [hits] = index.hybrid_batch(["parse"], [(1.0, 0.0)], alpha=0.6, top_k=3)
+    assert _names(hits) == ["d0", "d3", "d1"]
+
+
+def test_hybrid_single_modality(index):
+    [vector_hits] = index.hybrid_batch(["parse"], [(1.0, 0.0)], alpha=1.0, top_k=3)
+    assert _names(vector_hits) == ["d0", "d1", "d4"]
+
+    [keyword_hits] = index.hybrid_batch(["parse"], [(1.0, 0.0)], alpha=0.0, top_k=5)
+    # Document không chứa term nào của query không phải là ứng viên BM25
+    assert _names(keyword_hits) == ["d3", "d2", "d1"]